@@ -0,0 +1,57 @@
+"""
+Command line and database setup shared by the benchmarks.
+
+Benchmarks seed the tables they measure, deleting the records already there,
+so they run on a scratch SQLite database unless `--use-db-url` is given,
+which runs them against DB_URL instead.
+"""
+import argparse
+import inspect
+import os
+import sys
+import tempfile
+
+_use_db_url = None
+
+
+def database_arguments():
+    """
+    Parser of the database option, a parent of the benchmark parsers
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--use-db-url', action='store_true',
+                        help="run against DB_URL instead of a scratch database, deleting its records")
+    return parser
+
+
+def scratch_database(file=None):
+    """
+    Point DB_URL at a scratch database unless the command line has `--use-db-url`,
+    called before the settings are imported. Only the first call counts, so a
+    benchmark importing another one keeps its own database.
+
+    file: name of a temporary SQLite file (for servers started in other processes),
+          an in-memory database if None
+    return: True if the benchmark runs against DB_URL
+    """
+    global _use_db_url
+    if _use_db_url is None:
+        _use_db_url = database_arguments().parse_known_args()[0].use_db_url
+        if not _use_db_url:
+            os.environ['DB_URL'] = f'sqlite:///{os.path.join(tempfile.mkdtemp(), file)}' if file else 'sqlite://'
+    return _use_db_url
+
+
+def run(main):
+    """
+    Run a benchmark from the command line: `main` gets the optional positional
+    integer arguments of its signature, the docstring of its module is the help
+    """
+    parser = argparse.ArgumentParser(description=sys.modules[main.__module__].__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     parents=[database_arguments()])
+    for name, parameter in inspect.signature(main).parameters.items():
+        parser.add_argument(name, type=type(parameter.default), nargs='?', default=parameter.default)
+    args = vars(parser.parse_args())
+    del args['use_db_url']
+    return main(**args)
@@ -0,0 +1,103 @@
+"""
+Measure co-star graph queries (milliseconds per query, p50 and p99):
+    costars    - actors sharing a movie with an actor
+    separation - shortest chain of co-starring between two actors
+    separation sql - the same from `association`, while the in-memory graph is reloaded
+and the time to load the graph and to apply a relation write to it.
+
+Usage (from the `app` directory):
+    python -m benchmarks.graph [--use-db-url] [actors] [movies] [cast] [queries]
+
+Every movie gets a cast of `cast` random actors, so there are movies * cast edges.
+"""
+import os
+import random
+import time
+
+from .common import run, scratch_database
+
+scratch_database()
+os.environ.setdefault('SCHEMA_CHECK', '0')
+
+from core import create_app, db
+from core.migrations import upgrade
+from controllers.graph import DatabaseGraph, costar_graph, current_graph
+from models.actor import Actor
+from models.movie import Movie
+from models.relations import association
+
+
+def seed(actors, movies, cast, rng):
+    """
+    Fill actors, movies and association with random casts
+    """
+    for table in (association, Actor.__table__, Movie.__table__):
+        db.session.execute(table.delete())
+    db.session.execute(Actor.__table__.insert(), [{'id': i, 'name': f'Actor {i}'} for i in range(1, actors + 1)])
+    db.session.execute(Movie.__table__.insert(), [{'id': i, 'name': f'Movie {i}'} for i in range(1, movies + 1)])
+    for start in range(1, movies + 1, 10000):
+        db.session.execute(association.insert(), [
+            {'actor_id': actor_id, 'movie_id': movie_id}
+            for movie_id in range(start, min(start + 10000, movies + 1))
+            for actor_id in rng.sample(range(1, actors + 1), cast)])
+    db.session.commit()
+
+
+def report(kind, latencies):
+    latencies.sort()
+    p50, p99 = latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f'{kind:<16} {p50:>10.2f} {p99:>10.2f}')
+
+
+def main(actors=200000, movies=100000, cast=10, count=200):
+    rng = random.Random(1)
+    app = create_app()
+    with app.app_context():
+        upgrade(db.session.connection())
+        seed(actors, movies, cast, rng)
+
+        start = time.perf_counter()
+        graph = costar_graph.load()
+        print(f'{"load":<16} {(time.perf_counter() - start) * 1000:>10.1f} ms ({movies * cast} edges)')
+
+        print(f'{"query":<16} {"p50 ms":>10} {"p99 ms":>10}')
+        latencies = []
+        for _ in range(count):
+            actor_id = rng.randint(1, actors)
+            start = time.perf_counter()
+            graph.costars(actor_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+        report('costars', latencies)
+
+        latencies, degrees = [], {}
+        for _ in range(count):
+            source, target = rng.randint(1, actors), rng.randint(1, actors)
+            start = time.perf_counter()
+            chain = graph.path(source, target, 6)
+            latencies.append((time.perf_counter() - start) * 1000)
+            degree = len(chain) // 2 if chain else None
+            degrees[degree] = degrees.get(degree, 0) + 1
+        report('separation', latencies)
+
+        latencies, database = [], DatabaseGraph()
+        for _ in range(max(count // 10, 1)):
+            source, target = rng.randint(1, actors), rng.randint(1, actors)
+            start = time.perf_counter()
+            database.path(source, target, 6)
+            latencies.append((time.perf_counter() - start) * 1000)
+        report('separation sql', latencies)
+        print('degrees', dict(sorted(degrees.items(), key=lambda item: (item[0] is None, item[0] or 0))))
+
+        actor_id = rng.randint(1, actors)
+        movie_ids = rng.sample(range(1, movies + 1), 5)
+        loaded = graph.actors
+        start = time.perf_counter()
+        Actor.add_relations(actor_id, movie_ids)
+        Actor.remove_relations(actor_id, movie_ids)
+        graph = current_graph()
+        print(f'{"write":<16} {(time.perf_counter() - start) * 1000:>10.1f} ms (add and remove, '
+              f'{"applied incrementally" if getattr(graph, "actors", None) is loaded else "answered from the database"})')
+
+
+if __name__ == '__main__':
+    run(main)
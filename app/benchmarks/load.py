@@ -0,0 +1,297 @@
+"""
+Load test the routes with concurrent clients (requests/sec and p50/p95/p99 latency per endpoint)
+and compare the results with a stored baseline, failing on regressions.
+
+Usage (from the `app` directory):
+    python -m benchmarks.load [--rows N] [--concurrency C] [--seconds S] [--mode wsgi|asgi|serve]
+                              [--baseline FILE] [--save] [--tolerance T] [--use-db-url [--no-seed]]
+                              [endpoint ...]
+
+Seeds a temporary SQLite database file with `rows` actors and movies (each movie with
+a cast of `--cast` random actors), starts the server in the given mode and runs every
+endpoint (or only the named ones) in turn. The `serve` mode runs the production server
+(`serve.py`, gunicorn workers configured by the SERVER_* settings), the others the
+single-process servers of `benchmarks/serving.py`. With `--use-db-url --no-seed` the
+records already in DB_URL are load tested.
+
+`--save` stores the results as the baseline. Otherwise they are compared with the
+baseline, if there is one for the same settings: the run fails (exit status 1) when
+an endpoint serves `tolerance` fewer requests/sec or its p99 latency is `tolerance`
+higher. Baselines depend on the machine, so they are not shared in the repository.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from datetime import date
+
+from .common import database_arguments, scratch_database
+
+scratch_database('load.db')
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+
+from core import create_app, db
+from core.migrations import upgrade
+from models.actor import Actor
+from models.movie import Movie
+from models.relations import association
+from settings.constants import DATE_FORMAT, DB_URL
+from .serving import HOST, SERVERS, client, http_request, percentile, start
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SEED_BATCH = 50000
+GENDERS = ['female', 'male', None]
+GENRES = ['drama', 'comedy', 'thriller', 'western', None]
+# the production server, run from the `app` directory
+SERVE = [sys.executable, 'serve.py']
+MODES = [*SERVERS, 'serve']
+
+
+class Dataset(object):
+    """
+    Ids of the seeded records the requests pick from,
+    and of the actors added by the run, which the deletes consume
+    """
+
+    def __init__(self, actors, movies):
+        """
+        actors, movies: tuples (min id, max id)
+        """
+        self.actors, self.movies = actors, movies
+        self.added = []
+        self.rng = random.Random(1)
+        self.counter = itertools.count(1)
+
+    def actor(self):
+        return self.rng.randint(*self.actors)
+
+    def movie(self):
+        return self.rng.randint(*self.movies)
+
+    def birthday(self):
+        return date(1930 + self.rng.randrange(80), 1 + self.rng.randrange(12), 1 + self.rng.randrange(28))
+
+
+def _pop_added(data):
+    return f'id={data.added.pop()}' if data.added else None
+
+
+# name -> (method, path, function of the Dataset making the form body, None to stop)
+ENDPOINTS = {
+    'list actors': ('GET', '/api/actors?limit=50', lambda data: ''),
+    'list movies': ('GET', '/api/movies?limit=50', lambda data: ''),
+    'movies cast': ('GET', '/api/movies/cast?limit=20', lambda data: ''),
+    'filmography': ('GET', '/api/actors/filmography?limit=20', lambda data: ''),
+    'get actor': ('GET', '/api/actor', lambda data: f'id={data.actor()}'),
+    'get movie': ('GET', '/api/movie', lambda data: f'id={data.movie()}'),
+    'get relations': ('GET', '/api/actor-relations', lambda data: f'id={data.actor()}'),
+    'add actor': ('POST', '/api/actor', lambda data: (
+        f'name=Load+Actor+{os.getpid()}-{next(data.counter)}&gender=female'
+        f'&date_of_birth={data.birthday().strftime(DATE_FORMAT)}')),
+    'update actor': ('PUT', '/api/actor', lambda data: (
+        f'id={data.actor()}&date_of_birth={data.birthday().strftime(DATE_FORMAT)}')),
+    'add relation': ('PUT', '/api/actor-relations', lambda data: f'id={data.actor()}&relation_id={data.movie()}'),
+    'remove relation': ('DELETE', '/api/actor-relations', lambda data: (
+        f'id={data.actor()}&relation_id={data.movie()}')),
+    'delete actor': ('DELETE', '/api/actor', _pop_added),
+}
+
+
+def seed(rows, cast):
+    """
+    Fill the tables with `rows` actors and movies, every movie with `cast` random actors,
+    in batches so that the size of the dataset is not limited by memory
+
+    return: Dataset of the seeded ids
+    """
+    upgrade()
+    rng = random.Random(1)
+    with create_app().app_context():
+        for table in (association, Actor.__table__, Movie.__table__):
+            db.session.execute(table.delete())
+        for start in range(0, rows, SEED_BATCH):
+            batch = range(start, min(start + SEED_BATCH, rows))
+            db.session.execute(Actor.__table__.insert(), [
+                {'name': f'Seed Actor {i}', 'gender': GENDERS[i % len(GENDERS)],
+                 'date_of_birth': date(1930 + i % 80, 1 + i % 12, 1 + i % 28)} for i in batch])
+            db.session.execute(Movie.__table__.insert(), [
+                {'name': f'Seed Movie {i}', 'genre': GENRES[i % len(GENRES)], 'year': 1930 + i % 95}
+                for i in batch])
+        data = dataset()
+        actors = range(data.actors[0], data.actors[1] + 1)
+        for start in range(data.movies[0], data.movies[1] + 1, SEED_BATCH // max(cast, 1)):
+            db.session.execute(association.insert(), [
+                {'actor_id': actor_id, 'movie_id': movie_id}
+                for movie_id in range(start, min(start + SEED_BATCH // max(cast, 1), data.movies[1] + 1))
+                for actor_id in rng.sample(actors, min(cast, len(actors)))])
+        db.session.commit()
+        return data
+
+
+def dataset():
+    """
+    Dataset of the records in the database (seeded ids are contiguous)
+    """
+    actors = db.session.execute(select(func.min(Actor.id), func.max(Actor.id))).one()
+    movies = db.session.execute(select(func.min(Movie.id), func.max(Movie.id))).one()
+    if actors[0] is None or movies[0] is None:
+        raise RuntimeError("No actors or movies to load test, seed the database")
+    return Dataset(tuple(actors), tuple(movies))
+
+
+def added_actors(data):
+    """
+    Collect the ids of the actors added by the run for the deletes
+    """
+    with create_app().app_context():
+        data.added = list(db.session.execute(
+            select(Actor.id).where(Actor.name.like(f'Load Actor {os.getpid()}-%')).order_by(Actor.id)).scalars())
+
+
+async def run(port, endpoint, data, concurrency, seconds):
+    """
+    return: tuple (latencies, error statuses) of `concurrency` clients running for `seconds`
+    """
+    method, path, body = ENDPOINTS[endpoint]
+
+    def next_request():
+        form = body(data)
+        return http_request(port, method, path, form) if form is not None else None
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*[client(port, next_request, deadline, latencies, errors) for _ in range(concurrency)])
+    return latencies, errors
+
+
+def measure(port, endpoint, data, concurrency, seconds, warmup):
+    """
+    Load an endpoint after a warm-up run
+
+    return: dict with requests/sec, latency percentiles (ms) and the number of errors
+    """
+    if endpoint == 'delete actor':
+        added_actors(data)
+    asyncio.run(run(port, endpoint, data, concurrency, warmup))
+    started = time.perf_counter()
+    latencies, errors = asyncio.run(run(port, endpoint, data, concurrency, seconds))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    if not latencies:
+        return {'rps': 0, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'errors': len(errors)}
+    return {'rps': round(len(latencies) / elapsed, 1),
+            **{f'p{p}_ms': round(percentile(latencies, p) * 1000, 2) for p in (50, 95, 99)},
+            'errors': len(errors)}
+
+
+def regressions(results, baseline, tolerance):
+    """
+    return: dict endpoint -> list of regressed measures, compared with the baseline endpoints
+    """
+    found = {}
+    for endpoint, result in results.items():
+        before = baseline.get(endpoint)
+        if not before:
+            continue
+        worse = []
+        if result['rps'] < before['rps'] * (1 - tolerance):
+            worse.append(f"req/sec {before['rps']:,.0f} -> {result['rps']:,.0f}")
+        if before['p99_ms'] is not None and (result['p99_ms'] is None
+                                             or result['p99_ms'] > before['p99_ms'] * (1 + tolerance)):
+            worse.append(f"p99 {before['p99_ms']} -> {result['p99_ms']} ms")
+        if result['errors'] > before['errors']:
+            worse.append(f"errors {before['errors']} -> {result['errors']}")
+        if worse:
+            found[endpoint] = worse
+    return found
+
+
+def start_server(mode, port):
+    """
+    Start the server of a mode on `port` and wait until it answers
+    """
+    if mode == 'serve':
+        return start(mode, port, SERVE, {**os.environ, 'SERVER_BIND': f'{HOST}:{port}'})
+    return start(mode, port)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Load test the routes and compare with a baseline",
+                                     parents=[database_arguments()])
+    parser.add_argument('endpoints', nargs='*', metavar='endpoint', help=f"one of: {', '.join(ENDPOINTS)}")
+    parser.add_argument('--rows', type=int, default=10000, help="actors and movies to seed")
+    parser.add_argument('--cast', type=int, default=5, help="actors of every seeded movie")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=5, help="measured time per endpoint")
+    parser.add_argument('--warmup', type=float, default=1, help="unmeasured time per endpoint")
+    parser.add_argument('--mode', choices=MODES, default='wsgi')
+    parser.add_argument('--port', type=int, default=8201)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help="store the results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument('--no-seed', action='store_true', help="load test the records already in the database")
+    args = parser.parse_args(args)
+    if args.no_seed and not args.use_db_url:
+        parser.error("--no-seed needs --use-db-url, the temporary database is empty")
+    unknown = [endpoint for endpoint in args.endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)} (choose from: {', '.join(ENDPOINTS)})")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    endpoints = args.endpoints or list(ENDPOINTS)
+    if args.no_seed:
+        with create_app().app_context():
+            data = dataset()
+    else:
+        started = time.perf_counter()
+        data = seed(args.rows, args.cast)
+        print(f'seeded {args.rows:,} actors and movies in {time.perf_counter() - started:.1f} s')
+
+    settings = {'database': make_url(DB_URL).get_backend_name(),
+                'rows': args.rows, 'cast': args.cast, 'concurrency': args.concurrency, 'mode': args.mode}
+    process = start_server(args.mode, args.port)
+    results = {}
+    print(f'{"endpoint":<16} {"req/sec":>10} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    try:
+        for endpoint in endpoints:
+            result = results[endpoint] = measure(args.port, endpoint, data, args.concurrency, args.seconds,
+                                                 args.warmup)
+            print(f'{endpoint:<16} {result["rps"]:>10,.0f} ' +
+                  ' '.join(f'{result[key]:>8.1f}' if result[key] is not None else f'{"-":>8}'
+                           for key in ('p50_ms', 'p95_ms', 'p99_ms')) + f' {result["errors"]:>7}')
+    finally:
+        process.terminate()
+        process.wait()
+
+    if args.save:
+        with open(args.baseline, 'w') as file:
+            json.dump({'settings': settings, 'endpoints': results}, file, indent=2)
+        print(f'baseline saved to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'no baseline at {args.baseline}, store one with --save')
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline['settings'] != settings:
+        print(f"baseline is for other settings ({baseline['settings']}), not compared")
+        return 0
+    found = regressions(results, baseline['endpoints'], args.tolerance)
+    for endpoint, worse in found.items():
+        print(f'REGRESSION {endpoint}: {"; ".join(worse)}')
+    if not found:
+        print(f'no regressions against the baseline (tolerance {args.tolerance:.0%})')
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Measure name search latency for type-ahead (milliseconds per query, p50 and p99):
+    prefix - first 1 to 4 letters of a name word
+    word   - a whole name word
+    typo   - a name with two letters swapped
+
+Usage (from the `app` directory):
+    python -m benchmarks.search [--use-db-url] [rows] [queries]
+
+On the in-memory SQLite database the in-process name index is measured.
+Type-ahead needs answers within TARGET_P99_MS.
+"""
+import os
+import random
+import time
+
+from .common import run, scratch_database
+
+scratch_database()
+os.environ.setdefault('SCHEMA_CHECK', '0')
+
+from core import create_app, db
+from core.migrations import upgrade
+from controllers.search import ENTITIES, search
+from models.actor import Actor
+from models.movie import Movie
+
+TARGET_P99_MS = 20
+
+ONSETS = ['', 'b', 'br', 'c', 'ch', 'd', 'f', 'g', 'h', 'j', 'k', 'l', 'm', 'n', 'p', 'r', 's', 'st', 't', 'v', 'w']
+VOWELS = ['a', 'e', 'i', 'o', 'u', 'ea', 'ie', 'ou']
+CODAS = ['', '', 'n', 'r', 'l', 's', 'th', 'ck', 'rd', 'tt']
+
+
+def word(rng):
+    return ''.join(rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS)
+                   for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def seed(rows, rng):
+    """
+    Fill actors and movies with `rows` generated names each
+    """
+    for model in (Actor, Movie):
+        names = set()
+        while len(names) < rows:
+            names.add(' '.join(word(rng) for _ in range(rng.randint(1, 3)))[:50])
+        db.session.execute(model.__table__.delete())
+        db.session.execute(model.__table__.insert(), [{'name': name} for name in names])
+    db.session.commit()
+
+
+def queries(kind, names, count, rng):
+    result = []
+    for name in rng.sample(names, count):
+        name_word = rng.choice(name.split())
+        if kind == 'prefix':
+            result.append(name_word[:rng.randint(1, 4)].lower())
+        elif kind == 'word':
+            result.append(name_word.lower())
+        else:
+            i = rng.randrange(len(name) - 1)
+            result.append((name[:i] + name[i + 1] + name[i] + name[i + 2:]).lower())
+    return result
+
+
+def main(rows=20000, count=200):
+    rng = random.Random(1)
+    app = create_app()
+    with app.app_context():
+        upgrade(db.session.connection())
+        seed(rows, rng)
+        names = [name for (name,) in db.session.execute(db.select(Actor.name))]
+
+        start = time.perf_counter()
+        search('warmup', list(ENTITIES), 10, 0)
+        print(f'{"index build":<8} {(time.perf_counter() - start) * 1000:>10.1f} ms')
+
+        print(f'{"query":<8} {"p50 ms":>10} {"p99 ms":>10}')
+        for kind in ('prefix', 'word', 'typo'):
+            latencies = []
+            for query in queries(kind, names, count, rng):
+                start = time.perf_counter()
+                search(query, list(ENTITIES), 10, 0)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            p50, p99 = latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f'{kind:<8} {p50:>10.2f} {p99:>10.2f}{"" if p99 <= TARGET_P99_MS else "  over target"}')
+
+
+if __name__ == '__main__':
+    run(main)
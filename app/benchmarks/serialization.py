@@ -0,0 +1,78 @@
+"""
+Compare list serialization throughput (rows/sec):
+    orm        - `Actor.query.all()` + `__dict__` filtering by ACTOR_FIELDS
+    serializer - column-projected rows through the compiled encoder
+
+Usage (from the `app` directory):
+    python -m benchmarks.serialization [--use-db-url] [rows] [repeats]
+
+Runs on an in-memory SQLite database (see `benchmarks/common.py`).
+"""
+import os
+import time
+from datetime import date
+
+from .common import run, scratch_database
+
+scratch_database()
+# the in-memory database is migrated after the app is created
+os.environ.setdefault('SCHEMA_CHECK', '0')
+
+from core import create_app, db
+from core.migrations import upgrade
+from controllers.serializers import actor_serializer
+from models.actor import Actor
+from settings.constants import ACTOR_FIELDS
+
+
+def seed(rows):
+    """
+    Fill the actors table with `rows` generated records
+    """
+    db.session.execute(Actor.__table__.delete())
+    db.session.execute(Actor.__table__.insert(), [
+        {'name': f'Bench Actor {i}', 'gender': 'female' if i % 2 else 'male',
+         'date_of_birth': date(1950 + i % 50, 1 + i % 12, 1 + i % 28)}
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def orm():
+    records = [{k: v for k, v in actor.__dict__.items() if k in ACTOR_FIELDS} for actor in Actor.query.all()]
+    db.session.expunge_all()
+    return records
+
+
+def serializer():
+    return [actor_serializer.encode_row(row) for row in db.session.execute(actor_serializer.select())]
+
+
+def measure(func, repeats):
+    """
+    Best wall time of `repeats` runs
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(rows=100000, repeats=5):
+    app = create_app()
+    with app.app_context():
+        upgrade(db.session.connection())
+        seed(rows)
+        results = {func.__name__: measure(func, repeats) for func in (orm, serializer)}
+        db.session.execute(Actor.__table__.delete())
+        db.session.commit()
+
+    for name, seconds in results.items():
+        print(f'{name:<12} {rows / seconds:>12,.0f} rows/sec')
+    print(f'speedup      {results["orm"] / results["serializer"]:>12.1f}x')
+
+
+if __name__ == '__main__':
+    run(main)
@@ -0,0 +1,174 @@
+"""
+Compare the serving modes under concurrent load (requests/sec and latency percentiles):
+    wsgi - Flask app on the threaded WSGI server
+    asgi - `asgi:app` on uvicorn, views over the async driver
+
+Usage (from the `app` directory):
+    python -m benchmarks.serving [--use-db-url] [concurrency] [seconds] [rows]
+
+Runs on a temporary SQLite database file, shared with the server processes.
+Every client sends the next request as soon as the previous response is read,
+over the same connection unless the server closes it.
+"""
+import asyncio
+import subprocess
+import sys
+import time
+from datetime import date
+
+from .common import run, scratch_database
+
+scratch_database('serving.db')
+
+from core import create_app, db
+from core.migrations import upgrade
+from models.actor import Actor
+from models.movie import Movie
+from models.relations import association
+
+HOST = '127.0.0.1'
+
+SERVERS = {
+    'wsgi': [sys.executable, '-c', 'import sys; from werkzeug.serving import run_simple; from core import create_app; '
+                                   'run_simple(sys.argv[1], int(sys.argv[2]), create_app(), threaded=True)'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:app', '--log-level', 'warning', '--no-access-log',
+             '--host'],
+}
+
+# (name, method, path, form body)
+ENDPOINTS = [
+    ('actors page', 'GET', '/api/actors?limit=50', ''),
+    ('movies with cast', 'GET', '/api/movies/cast?limit=20', ''),
+    ('actor by id', 'GET', '/api/actor', 'id=1'),
+]
+
+
+def seed(rows):
+    """
+    Fill the tables with `rows` actors and movies, each movie with a cast of 5
+    """
+    upgrade()
+    app = create_app()
+    with app.app_context():
+        for table in (association, Actor.__table__, Movie.__table__):
+            db.session.execute(table.delete())
+        db.session.execute(Actor.__table__.insert(), [
+            {'id': i, 'name': f'Bench Actor {i}', 'gender': 'female' if i % 2 else 'male',
+             'date_of_birth': date(1950 + i % 50, 1 + i % 12, 1 + i % 28)}
+            for i in range(1, rows + 1)
+        ])
+        db.session.execute(Movie.__table__.insert(), [
+            {'id': i, 'name': f'Bench Movie {i}', 'genre': 'drama', 'year': 1950 + i % 70}
+            for i in range(1, rows + 1)
+        ])
+        db.session.execute(association.insert(), [
+            {'movie_id': i, 'actor_id': 1 + (i + k) % rows} for i in range(1, rows + 1) for k in range(min(5, rows))
+        ])
+        db.session.commit()
+
+
+def start(mode, port, command=None, env=None):
+    """
+    Start a server process and wait until it answers
+
+    command, env: command line and environment of a server listening on `port` by itself,
+                  instead of the one of SERVERS
+    """
+    if command is None:
+        command = SERVERS[mode] + ([HOST, str(port)] if mode == 'wsgi' else [HOST, '--port', str(port)])
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            asyncio.run(_probe(port))
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+async def _probe(port):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    writer.close()
+
+
+async def client(port, next_request, deadline, latencies, errors):
+    """
+    Send requests made by `next_request()` one after another until the deadline
+    (or until it returns None), reconnecting when the server does not keep the connection alive
+    """
+    writer = None
+    while time.perf_counter() < deadline:
+        request = next_request()
+        if request is None:
+            break
+        start = time.perf_counter()
+        if writer is None:
+            reader, writer = await asyncio.open_connection(HOST, port)
+        writer.write(request)
+        status, length, close = await _read_head(reader)
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(status)
+        if close:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _read_head(reader):
+    """
+    return: tuple (status, content length, connection closed) of a response
+    """
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    headers = dict(line.split(': ', 1) for line in head[1:] if line)
+    headers = {key.lower(): value for key, value in headers.items()}
+    return int(head[0].split()[1]), int(headers['content-length']), headers.get('connection') == 'close'
+
+
+async def load(port, method, path, body, concurrency, seconds):
+    """
+    return: tuple (latencies, errors) of `concurrency` clients running for `seconds`
+    """
+    request = http_request(port, method, path, body)
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*[client(port, lambda: request, deadline, latencies, errors) for _ in range(concurrency)])
+    return latencies, errors
+
+
+def http_request(port, method, path, body=''):
+    """
+    HTTP/1.1 request bytes with a form body
+    """
+    body = body.encode()
+    return (f'{method} {path} HTTP/1.1\r\nHost: {HOST}:{port}\r\n'
+            f'Content-Type: application/x-www-form-urlencoded\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n').encode() + body
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def main(concurrency=64, seconds=5, rows=1000):
+    seed(rows)
+    print(f'{"endpoint":<18} {"mode":<5} {"req/sec":>10} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    for port, mode in enumerate(SERVERS, 8101):
+        process = start(mode, port)
+        try:
+            for name, method, path, body in ENDPOINTS:
+                latencies, errors = asyncio.run(load(port, method, path, body, concurrency, seconds))
+                latencies.sort()
+                print(f'{name:<18} {mode:<5} {len(latencies) / seconds:>10,.0f} '
+                      f'{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 99) * 1000:>8.1f} '
+                      f'{len(errors):>7}')
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    run(main)
@@ -0,0 +1,61 @@
+"""
+Measure cold start of a worker process (milliseconds, median of fresh processes):
+    import        - importing the app package
+    factory       - `create_app()`, including the schema version check if enabled
+    first request - the first GET /api/actors through the test client
+
+Usage (from the `app` directory):
+    python -m benchmarks.startup [--use-db-url] [runs]
+
+Runs on a temporary SQLite database file, which the probed processes open too,
+with SCHEMA_CHECK on and off.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from .common import run, scratch_database
+
+scratch_database('startup.db')
+
+from core.migrations import upgrade
+
+STAGES = ['import', 'factory', 'first request']
+
+# runs in a fresh interpreter, prints the stage times as JSON
+PROBE = '''
+import json, time
+start = time.perf_counter()
+from core import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+app.test_client().get('/api/actors')
+served = time.perf_counter()
+print(json.dumps([imported - start, created - imported, served - created]))
+'''
+
+
+def probe(schema_check):
+    """
+    return: list of stage times (seconds) of one fresh process
+    """
+    env = {**os.environ, 'SCHEMA_CHECK': '1' if schema_check else '0'}
+    output = subprocess.run([sys.executable, '-c', PROBE], env=env, check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main(runs=10):
+    upgrade()
+    print(f'{"schema check":<14}' + ''.join(f'{stage:>15}' for stage in STAGES) + f'{"total":>15}')
+    for schema_check in (True, False):
+        samples = [probe(schema_check) for _ in range(runs)]
+        medians = [statistics.median(sample[i] for sample in samples) * 1000 for i in range(len(STAGES))]
+        print(f'{"on" if schema_check else "off":<14}' + ''.join(f'{ms:>15.1f}' for ms in medians)
+              + f'{sum(medians):>15.1f}')
+
+
+if __name__ == '__main__':
+    run(main)
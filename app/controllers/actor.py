@@ -1,21 +1,36 @@
 from flask import jsonify, make_response
 
-from datetime import datetime as dt
 from ast import literal_eval
 
+from core.idempotency import idempotent
 from models.actor import Actor
 from models.movie import Movie
-from settings.constants import ACTOR_FIELDS, DATE_FORMAT  # to make response pretty
-from .parse_request import get_request_data
+from models.relations import association
+from .bulk import create_records, delete_records, get_bulk_items, update_records
+from .conditional import (check_etag, check_record_etag, if_match_versions, record_etag, with_etag,
+                          with_record_etag)
+from .filtering import actor_filters
+from .pagination import get_page_params, list_records
+from .parse_request import get_request_args, get_request_data, parse_relation_ids
+from .serializers import actor_serializer, actor_filmography
+from .validation import validate_actor
 
 
 def get_all_actors():
     """
     Get list of all actor records
+    Supports keyset pagination (`limit`, `after`), streaming (`stream`),
+    filters, sorting (`sort`) and sparse fieldsets (`fields`)
     """
-    all_actors = Actor.query.all()
-    actors = [{k: v for k, v in actor.__dict__.items() if k in ACTOR_FIELDS} for actor in all_actors]
-    return make_response(jsonify(actors), 200)
+    params, error = get_page_params(get_request_args(), actor_filters)
+    if error:
+        return error
+
+    etag, not_modified = check_etag([Actor.__table__])
+    if not_modified:
+        return not_modified
+
+    return with_etag(list_records(actor_serializer, params), etag)
 
 
 def get_actor_by_id():
@@ -28,17 +43,22 @@ def get_actor_by_id():
 
     try:
         row_id = int(data['id'])
-    except ValueError:
+    except (ValueError, TypeError):
         return make_response(jsonify(error="Id must be integer"), 400)
 
-    actor = Actor.query.filter_by(id=row_id).first()
-    if not actor:
+    actor_data = actor_serializer.get_current(row_id)
+    if not actor_data:
         return make_response(jsonify(error="Record with such id does not exist"), 400)
 
-    actor_data = {k: v for k, v in actor.__dict__.items() if k in ACTOR_FIELDS}
-    return make_response(jsonify(actor_data), 200)
+    # tagged with the record version, which updates expect in `If-Match`
+    etag, not_modified = check_record_etag(actor_data)
+    if not_modified:
+        return not_modified
 
+    return with_record_etag(make_response(jsonify(actor_data), 200), etag)
 
+
+@idempotent
 def add_actor():
     """
     Add new actor
@@ -49,23 +69,17 @@ def add_actor():
     if not data:
         return make_response(jsonify(error="No input data provided"), 400)
 
-    # Check if all required fields specified
-    required_fields = ['name', 'gender', 'date_of_birth']
-    missing_fields = [field for field in required_fields if field not in data]
-    if missing_fields:
-        return make_response(jsonify(error=f"Missing fields: {', '.join(missing_fields)}"), 400)
-
-    # Validate `date_of_birth`
-    try:
-        data["date_of_birth"] = dt.strptime(data["date_of_birth"], DATE_FORMAT).date()
-    except ValueError:
-        return make_response(jsonify(error=f"Date must be in {DATE_FORMAT} format"), 400)
+    # Validate fields
+    data, error = validate_actor(data)
+    if error:
+        return make_response(jsonify(error=error), 400)
 
     try:
         # Use the create method from models/base.py
         new_actor = Actor.create(**data)
-        new_actor_data = {k: v for k, v in new_actor.__dict__.items() if k in ACTOR_FIELDS}
-        return make_response(jsonify(new_actor_data), 200)
+        new_actor_data = actor_serializer.encode(new_actor)
+        return with_record_etag(make_response(jsonify(new_actor_data), 200),
+                                record_etag(new_actor.id, new_actor.version))
     except Exception as e:
         # Handle any unexpected errors
         return make_response(jsonify(error=str(e)), 400)
@@ -84,28 +98,25 @@ def update_actor():
         return make_response(jsonify(error="No id specified"), 400)
     try:
         actor_id = int(data["id"])
-    except ValueError:
+    except (ValueError, TypeError):
         return make_response(jsonify(error="Id must be an integer"), 400)
 
-    # Validate `date_of_birth` if present
-    if "date_of_birth" in data:
-        try:
-            data["date_of_birth"] = dt.strptime(data["date_of_birth"], DATE_FORMAT).date()
-        except ValueError:
-            return make_response(jsonify(error=f"Date must be in {DATE_FORMAT} format"), 400)
-    ######
-    # Validate input fields
-    invalid_fields = [field for field in data.keys() if field not in ACTOR_FIELDS + ["id"]]
-    if invalid_fields:
-        return make_response(jsonify(error=f"Invalid fields: {', '.join(invalid_fields)}"), 400)
-    ######
+    # Validate present fields
+    data, error = validate_actor(data, partial=True)
+    if error:
+        return make_response(jsonify(error=error), 400)
     try:
         # Use the update method from models/base.py
-        updated_actor = Actor.update(actor_id, **data)
+        # compare-and-swap of the version if the request has `If-Match`
+        versions = if_match_versions(actor_id)
+        updated_actor = Actor.update(actor_id, versions=versions, **data)
         if not updated_actor:
+            if versions is not None and Actor.existing_ids([actor_id]):
+                return make_response(jsonify(error="Record was changed by another request"), 409)
             return make_response(jsonify(error="Record with such id does not exist"), 400)
-        updated_actor_data = {k: v for k, v in updated_actor.__dict__.items() if k in ACTOR_FIELDS}
-        return make_response(jsonify(updated_actor_data), 200)
+        updated_actor_data = actor_serializer.encode(updated_actor)
+        return with_record_etag(make_response(jsonify(updated_actor_data), 200),
+                                record_etag(updated_actor.id, updated_actor.version))
     except Exception as e:
         return make_response(jsonify(error=str(e)), 400)
     ### END CODE HERE ###
@@ -123,50 +134,85 @@ def delete_actor():
         return make_response(jsonify(error="No ID specified"), 400)
     try:
         actor_id = int(data['id'])
-    except ValueError:
+    except (ValueError, TypeError):
         return make_response(jsonify(error="ID must be an integer"), 400)
 
-    # Find and delete the actor
-    actor = Actor.query.filter_by(id=actor_id).first()
-    if not actor:
-        return make_response(jsonify(error="Actor with such ID does not exist"), 400)
-
     try:
-        Actor.delete(actor_id)
+        # Delete the actor, nothing is deleted if it doesn't exist
+        if not Actor.delete(actor_id):
+            return make_response(jsonify(error="Actor with such ID does not exist"), 400)
         return make_response(jsonify(message="Record successfully deleted"), 200)
     except Exception as e:
         return make_response(jsonify(error=str(e)), 400)
     ### END CODE HERE ###
 
 
+def get_all_actors_filmography():
+    """
+    Get list of all actor records with their filmography
+    Supports keyset pagination (`limit`, `after`), streaming (`stream`),
+    filters, sorting (`sort`) and sparse fieldsets (`fields`)
+    """
+    params, error = get_page_params(get_request_args(), actor_filters)
+    if error:
+        return error
+
+    etag, not_modified = check_etag([Actor.__table__, association, Movie.__table__])
+    if not_modified:
+        return not_modified
+
+    return with_etag(list_records(actor_serializer, params, actor_filmography), etag)
+
+
+def get_actor_relations():
+    """
+    Get actor by ID with full filmography
+    """
+    data = get_request_data()
+
+    # Validate ID
+    try:
+        actor_id = int(data.get('id'))
+    except (ValueError, TypeError):
+        return make_response(jsonify(error="ID must be integer"), 400)
+
+    rel_actor = actor_serializer.get_current(actor_id)
+    if not rel_actor:
+        return make_response(jsonify(error="Actor not found"), 400)
+
+    etag, not_modified = check_etag([Actor.__table__, association, Movie.__table__], row_id=actor_id)
+    if not_modified:
+        return not_modified
+
+    rel_actor[actor_filmography.key] = actor_filmography.get(actor_id, etag)
+    return with_etag(make_response(jsonify(rel_actor), 200), etag)
+
+
+@idempotent
 def actor_add_relation():
     """
-    Add a movie to an actor's filmography.
+    Add movies to an actor's filmography.
+    `relation_id` may be repeated to add several movies with one statement
     """
     data = get_request_data()
 
     # Validate IDs
     try:
         actor_id = int(data.get('id'))
-        movie_id = int(data.get('relation_id'))
+        movie_ids = parse_relation_ids()
     except (ValueError, TypeError):
         return make_response(jsonify(error="ID and relation_id must be integers"), 400)
 
     try:
-        # Query the actor and movie
-        actor = Actor.query.filter_by(id=actor_id).first()
-        movie = Movie.query.filter_by(id=movie_id).first()
-
-        if actor and movie:
-            # Add relation using the provided add_relation method
-            actor = Actor.add_relation(actor_id, movie)
-            rel_actor = {k: v for k, v in actor.__dict__.items() if k in ACTOR_FIELDS}
-            rel_actor['filmography'] = str(actor.filmography)
-            return make_response(jsonify(rel_actor), 200)
-        elif not actor:
+        # Query the actor, nothing is added if some movie doesn't exist
+        rel_actor = actor_serializer.get(actor_id)
+        if not rel_actor:
             return make_response(jsonify(error="Actor not found"), 400)
-        elif not movie:
+
+        rel_actor['filmography'] = Actor.add_relations(actor_id, movie_ids)
+        if rel_actor['filmography'] is None:
             return make_response(jsonify(error="Movie not found"), 400)
+        return make_response(jsonify(rel_actor), 200)
     except Exception as e:
         return make_response(jsonify(error=f"Error occurred: {str(e)}"), 400)
 
@@ -174,28 +220,63 @@ def actor_add_relation():
 def actor_clear_relations():
     """
     Clear all relations by id
+    or only the given ones if `relation_id` is specified (may be repeated)
     """
     data = get_request_data()
 
     # Validate IDs
     try:
         actor_id = int(data.get('id'))
+        movie_ids = parse_relation_ids() if 'relation_id' in data else None
     except (ValueError, TypeError):
         return make_response(jsonify(error="ID must be integer"), 400)
 
     try:
         # Fetch the actor from the database
-        actor = Actor.query.filter_by(id=actor_id).first()
+        rel_actor = actor_serializer.get(actor_id)
+        if not rel_actor:
+            return make_response(jsonify(error="Actor not found"), 400)
 
-        # Check if the actor exists
-        if actor:
+        if movie_ids is None:
             # Clear all relations for the actor
-            actor = Actor.clear_relations(actor_id)
-            # return make_response(jsonify(message="All relations cleared successfully"), 200)
-            rel_actor = {k: v for k, v in actor.__dict__.items() if k in ACTOR_FIELDS}
-            rel_actor['filmography'] = str(actor.filmography)
-            return make_response(jsonify(rel_actor), 200)
+            Actor.clear_relations(actor_id)
+            rel_actor['filmography'] = []
         else:
-            return make_response(jsonify(error="Actor not found"), 400)
+            rel_actor['filmography'] = Actor.remove_relations(actor_id, movie_ids)
+        return make_response(jsonify(rel_actor), 200)
     except Exception as e:
         return make_response(jsonify(error=f"Error occurred: {str(e)}"), 400)
+
+
+@idempotent
+def add_actors():
+    """
+    Add new actors from a JSON array of records
+    """
+    items, error = get_bulk_items()
+    if error:
+        return error
+
+    return create_records(actor_serializer, items, validate_actor)
+
+
+def update_actors():
+    """
+    Update actor records from a JSON array of records with ids
+    """
+    items, error = get_bulk_items()
+    if error:
+        return error
+
+    return update_records(actor_serializer, items, validate_actor)
+
+
+def delete_actors():
+    """
+    Delete actors from a JSON array of ids
+    """
+    items, error = get_bulk_items()
+    if error:
+        return error
+
+    return delete_records(Actor, items)
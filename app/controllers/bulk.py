@@ -0,0 +1,192 @@
+from flask import jsonify, make_response
+from sqlalchemy import select
+
+from core import db
+from settings.constants import BULK_LIMIT_MAX
+from .parse_request import get_request_json
+
+
+def get_bulk_items():
+    """
+    Get records of a bulk request from a JSON array body
+
+    return: tuple (items, error), error is a ready response or None
+    """
+    items = get_request_json()
+    if not isinstance(items, list) or not items:
+        return None, make_response(jsonify(error="Expected a non-empty JSON array"), 400)
+    if len(items) > BULK_LIMIT_MAX:
+        return None, make_response(jsonify(error=f"At most {BULK_LIMIT_MAX} records per request"), 400)
+    return items, None
+
+
+def create_records(serializer, items, validate):
+    """
+    Validate records and insert the valid ones in a single transaction
+
+    serializer: entity serializer
+    items: list of records from the request
+    validate: entity validation function
+    return: response with a result per item
+    """
+    results = [None] * len(items)
+    rows = {}
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not item:
+            results[i] = _error("No input data provided")
+        elif 'id' in item:
+            results[i] = _error("Id is assigned by the database")
+        else:
+            data, error = validate(item)
+            if error:
+                results[i] = _error(error)
+            else:
+                rows[i] = data
+
+    def write():
+        _reject_taken_names(serializer.model, rows, results)
+        if rows:
+            created = serializer.model.bulk_create(list(rows.values()))
+            for i, row in zip(rows, created):
+                results[i] = _record(serializer, row)
+
+    return _respond(write, results)
+
+
+def update_records(serializer, items, validate):
+    """
+    Validate records and update the existing ones in a single transaction
+
+    serializer: entity serializer
+    items: list of records with `id` from the request
+    validate: entity validation function
+    return: response with a result per item
+    """
+    results = [None] * len(items)
+    rows = {}
+    for i, item in enumerate(items):
+        row_id, error = _parse_id(item)
+        if error:
+            results[i] = _error(error)
+            continue
+        data, error = validate({**item, 'id': row_id}, partial=True)
+        if error:
+            results[i] = _error(error)
+        else:
+            rows[i] = data
+    _reject_duplicate_ids(rows, results)
+
+    def write():
+        model = serializer.model
+        ids = [row['id'] for row in rows.values()]
+        existing = model.existing_ids(ids)
+        for i in [i for i, row in rows.items() if row['id'] not in existing]:
+            del rows[i]
+            results[i] = _error("Record with such id does not exist")
+        _reject_taken_names(model, rows, results)
+        if rows:
+            updated = model.bulk_update(list(rows.values()))
+            for i, row in rows.items():
+                results[i] = _record(serializer, updated[row['id']])
+
+    return _respond(write, results)
+
+
+def delete_records(model, items):
+    """
+    Delete records by ids in a single transaction
+
+    model: model class
+    items: list of ids (or records with `id`) from the request
+    return: response with a result per item
+    """
+    results = [None] * len(items)
+    ids = {}
+    for i, item in enumerate(items):
+        row_id, error = _parse_id(item if isinstance(item, dict) else {'id': item})
+        if error:
+            results[i] = _error(error)
+        else:
+            ids[i] = {'id': row_id}
+    _reject_duplicate_ids(ids, results)
+
+    def write():
+        deleted = model.bulk_delete([row['id'] for row in ids.values()]) if ids else set()
+        for i, row in ids.items():
+            if row['id'] in deleted:
+                results[i] = {'status': 200, 'id': row['id']}
+            else:
+                results[i] = _error("Record with such id does not exist")
+
+    return _respond(write, results)
+
+
+def _respond(write, results):
+    """
+    Run the write step and build the bulk response, nothing is written on errors
+    """
+    try:
+        write()
+    except Exception as e:
+        db.session.rollback()
+        return make_response(jsonify(error=str(e)), 400)
+    return make_response(jsonify(results), 200)
+
+
+def _parse_id(item):
+    """
+    return: tuple (id, error), error is a message or None
+    """
+    if not isinstance(item, dict) or item.get('id') is None:
+        return None, "No id specified"
+    try:
+        return int(item['id']), None
+    except (ValueError, TypeError):
+        return None, "Id must be an integer"
+
+
+def _reject_duplicate_ids(rows, results):
+    """
+    Drop rows which repeat an id of an earlier row of the batch
+    """
+    seen = set()
+    for i in list(rows):
+        if rows[i]['id'] in seen:
+            del rows[i]
+            results[i] = _error("Duplicate id in request")
+        else:
+            seen.add(rows[i]['id'])
+
+
+def _reject_taken_names(model, rows, results):
+    """
+    Drop rows whose unique `name` repeats within the batch or belongs to another record,
+    so one conflict does not fail the whole transaction
+    """
+    owners = {}
+    for i in list(rows):
+        name = rows[i].get('name')
+        if name is None:
+            continue
+        if name in owners:
+            del rows[i]
+            results[i] = _error("Duplicate name in request")
+        else:
+            owners[name] = rows[i].get('id')
+    if not owners:
+        return
+
+    taken = dict(db.session.execute(select(model.name, model.id).where(model.name.in_(owners))).all())
+    for i in list(rows):
+        name = rows[i].get('name')
+        if name in taken and taken[name] != rows[i].get('id'):
+            del rows[i]
+            results[i] = _error("Record with such name already exists")
+
+
+def _record(serializer, row):
+    return {'status': 200, 'record': serializer.encode(row)}
+
+
+def _error(message):
+    return {'status': 400, 'error': message}
@@ -0,0 +1,79 @@
+from flask import make_response, request
+
+from models.versions import get_versions
+
+
+def check_etag(tables, row_id=None):
+    """
+    Make a weak ETag from the versions of the tables a GET reads
+    and compare it with `If-None-Match` of the request
+
+    tables: list of tables the response depends on
+    row_id: id of the record the response is about, for endpoints serving
+            every record from the same URL (checked to exist first)
+    return: tuple (etag, not_modified), not_modified is a ready 304 response
+            (nothing else to query or serialize) or None
+    """
+    etag = '-'.join(f'{table.name}.{version}' for table, version in zip(tables, get_versions(tables)))
+    if row_id is not None:
+        etag = f'{row_id}:{etag}'
+    if request.if_none_match.contains_weak(etag):
+        return etag, with_etag(make_response('', 304), etag)
+    return etag, None
+
+
+def with_etag(response, etag):
+    """
+    Add ETag to a successful response
+    """
+    if response.status_code in (200, 304):
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def record_etag(row_id, version):
+    """
+    Strong ETag of a record version: `<id>.<version>`, as versions of different records are equal
+    """
+    return f'{row_id}.{version}'
+
+
+def check_record_etag(record):
+    """
+    Make a strong ETag from the id and version of a record
+    and compare it with `If-None-Match` of the request
+
+    record: encoded record with `id` and `version`
+    return: tuple (etag, not_modified), not_modified is a ready 304 response or None
+    """
+    etag = record_etag(record['id'], record['version'])
+    if request.if_none_match.contains_weak(etag):
+        return etag, with_record_etag(make_response('', 304), etag)
+    return etag, None
+
+
+def with_record_etag(response, etag):
+    """
+    Add the strong ETag of a record to a successful response
+    """
+    if response.status_code in (200, 304):
+        response.set_etag(etag)
+    return response
+
+
+def if_match_versions(row_id):
+    """
+    Record versions the request expects in `If-Match` (strong ETags of records),
+    an update of any other version is a conflict, as are ETags of other records
+
+    row_id: id of the updated record
+    return: list of versions or None if the request has no If-Match (or `*`)
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    versions = []
+    for etag in request.if_match.as_set():
+        etag_id, _, version = etag.partition('.')
+        if etag_id == str(row_id) and version.isdigit():
+            versions.append(int(version))
+    return versions
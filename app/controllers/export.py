@@ -0,0 +1,309 @@
+import csv
+import io
+import json
+import queue
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from datetime import date
+
+from flask import Response, jsonify, make_response, stream_with_context
+from sqlalchemy import Date, Integer, func, select
+
+from core import db
+from models.actor import Actor
+from models.movie import Movie
+from models.relations import association
+from settings.constants import DATE_FORMAT, EXPORT_FORMATS, STREAM_CHUNK_SIZE
+from .conditional import check_etag, with_etag
+from .parse_request import get_request_args
+
+# exported table name -> table
+EXPORT_TABLES = {table.name: table for table in (Actor.__table__, Movie.__table__, association)}
+
+# columnar format: magic, then row groups of STREAM_CHUNK_SIZE rows, each a header
+# (4-byte little-endian length and JSON {"rows", "columns": [{"name", "type", "size"}]})
+# followed by the column blocks, and a zero length at the end.
+# A column block is a validity bitmap (bit i set if row i is not NULL) followed by
+# `integer` - int64 values, `date` - int32 days since 1970-01-01,
+# `string` - int32 offsets of the n + 1 value boundaries and the UTF-8 data.
+# Numbers are little-endian, values of NULL rows are zero / empty.
+COLUMNAR_MAGIC = b'CATCOL1\n'
+EPOCH = date(1970, 1, 1).toordinal()
+
+# strftime directives of DATE_FORMAT -> PostgreSQL to_char patterns
+PG_DATE_PATTERNS = {'%d': 'DD', '%m': 'MM', '%Y': 'YYYY', '%y': 'YY'}
+
+
+def column_kind(column):
+    """
+    Exported type of a column: `integer`, `date` or `string`
+    """
+    if isinstance(column.type, Integer):
+        return 'integer'
+    if isinstance(column.type, Date):
+        return 'date'
+    return 'string'
+
+
+def export_select(table):
+    """
+    All rows of a table in primary key order
+    """
+    return select(*table.c).order_by(*table.primary_key.columns)
+
+
+def _format_date(value):
+    return value.strftime(DATE_FORMAT) if value is not None else None
+
+
+def export_table(table, fmt, compress=False):
+    """
+    Stream a table as bytes chunks of STREAM_CHUNK_SIZE rows each, read from
+    a server-side cursor (or COPY TO for CSV on PostgreSQL), so memory does
+    not depend on the size of the table. Dates are written in DATE_FORMAT.
+
+    table: table to export
+    fmt: one of EXPORT_FORMATS
+    compress: gzip the stream
+    """
+    chunks = _export_chunks(table, fmt)
+    return _gzip(chunks) if compress else chunks
+
+
+def _export_chunks(table, fmt):
+    if fmt == 'csv' and _copy_cursor() is not None:
+        yield from _copy_csv(table)
+        return
+
+    kinds = [column_kind(column) for column in table.c]
+    dates = [i for i, kind in enumerate(kinds) if kind == 'date']
+    result = db.session.execute(export_select(table).execution_options(yield_per=STREAM_CHUNK_SIZE))
+
+    if fmt == 'columnar':
+        yield COLUMNAR_MAGIC
+        for rows in result.partitions():
+            yield _encode_row_group(table, kinds, rows)
+        yield struct.pack('<I', 0)
+        return
+
+    names = list(table.c.keys())
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(names)
+    for rows in result.partitions():
+        if dates:
+            rows = [[_format_date(value) if i in dates else value for i, value in enumerate(row)] for row in rows]
+        if fmt == 'csv':
+            writer.writerows(rows)
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            chunk = ''.join(json.dumps(dict(zip(names, row)), separators=(',', ':')) + '\n' for row in rows)
+        yield chunk.encode()
+    if fmt == 'csv' and buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _encode_row_group(table, kinds, rows):
+    """
+    One row group of the columnar format
+    """
+    columns, blocks = [], []
+    for i, (column, kind) in enumerate(zip(table.c, kinds)):
+        values = [row[i] for row in rows]
+        bitmap = bytearray((len(values) + 7) // 8)
+        for j, value in enumerate(values):
+            if value is not None:
+                bitmap[j // 8] |= 1 << (j % 8)
+        if kind == 'integer':
+            data = _little_endian(array('q', [value or 0 for value in values]))
+        elif kind == 'date':
+            data = _little_endian(array('i', [value.toordinal() - EPOCH if value else 0 for value in values]))
+        else:
+            encoded = [value.encode() if value is not None else b'' for value in values]
+            offsets = array('i', [0])
+            for value in encoded:
+                offsets.append(offsets[-1] + len(value))
+            data = _little_endian(offsets) + b''.join(encoded)
+        blocks.append(bytes(bitmap) + data)
+        columns.append({'name': column.name, 'type': kind, 'size': len(blocks[-1])})
+    header = json.dumps({'rows': len(rows), 'columns': columns}, separators=(',', ':')).encode()
+    return struct.pack('<I', len(header)) + header + b''.join(blocks)
+
+
+def _little_endian(values):
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+def read_columnar(data):
+    """
+    Decode the columnar format
+
+    data: bytes
+    return: tuple (column names, list of row tuples)
+    """
+    if not data.startswith(COLUMNAR_MAGIC):
+        raise ValueError("Not a columnar export")
+    position, names, rows = len(COLUMNAR_MAGIC), [], []
+    while True:
+        (length,) = struct.unpack_from('<I', data, position)
+        position += 4
+        if not length:
+            return names, rows
+        header = json.loads(data[position:position + length])
+        position += length
+        count, columns = header['rows'], []
+        names = [column['name'] for column in header['columns']]
+        for column in header['columns']:
+            block = data[position:position + column['size']]
+            position += column['size']
+            bitmap, block = block[:(count + 7) // 8], block[(count + 7) // 8:]
+            present = [bool(bitmap[j // 8] & (1 << (j % 8))) for j in range(count)]
+            if column['type'] == 'string':
+                offsets = array('i', block[:4 * (count + 1)])
+                if sys.byteorder != 'little':
+                    offsets.byteswap()
+                text = block[4 * (count + 1):]
+                values = [text[offsets[j]:offsets[j + 1]].decode() for j in range(count)]
+            else:
+                values = array('q' if column['type'] == 'integer' else 'i', block)
+                if sys.byteorder != 'little':
+                    values.byteswap()
+                if column['type'] == 'date':
+                    values = [date.fromordinal(value + EPOCH) for value in values]
+            columns.append([value if ok else None for value, ok in zip(values, present)])
+        rows.extend(zip(*columns))
+
+
+def _gzip(chunks):
+    """
+    Compress a stream of bytes chunks into one gzip member on the fly
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _copy_cursor():
+    """
+    DBAPI cursor of the session connection if it supports COPY (psycopg2), else None
+    """
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return None
+    cursor = db.session.connection().connection.dbapi_connection.cursor()
+    return cursor if hasattr(cursor, 'copy_expert') else None
+
+
+def _copy_csv(table):
+    """
+    Stream a table with COPY TO STDOUT as CSV. The driver writes rows into a file object,
+    so COPY runs in a thread handing chunks over through a bounded queue.
+    """
+    pattern = DATE_FORMAT
+    for directive, pg_pattern in PG_DATE_PATTERNS.items():
+        pattern = pattern.replace(directive, pg_pattern)
+    stmt = select(*[func.to_char(column, pattern).label(column.name) if column_kind(column) == 'date' else column
+                    for column in table.c]).order_by(*table.primary_key.columns)
+    sql = stmt.compile(dialect=db.session.get_bind().dialect, compile_kwargs={'literal_binds': True})
+    cursor, chunks, stopped = _copy_cursor(), queue.Queue(maxsize=4), threading.Event()
+
+    class Writer(object):
+        def __init__(self):
+            self.buffer = []
+            self.size = 0
+
+        def write(self, data):
+            if stopped.is_set():
+                raise IOError("Export stopped")
+            self.buffer.append(data if isinstance(data, bytes) else data.encode())
+            self.size += len(data)
+            if self.size >= 64 * 1024:
+                self.flush()
+
+        def flush(self):
+            if self.buffer:
+                chunks.put(b''.join(self.buffer))
+                self.buffer, self.size = [], 0
+
+    def copy():
+        writer = Writer()
+        try:
+            cursor.copy_expert(f'COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)', writer)
+            writer.flush()
+            chunks.put(None)
+        except Exception as e:
+            chunks.put(e)
+
+    thread = threading.Thread(target=copy, daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # the client went away: stop COPY and unblock the thread
+        stopped.set()
+        while thread.is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def snapshot():
+    """
+    Start the read transaction of the session so that all following exports
+    see the same committed state of the database
+    """
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+    elif connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+        # pysqlite does not open transactions for reads
+        connection.exec_driver_sql('BEGIN')
+
+
+def export_file_name(table, fmt, compress=False):
+    return f"{table.name}.{fmt}{'.gz' if compress else ''}"
+
+
+def export_data():
+    """
+    Stream a whole table for snapshots:
+        table    - actors, movies or association
+        format   - csv (default), ndjson or columnar
+        compress - `gzip` to compress the stream
+    """
+    args = get_request_args()
+    if args.get('table') not in EXPORT_TABLES:
+        return make_response(jsonify(error=f"Table must be one of: {', '.join(EXPORT_TABLES)}"), 400)
+    fmt = args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return make_response(jsonify(error=f"Format must be one of: {', '.join(EXPORT_FORMATS)}"), 400)
+    if args.get('compress', 'gzip') != 'gzip':
+        return make_response(jsonify(error="Compress must be gzip"), 400)
+    compress = 'compress' in args
+
+    table = EXPORT_TABLES[args['table']]
+    etag, not_modified = check_etag([table])
+    if not_modified:
+        return not_modified
+
+    mimetype = 'application/gzip' if compress else EXPORT_FORMATS[fmt]
+    response = Response(stream_with_context(export_table(table, fmt, compress)), status=200, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_file_name(table, fmt, compress)}"'
+    return with_etag(response, etag)
@@ -0,0 +1,77 @@
+from settings.constants import (ACTOR_FILTERS, ACTOR_RANGE_FILTERS, ACTOR_SORT_FIELDS,
+                                MOVIE_FILTERS, MOVIE_RANGE_FILTERS, MOVIE_SORT_FIELDS)
+from .serializers import actor_serializer, movie_serializer
+from .validation import validate_actor, validate_movie
+
+
+class Filters(object):
+    """
+    Whitelisted list parameters of one entity:
+        <field>=value                   - equality filter
+        <field>_from=, <field>_to=      - inclusive range filter
+        sort=<field> / sort=-<field>    - ascending / descending order on an indexed column
+        fields=<field>,<field>          - columns to read and return (`id` is always included)
+
+    Values are converted with the entity validation rules, so filters accept
+    the same formats as writes (e.g. DATE_FORMAT dates).
+    """
+
+    def __init__(self, serializer, validate, equal, ranges, sort):
+        """
+        serializer: entity serializer
+        validate: entity validation function
+        equal: fields with equality filters
+        ranges: fields with range filters
+        sort: fields allowed in `sort`
+        """
+        table = serializer.model.__table__
+        unindexed = [field for field in sort
+                     if not (table.c[field].primary_key or table.c[field].index or table.c[field].unique)]
+        if unindexed:
+            raise ValueError(f"Sort fields must be indexed: {', '.join(unindexed)}")
+
+        self.serializer = serializer
+        self.converters = validate.converters
+        self.table = table
+        self.params = {field: (field, '==') for field in equal}
+        for field in ranges:
+            self.params[f'{field}_from'] = (field, '>=')
+            self.params[f'{field}_to'] = (field, '<=')
+        self.sort = tuple(sort)
+
+    def parse(self, data):
+        """
+        data: dict with request parameters
+        return: tuple (params, error), params has `where` (list of criteria),
+                `sort` (column, descending) and `fields` (list or None),
+                error is a message or None
+        """
+        where = []
+        for key, (field, op) in self.params.items():
+            if key not in data:
+                continue
+            convert, message = self.converters[field]
+            try:
+                value = convert(data[key])
+            except (ValueError, TypeError):
+                return None, message
+            column = self.table.c[field]
+            where.append(column == value if op == '==' else column >= value if op == '>=' else column <= value)
+
+        sort = data.get('sort', 'id')
+        descending = sort.startswith('-')
+        if sort.lstrip('-') not in self.sort:
+            return None, f"Sort must be one of: {', '.join(self.sort)} (prefixed with - for descending order)"
+
+        fields = None
+        if 'fields' in data:
+            fields = [field for field in data['fields'].split(',') if field]
+            invalid = [field for field in fields if field not in self.serializer.fields]
+            if invalid or not fields:
+                return None, f"Invalid fields: {', '.join(invalid)}" if invalid else "No fields specified"
+
+        return {'where': where, 'sort': (self.table.c[sort.lstrip('-')], descending), 'fields': fields}, None
+
+
+actor_filters = Filters(actor_serializer, validate_actor, ACTOR_FILTERS, ACTOR_RANGE_FILTERS, ACTOR_SORT_FIELDS)
+movie_filters = Filters(movie_serializer, validate_movie, MOVIE_FILTERS, MOVIE_RANGE_FILTERS, MOVIE_SORT_FIELDS)
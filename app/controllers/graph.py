@@ -0,0 +1,490 @@
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+
+from flask import current_app, has_app_context, jsonify, make_response, request, url_for
+from sqlalchemy import select
+
+from core import db
+from models.actor import Actor
+from models.base import relation_listeners
+from models.movie import Movie
+from models.relations import association
+from models.versions import get_versions
+from settings.constants import GRAPH_DELTA_MAX, GRAPH_DEPTH_MAX, PAGE_LIMIT_MAX
+from .conditional import check_etag, with_etag
+from .parse_request import get_request_args
+
+log = logging.getLogger(__name__)
+
+
+class Adjacency(object):
+    """
+    Compressed sparse rows: neighbours of `keys[i]` are `values[offsets[i]:offsets[i + 1]]`,
+    keys and the neighbours of each key are sorted
+    """
+
+    def __init__(self, pairs=()):
+        """
+        pairs: (key, neighbour) pairs sorted by key, then neighbour
+        """
+        self.keys, self.offsets, self.values = array('q'), array('q', [0]), array('q')
+        for key, value in pairs:
+            if not self.keys or self.keys[-1] != key:
+                if self.keys:
+                    self.offsets.append(len(self.values))
+                self.keys.append(key)
+            self.values.append(value)
+        if self.keys:
+            self.offsets.append(len(self.values))
+
+    def get(self, key):
+        """
+        return: sorted neighbours of the key
+        """
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.values[self.offsets[i]:self.offsets[i + 1]]
+        return ()
+
+    def has(self, key, value):
+        neighbours = self.get(key)
+        i = bisect_left(neighbours, value)
+        return i < len(neighbours) and neighbours[i] == value
+
+    def pairs(self):
+        for i, key in enumerate(self.keys):
+            for value in self.values[self.offsets[i]:self.offsets[i + 1]]:
+                yield key, value
+
+
+class Graph(object):
+    """
+    Breadth-first queries over the bipartite actor - movie graph, walking
+    a whole frontier per lookup of `movies_of` and `actors_of`
+    """
+
+    def movies_of(self, actor_ids):
+        """
+        return: dict actor id -> list of movie ids of the actors
+        """
+        raise NotImplementedError
+
+    def actors_of(self, movie_ids):
+        """
+        return: dict movie id -> list of actor ids of the movies
+        """
+        raise NotImplementedError
+
+    def costars(self, actor_id):
+        """
+        return: dict co-star id -> list of ids of the shared movies
+        """
+        movies = self.movies_of([actor_id]).get(actor_id, [])
+        casts = self.actors_of(movies)
+        found = {}
+        for movie_id in movies:
+            for costar in casts.get(movie_id, ()):
+                if costar != actor_id:
+                    found.setdefault(costar, []).append(movie_id)
+        return found
+
+    def _expand(self, frontier, seen_movies):
+        """
+        Movies of the frontier actors not walked yet, with their casts
+
+        return: list of (actor id, movie id, cast) in the order of the frontier
+        """
+        movies, steps = self.movies_of(frontier), []
+        for current in frontier:
+            for movie_id in movies.get(current, ()):
+                if movie_id not in seen_movies:
+                    seen_movies.add(movie_id)
+                    steps.append((current, movie_id))
+        casts = self.actors_of([movie_id for _, movie_id in steps])
+        return [(current, movie_id, casts.get(movie_id, ())) for current, movie_id in steps]
+
+    def neighbourhood(self, actor_id, depth):
+        """
+        Breadth-first walk over shared movies
+
+        return: dict id -> distance (number of movies between) of the actors
+                at most `depth` movies away, the actor itself excluded
+        """
+        distances, frontier, seen_movies = {actor_id: 0}, [actor_id], set()
+        for distance in range(1, depth + 1):
+            following = []
+            for _, _, cast in self._expand(frontier, seen_movies):
+                for costar in cast:
+                    if costar not in distances:
+                        distances[costar] = distance
+                        following.append(costar)
+            if not following:
+                break
+            frontier = following
+        del distances[actor_id]
+        return distances
+
+    def path(self, source, target, depth):
+        """
+        Shortest chain of co-starring between two actors by bidirectional
+        breadth-first search, expanding the smaller frontier a level at a time
+
+        return: list of alternating actor and movie ids from `source` to `target`,
+                or None if they are more than `depth` movies apart
+        """
+        if source == target:
+            return [source]
+        # per side: actor -> (distance, previous actor, movie) towards the side root
+        parents = ({source: (0, None, None)}, {target: (0, None, None)})
+        frontiers, seen_movies = [[source], [target]], (set(), set())
+        for _ in range(depth):
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            mine, other = parents[side], parents[1 - side]
+            following, meetings = [], []
+            for current, movie_id, cast in self._expand(frontiers[side], seen_movies[side]):
+                distance = mine[current][0] + 1
+                for costar in cast:
+                    if costar not in mine:
+                        mine[costar] = (distance, current, movie_id)
+                        following.append(costar)
+                        if costar in other:
+                            meetings.append(costar)
+            if meetings:
+                meeting = min(meetings, key=lambda actor_id: (other[actor_id][0], actor_id))
+                return self._chain(parents[0], meeting)[::-1] + self._chain(parents[1], meeting)[1:]
+            if not following:
+                return None
+            frontiers[side] = following
+        return None
+
+    @staticmethod
+    def _chain(parents, actor_id):
+        """
+        Actor and movie ids from `actor_id` back to the root of the parents
+        """
+        chain = [actor_id]
+        while parents[actor_id][1] is not None:
+            _, actor_id, movie_id = parents[actor_id]
+            chain += [movie_id, actor_id]
+        return chain
+
+
+class Snapshot(Graph):
+    """
+    Immutable in-memory graph at a version of `association`, queried without locks.
+
+    Edges are held in two compressed adjacencies (movies of actors, actors of movies)
+    plus the relations added and removed since they were built. A write makes
+    a new snapshot sharing the adjacencies, with copies of the changes.
+    """
+
+    def __init__(self, version, actors, movies, added_movies=None, added_actors=None, removed=frozenset()):
+        self.version, self.actors, self.movies = version, actors, movies
+        self.added_movies, self.added_actors = added_movies or {}, added_actors or {}
+        self.removed = removed
+        self.changes = sum(map(len, self.added_movies.values())) + len(removed)
+
+    @classmethod
+    def build(cls, version, pairs):
+        """
+        pairs: (actor_id, movie_id) pairs sorted by actor, then movie
+        """
+        actors = Adjacency(pairs)
+        return cls(version, actors, Adjacency(sorted((movie_id, actor_id) for actor_id, movie_id in actors.pairs())))
+
+    def apply(self, added, removed, version):
+        """
+        Snapshot with the relations added and removed by a write. Relations the
+        snapshot already has (or lacks) are skipped, so a write may be applied
+        to a snapshot which was loaded after it committed.
+        """
+        added_movies, added_actors, gone = dict(self.added_movies), dict(self.added_actors), set(self.removed)
+        for actor_id, movie_id in removed:
+            if movie_id in added_movies.get(actor_id, ()):
+                added_movies[actor_id] = added_movies[actor_id] - {movie_id}
+                added_actors[movie_id] = added_actors[movie_id] - {actor_id}
+            elif self.actors.has(actor_id, movie_id):
+                gone.add((actor_id, movie_id))
+        for actor_id, movie_id in added:
+            if (actor_id, movie_id) in gone:
+                gone.discard((actor_id, movie_id))
+            elif not self.actors.has(actor_id, movie_id):
+                added_movies[actor_id] = added_movies.get(actor_id, frozenset()) | {movie_id}
+                added_actors[movie_id] = added_actors.get(movie_id, frozenset()) | {actor_id}
+        return Snapshot(version, self.actors, self.movies, added_movies, added_actors, frozenset(gone))
+
+    def _movies(self, actor_id):
+        movies = self.actors.get(actor_id)
+        if self.removed:
+            movies = [movie_id for movie_id in movies if (actor_id, movie_id) not in self.removed]
+        added = self.added_movies.get(actor_id)
+        return list(movies) + sorted(added) if added else movies
+
+    def _actors(self, movie_id):
+        actors = self.movies.get(movie_id)
+        if self.removed:
+            actors = [actor_id for actor_id in actors if (actor_id, movie_id) not in self.removed]
+        added = self.added_actors.get(movie_id)
+        return list(actors) + sorted(added) if added else actors
+
+    def movies_of(self, actor_ids):
+        return {actor_id: self._movies(actor_id) for actor_id in actor_ids}
+
+    def actors_of(self, movie_ids):
+        return {movie_id: self._actors(movie_id) for movie_id in movie_ids}
+
+
+class DatabaseGraph(Graph):
+    """
+    Graph read from `association` with one indexed IN query per frontier,
+    answers while the in-memory snapshot is behind the database
+    """
+
+    def _neighbours(self, column, other, row_ids):
+        found = {}
+        if row_ids:
+            stmt = select(column, other).where(column.in_(set(row_ids))).order_by(column, other)
+            for row_id, neighbour in db.session.execute(stmt):
+                found.setdefault(row_id, []).append(neighbour)
+        return found
+
+    def movies_of(self, actor_ids):
+        return self._neighbours(association.c.actor_id, association.c.movie_id, actor_ids)
+
+    def actors_of(self, movie_ids):
+        return self._neighbours(association.c.movie_id, association.c.actor_id, movie_ids)
+
+
+class CoStarGraph(object):
+    """
+    In-process index of the co-star graph of `association`.
+
+    Queries run on the current snapshot. The relation writes of this process are
+    applied to it as they commit, in version order. A write of another process shows
+    as a version the snapshot lacks: the snapshot is then reloaded in a background
+    thread, and queries are answered from the database until it is current again.
+    Reloads also compact the snapshot every GRAPH_DELTA_MAX changes.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        # version -> (added, removed) of the writes of this process newer than the last load
+        self.writes = {}
+        self.loading = False
+        self._lock = threading.Lock()
+        relation_listeners.append(self.apply)
+
+    def view(self, version):
+        """
+        Graph at `version` of `association` (or newer): the snapshot if it is current,
+        otherwise the database, while the snapshot is reloaded in the background
+        """
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.version >= version:
+            return snapshot
+        self.reload()
+        return DatabaseGraph()
+
+    def load(self):
+        """
+        Load a snapshot from the database in the current app context (blocking)
+
+        return: the current snapshot
+        """
+        # read before the relations, which may only be newer: writes bump versions after commit
+        version = get_versions([association])[0]
+        stmt = select(association.c.actor_id, association.c.movie_id) \
+            .order_by(association.c.actor_id, association.c.movie_id)
+        snapshot = Snapshot.build(version, (tuple(row) for row in db.session.execute(stmt)))
+        db.session.commit()
+        with self._lock:
+            self.writes = {write: change for write, change in self.writes.items() if write > version}
+            self.snapshot = snapshot
+            self._advance()
+            return self.snapshot
+
+    def reload(self):
+        """
+        Load a snapshot in a background thread, unless one is loading already
+        """
+        if not has_app_context():
+            return
+        with self._lock:
+            if self.loading:
+                return
+            self.loading = True
+        thread = threading.Thread(target=self._reload, args=(current_app._get_current_object(),),
+                                  name='costar-graph', daemon=True)
+        thread.start()
+
+    def _reload(self, app):
+        try:
+            with app.app_context():
+                self.load()
+        except Exception:
+            log.exception("Co-star graph reload failed")
+        finally:
+            self.loading = False
+
+    def apply(self, added, removed, version):
+        """
+        Relation listener: apply a committed write of this process to the snapshot
+        once it has all preceding ones
+        """
+        with self._lock:
+            if self.snapshot is None and not self.loading:
+                return
+            self.writes[version] = (added, removed)
+            if len(self.writes) > GRAPH_DELTA_MAX:
+                # nobody queried the graph for long, the next query loads it again
+                self.snapshot, self.writes = None, {}
+                return
+            if self.snapshot is not None:
+                self._advance()
+            compact = self.snapshot is not None and self.snapshot.changes > GRAPH_DELTA_MAX
+        if compact:
+            self.reload()
+
+    def _advance(self):
+        """
+        Apply the writes following the snapshot version
+        """
+        snapshot = self.snapshot
+        while snapshot.version + 1 in self.writes:
+            snapshot = snapshot.apply(*self.writes[snapshot.version + 1], snapshot.version + 1)
+        self.snapshot = snapshot
+
+
+costar_graph = CoStarGraph()
+
+
+def current_graph():
+    """
+    Co-star graph at the current version of `association`
+    """
+    return costar_graph.view(get_versions([association])[0])
+
+
+def names(model, row_ids):
+    """
+    return: dict id -> name of the records
+    """
+    return dict(db.session.execute(select(model.id, model.name).where(model.id.in_(row_ids))).all())
+
+
+def get_actor_param(args, key):
+    """
+    Get an existing actor id from the query string
+
+    return: tuple (id, error response)
+    """
+    try:
+        actor_id = int(args[key])
+    except KeyError:
+        return None, make_response(jsonify(error=f"No {key} specified"), 400)
+    except ValueError:
+        return None, make_response(jsonify(error=f"{key.capitalize()} must be integer"), 400)
+    if not Actor.existing_ids([actor_id]):
+        return None, make_response(jsonify(error="Actor not found"), 400)
+    return actor_id, None
+
+
+def get_depth_param(args, default):
+    """
+    return: tuple (depth, error response)
+    """
+    try:
+        depth = int(args.get('depth', default))
+    except ValueError:
+        depth = 0
+    if not 1 <= depth <= GRAPH_DEPTH_MAX:
+        return None, make_response(jsonify(error=f"Depth must be between 1 and {GRAPH_DEPTH_MAX}"), 400)
+    return depth, None
+
+
+def get_costars():
+    """
+    Get actors who co-starred with an actor (`id`), with the shared movies
+    """
+    args = get_request_args()
+    actor_id, error = get_actor_param(args, 'id')
+    if error:
+        return error
+
+    etag, not_modified = check_etag([Actor.__table__, association, Movie.__table__])
+    if not_modified:
+        return not_modified
+
+    costars = current_graph().costars(actor_id)
+    actor_names = names(Actor, list(costars))
+    results = [{'id': costar, 'name': actor_names.get(costar), 'movies': movies}
+               for costar, movies in sorted(costars.items())]
+    return with_etag(make_response(jsonify(results), 200), etag)
+
+
+def get_neighbourhood():
+    """
+    Get actors at most `depth` shared movies away from an actor (`id`),
+    nearest first, paged by `limit` and `offset`
+    """
+    args = get_request_args()
+    actor_id, error = get_actor_param(args, 'id')
+    if error:
+        return error
+    depth, error = get_depth_param(args, 2)
+    if error:
+        return error
+    try:
+        limit, offset = int(args.get('limit', 100)), int(args.get('offset', 0))
+    except ValueError:
+        return make_response(jsonify(error="Limit and offset must be integers"), 400)
+    if not 1 <= limit <= PAGE_LIMIT_MAX or offset < 0:
+        return make_response(jsonify(error=f"Limit must be between 1 and {PAGE_LIMIT_MAX}, "
+                                           f"offset must not be negative"), 400)
+
+    etag, not_modified = check_etag([Actor.__table__, association])
+    if not_modified:
+        return not_modified
+
+    distances = current_graph().neighbourhood(actor_id, depth)
+    page = sorted(distances, key=lambda row_id: (distances[row_id], row_id))[offset:offset + limit]
+    actor_names = names(Actor, page)
+    results = [{'id': row_id, 'name': actor_names.get(row_id), 'distance': distances[row_id]} for row_id in page]
+    response = make_response(jsonify(results), 200)
+    if offset + limit < len(distances):
+        args = {**args, 'offset': offset + limit}
+        response.headers['Link'] = f'<{url_for(request.endpoint, _external=True, **args)}>; rel="next"'
+    return with_etag(response, etag)
+
+
+def get_separation():
+    """
+    Get degrees of separation between two actors (`from`, `to`): the number
+    of movies on the shortest chain of co-starring, and the chain itself.
+    Degrees are null if the actors are more than `depth` movies apart.
+    """
+    args = get_request_args()
+    source, error = get_actor_param(args, 'from')
+    if error:
+        return error
+    target, error = get_actor_param(args, 'to')
+    if error:
+        return error
+    depth, error = get_depth_param(args, GRAPH_DEPTH_MAX)
+    if error:
+        return error
+
+    etag, not_modified = check_etag([Actor.__table__, association, Movie.__table__])
+    if not_modified:
+        return not_modified
+
+    chain = current_graph().path(source, target, depth)
+    if chain is None:
+        return with_etag(make_response(jsonify(degrees=None, path=[]), 200), etag)
+
+    actor_names, movie_names = names(Actor, chain[::2]), names(Movie, chain[1::2])
+    path = [{'type': 'movie', 'id': row_id, 'name': movie_names.get(row_id)} if i % 2 else
+            {'type': 'actor', 'id': row_id, 'name': actor_names.get(row_id)} for i, row_id in enumerate(chain)]
+    return with_etag(make_response(jsonify(degrees=len(chain) // 2, path=path), 200), etag)
@@ -0,0 +1,195 @@
+import csv
+import gzip
+import io
+import json
+import time
+
+from flask import jsonify, make_response, request
+from sqlalchemy import select
+
+from core import db
+from models.actor import Actor
+from models.movie import Movie
+from settings.constants import (ACTOR_FIELDS, IMPORT_BATCH_SIZE, IMPORT_FORMATS, IMPORT_REJECTS_MAX,
+                                MOVIE_FIELDS, READ_ONLY_FIELDS)
+from .parse_request import get_request_args
+from .validation import validate_actor, validate_movie
+
+# imported entity table name -> (model, validation function, imported fields)
+IMPORT_ENTITIES = {
+    'actors': (Actor, validate_actor, [field for field in ACTOR_FIELDS if field not in ['id', *READ_ONLY_FIELDS]]),
+    'movies': (Movie, validate_movie, [field for field in MOVIE_FIELDS if field not in ['id', *READ_ONLY_FIELDS]]),
+}
+# relations are imported by the names of the actor and the movie
+RELATION_FIELDS = ['actor', 'movie']
+IMPORT_TABLES = [*IMPORT_ENTITIES, 'association']
+
+
+def read_records(stream, fmt):
+    """
+    Read records from a text stream, empty CSV values are NULL
+
+    stream: text stream
+    fmt: `csv` (with a header) or `ndjson`
+    return: iterator of tuples (record, error)
+    """
+    if fmt == 'csv':
+        # values beyond the header are collected under the `None` key
+        for record in csv.DictReader(stream):
+            if None in record:
+                yield None, "More values than fields in the header"
+                continue
+            yield {key: None if value == '' else value for key, value in record.items()}, None
+        return
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield None, "Invalid JSON"
+            continue
+        yield (record, None) if isinstance(record, dict) else (None, "Expected a JSON object")
+
+
+class Import(object):
+    """
+    Import of one table: records are validated and written in batches of
+    `batch_size`, every batch in its own transaction, so a failed import
+    resumes after the last committed batch (the checkpoint).
+    Records are upserted by name, so loading a batch twice is harmless.
+    """
+
+    def __init__(self, table, batch_size=IMPORT_BATCH_SIZE, start=0, on_checkpoint=None):
+        """
+        table: one of IMPORT_TABLES
+        start: number of records to skip (a checkpoint of an earlier run)
+        on_checkpoint: function called with the report after each committed batch
+        """
+        self.table, self.batch_size, self.on_checkpoint = table, batch_size, on_checkpoint
+        self.checkpoint, self.loaded, self.rejected, self.rejects = start, 0, 0, []
+        self.seconds = 0.0
+
+    def run(self, records):
+        """
+        records: iterator of tuples (record, error) from `read_records`
+        return: report dict
+        """
+        started, batch = time.perf_counter(), []
+        for number, (record, error) in enumerate(records, 1):
+            if number <= self.checkpoint:
+                continue
+            batch.append((number, record, error))
+            if len(batch) == self.batch_size:
+                self._load(batch, started)
+                batch = []
+        if batch:
+            self._load(batch, started)
+        return self.report()
+
+    def report(self):
+        processed = self.loaded + self.rejected
+        return {'table': self.table, 'loaded': self.loaded, 'rejected': self.rejected, 'rejects': self.rejects,
+                'checkpoint': self.checkpoint, 'seconds': round(self.seconds, 3),
+                'rows_per_second': round(processed / self.seconds) if self.seconds else None}
+
+    def _load(self, batch, started):
+        rows = {}
+        for number, record, error in batch:
+            if error is None:
+                data, error = self._validate(record)
+            if error:
+                self._reject(number, error)
+            else:
+                # a later record with the same key replaces an earlier one
+                rows.pop(data['key'], None)
+                rows[data.pop('key')] = (number, data)
+
+        if self.table == 'association':
+            self._load_relations(list(rows.values()))
+        elif rows:
+            IMPORT_ENTITIES[self.table][0].bulk_upsert([data for _, data in rows.values()])
+            self.loaded += len(rows)
+
+        self.checkpoint = batch[-1][0]
+        self.seconds = time.perf_counter() - started
+        if self.on_checkpoint:
+            self.on_checkpoint(self.report())
+
+    def _validate(self, record):
+        """
+        Validate a record with the rules of the add endpoints,
+        `id` and `version` (of an export) are dropped, they are assigned by the database
+
+        return: tuple (data with `key`, error)
+        """
+        if self.table == 'association':
+            if set(record) != set(RELATION_FIELDS) or not all(isinstance(record[key], str) for key in record):
+                return None, f"Expected names of the {' and '.join(RELATION_FIELDS)}"
+            return {'key': (record['actor'], record['movie']), **record}, None
+
+        _, validate, fields = IMPORT_ENTITIES[self.table]
+        record = {key: value for key, value in record.items() if key not in ['id', *READ_ONLY_FIELDS]}
+        data, error = validate(record)
+        if error:
+            return None, error
+        # all imported fields, so upserts replace every field
+        return {'key': data['name'], **{field: data.get(field) for field in fields}}, None
+
+    def _load_relations(self, rows):
+        """
+        Resolve the names of the relations and add the pairs of known ones
+        """
+        actors = self._ids(Actor, {data['actor'] for _, data in rows})
+        movies = self._ids(Movie, {data['movie'] for _, data in rows})
+        pairs = []
+        for number, data in rows:
+            if data['actor'] not in actors:
+                self._reject(number, "Actor not found")
+            elif data['movie'] not in movies:
+                self._reject(number, "Movie not found")
+            else:
+                pairs.append((actors[data['actor']], movies[data['movie']]))
+        if pairs:
+            Actor.bulk_add_relations(pairs)
+            self.loaded += len(pairs)
+
+    @staticmethod
+    def _ids(model, names):
+        return dict(db.session.execute(select(model.name, model.id).where(model.name.in_(names))).all())
+
+    def _reject(self, number, error):
+        self.rejected += 1
+        if len(self.rejects) < IMPORT_REJECTS_MAX:
+            self.rejects.append({'record': number, 'error': error})
+
+
+def import_data():
+    """
+    Import records streamed in the request body, upserted by name:
+        table    - actors, movies or association (`actor` and `movie` names)
+        format   - csv (default, with a header) or ndjson
+        compress - `gzip` if the body is compressed
+        start    - number of records to skip, the checkpoint of an interrupted import
+    """
+    args = get_request_args()
+    if args.get('table') not in IMPORT_TABLES:
+        return make_response(jsonify(error=f"Table must be one of: {', '.join(IMPORT_TABLES)}"), 400)
+    fmt = args.get('format', 'csv')
+    if fmt not in IMPORT_FORMATS:
+        return make_response(jsonify(error=f"Format must be one of: {', '.join(IMPORT_FORMATS)}"), 400)
+    if args.get('compress', 'gzip') != 'gzip':
+        return make_response(jsonify(error="Compress must be gzip"), 400)
+    try:
+        start = int(args.get('start', 0))
+    except ValueError:
+        return make_response(jsonify(error="Start must be an integer"), 400)
+
+    body = gzip.GzipFile(fileobj=request.stream) if 'compress' in args else request.stream
+    importer = Import(args['table'], start=start)
+    try:
+        report = importer.run(read_records(io.TextIOWrapper(body, encoding='utf-8', newline=''), fmt))
+    except Exception as e:
+        db.session.rollback()
+        return make_response(jsonify(error=f"Error occurred: {str(e)}", **importer.report()), 400)
+    return make_response(jsonify(report), 200)
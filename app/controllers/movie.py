@@ -1,21 +1,36 @@
 from flask import jsonify, make_response
 
-from datetime import datetime as dt
 from ast import literal_eval
 
+from core.idempotency import idempotent
 from models.actor import Actor
 from models.movie import Movie
-from settings.constants import MOVIE_FIELDS, DATE_FORMAT
-from .parse_request import get_request_data
+from models.relations import association
+from .bulk import create_records, delete_records, get_bulk_items, update_records
+from .conditional import (check_etag, check_record_etag, if_match_versions, record_etag, with_etag,
+                          with_record_etag)
+from .filtering import movie_filters
+from .pagination import get_page_params, list_records
+from .parse_request import get_request_args, get_request_data, parse_relation_ids
+from .serializers import movie_serializer, movie_cast
+from .validation import validate_movie
 
 
 def get_all_movies():
     """
     Get list of all movie records
+    Supports keyset pagination (`limit`, `after`), streaming (`stream`),
+    filters, sorting (`sort`) and sparse fieldsets (`fields`)
     """
-    all_movies = Movie.query.all()
-    movies = [{k: v for k, v in movie.__dict__.items() if k in MOVIE_FIELDS} for movie in all_movies]
-    return make_response(jsonify(movies), 200)
+    params, error = get_page_params(get_request_args(), movie_filters)
+    if error:
+        return error
+
+    etag, not_modified = check_etag([Movie.__table__])
+    if not_modified:
+        return not_modified
+
+    return with_etag(list_records(movie_serializer, params), etag)
 
 
 def get_movie_by_id():
@@ -28,17 +43,22 @@ def get_movie_by_id():
 
     try:
         movie_id = int(data['id'])
-    except ValueError:
+    except (ValueError, TypeError):
         return make_response(jsonify(error="ID must be an integer"), 400)
 
-    movie = Movie.query.filter_by(id=movie_id).first()
-    if not movie:
+    movie_data = movie_serializer.get_current(movie_id)
+    if not movie_data:
         return make_response(jsonify(error="Record with such ID does not exist"), 400)
 
-    movie_data = {k: v for k, v in movie.__dict__.items() if k in MOVIE_FIELDS}
-    return make_response(jsonify(movie_data), 200)
+    # tagged with the record version, which updates expect in `If-Match`
+    etag, not_modified = check_record_etag(movie_data)
+    if not_modified:
+        return not_modified
+
+    return with_record_etag(make_response(jsonify(movie_data), 200), etag)
 
 
+@idempotent
 def add_movie():
     """
     Add new movie
@@ -50,28 +70,17 @@ def add_movie():
     if not data:
         return make_response(jsonify(error="No input data provided"), 400)
 
-    # Validate required fields
-    required_fields = ['name', 'genre', 'year']
-    missing_fields = [field for field in required_fields if field not in data]
-    if missing_fields:
-        return make_response(jsonify(error=f"Missing fields: {', '.join(missing_fields)}"), 400)
-
-    # Validate `year`
-    try:
-        data['year'] = int(data['year'])
-    except ValueError:
-        return make_response(jsonify(error="Year must be an integer"), 400)
-
-    # Reject invalid fields
-    invalid_fields = [field for field in data.keys() if field not in MOVIE_FIELDS]
-    if invalid_fields:
-        return make_response(jsonify(error=f"Invalid fields: {', '.join(invalid_fields)}"), 400)
+    # Validate fields
+    data, error = validate_movie(data)
+    if error:
+        return make_response(jsonify(error=error), 400)
 
     try:
         # Use the create method from models/base.py
         new_movie = Movie.create(**data)
-        new_movie_data = {k: v for k, v in new_movie.__dict__.items() if k in MOVIE_FIELDS}
-        return make_response(jsonify(new_movie_data), 200)
+        new_movie_data = movie_serializer.encode(new_movie)
+        return with_record_etag(make_response(jsonify(new_movie_data), 200),
+                                record_etag(new_movie.id, new_movie.version))
     except Exception as e:
         return make_response(jsonify(error=str(e)), 400)
     ### END CODE HERE ###
@@ -90,35 +99,27 @@ def update_movie():
 
     try:
         movie_id = int(data["id"])
-    except ValueError:
+    except (ValueError, TypeError):
         return make_response(jsonify(error="Id must be an integer"), 400)
 
-    # Check if movie with given ID exists
-    movie = Movie.query.filter_by(id=movie_id).first()
-    if not movie:
-        return make_response(jsonify(error="Movie with such id does not exist"), 400)
-
-    # Validate input fields
-    valid_fields = MOVIE_FIELDS
-    invalid_fields = [field for field in data.keys() if field not in valid_fields]
-    if invalid_fields:
-        return make_response(jsonify(error=f"Invalid fields: {', '.join(invalid_fields)}"), 400)
-
-    # Validate `year` if present
-    if "year" in data:
-        try:
-            data["year"] = int(data["year"])
-        except ValueError:
-            return make_response(jsonify(error="Year must be an integer"), 400)
+    # Validate present fields
+    data, error = validate_movie(data, partial=True)
+    if error:
+        return make_response(jsonify(error=error), 400)
 
     try:
         # Use the update method from models/base.py
-        updated_movie = Movie.update(movie_id, **data)
+        # compare-and-swap of the version if the request has `If-Match`
+        versions = if_match_versions(movie_id)
+        updated_movie = Movie.update(movie_id, versions=versions, **data)
         if not updated_movie:
-            return make_response(jsonify(error="Error updating movie record"), 400)
+            if versions is not None and Movie.existing_ids([movie_id]):
+                return make_response(jsonify(error="Record was changed by another request"), 409)
+            return make_response(jsonify(error="Movie with such id does not exist"), 400)
 
-        updated_movie_data = {k: v for k, v in updated_movie.__dict__.items() if k in MOVIE_FIELDS}
-        return make_response(jsonify(updated_movie_data), 200)
+        updated_movie_data = movie_serializer.encode(updated_movie)
+        return with_record_etag(make_response(jsonify(updated_movie_data), 200),
+                                record_etag(updated_movie.id, updated_movie.version))
     except Exception as e:
         return make_response(jsonify(error=str(e)), 400)
     ### END CODE HERE ###
@@ -137,19 +138,14 @@ def delete_movie():
 
     try:
         movie_id = int(data["id"])
-    except ValueError:
+    except (ValueError, TypeError):
         return make_response(jsonify(error="Id must be an integer"), 400)
 
-    # Check if movie with given ID exists
-    movie = Movie.query.filter_by(id=movie_id).first()
-    if not movie:
-        return make_response(jsonify(error="Movie with such id does not exist"), 400)
-
     try:
         # Use the delete method from models/base.py
         deleted_movie = Movie.delete(movie_id)
         if not deleted_movie:
-            return make_response(jsonify(error="Error deleting movie record"), 400)
+            return make_response(jsonify(error="Movie with such id does not exist"), 400)
 
         return make_response(jsonify(message="Movie deleted successfully"), 200)
     except Exception as e:
@@ -157,64 +153,136 @@ def delete_movie():
     ### END CODE HERE ###
 
 
+def get_all_movies_cast():
+    """
+    Get list of all movie records with their cast
+    Supports keyset pagination (`limit`, `after`), streaming (`stream`),
+    filters, sorting (`sort`) and sparse fieldsets (`fields`)
+    """
+    params, error = get_page_params(get_request_args(), movie_filters)
+    if error:
+        return error
+
+    etag, not_modified = check_etag([Movie.__table__, association, Actor.__table__])
+    if not_modified:
+        return not_modified
+
+    return with_etag(list_records(movie_serializer, params, movie_cast), etag)
+
+
+def get_movie_relations():
+    """
+    Get movie by ID with full cast
+    """
+    data = get_request_data()
+
+    # Validate ID
+    try:
+        movie_id = int(data.get('id'))
+    except (ValueError, TypeError):
+        return make_response(jsonify(error="ID must be integer"), 400)
+
+    rel_movie = movie_serializer.get_current(movie_id)
+    if not rel_movie:
+        return make_response(jsonify(error="Movie not found"), 400)
+
+    etag, not_modified = check_etag([Movie.__table__, association, Actor.__table__], row_id=movie_id)
+    if not_modified:
+        return not_modified
+
+    rel_movie[movie_cast.key] = movie_cast.get(movie_id, etag)
+    return with_etag(make_response(jsonify(rel_movie), 200), etag)
+
+
+@idempotent
 def movie_add_relation():
     """
-    Add actor to movie's cast
+    Add actors to movie's cast
+    `relation_id` may be repeated to add several actors with one statement
     """
     data = get_request_data()
 
     # Validate IDs
     try:
         movie_id = int(data.get('id'))
-        actor_id = int(data.get('relation_id'))
+        actor_ids = parse_relation_ids()
     except (ValueError, TypeError):
         return make_response(jsonify(error="ID and relation_id must be integers"), 400)
 
     try:
-        # Query the actor and movie
-        actor = Actor.query.filter_by(id=actor_id).first()
-        movie = Movie.query.filter_by(id=movie_id).first()
-
-        if actor and movie:
-            # Add relation using the provided add_relation method
-            movie = Movie.add_relation(movie_id, actor)
-            # return make_response(jsonify(message="Relation added successfully"), 200)
-            rel_movie = {k: v for k, v in movie.__dict__.items() if k in MOVIE_FIELDS}
-            rel_movie['cast'] = str(movie.cast)
-            return make_response(jsonify(rel_movie), 200)
-        elif not actor:
-            return make_response(jsonify(error="Actor not found"), 400)
-        elif not movie:
+        # Query the movie, nothing is added if some actor doesn't exist
+        rel_movie = movie_serializer.get(movie_id)
+        if not rel_movie:
             return make_response(jsonify(error="Movie not found"), 400)
+
+        rel_movie['cast'] = Movie.add_relations(movie_id, actor_ids)
+        if rel_movie['cast'] is None:
+            return make_response(jsonify(error="Actor not found"), 400)
+        return make_response(jsonify(rel_movie), 200)
     except Exception as e:
         return make_response(jsonify(error=f"Error occurred: {str(e)}"), 400)
 
+
 def movie_clear_relations():
     """
     Clear all relations by id
+    or only the given ones if `relation_id` is specified (may be repeated)
     """
     data = get_request_data()
 
     # Validate IDs
     try:
         movie_id = int(data.get('id'))
+        actor_ids = parse_relation_ids() if 'relation_id' in data else None
     except (ValueError, TypeError):
         return make_response(jsonify(error="ID must be integer"), 400)
 
     try:
         # Fetch the movie from the database
-        movie = Movie.query.filter_by(id=movie_id).first()
+        rel_movie = movie_serializer.get(movie_id)
+        if not rel_movie:
+            return make_response(jsonify(error="Movie not found"), 400)
 
-        # Check if the movie exists
-        if movie:
+        if actor_ids is None:
             # Clear all relations for the movie
-            movie = Movie.clear_relations(movie_id)
-            # return make_response(jsonify(message="All relations cleared successfully"), 200)
-            rel_movie = {k: v for k, v in movie.__dict__.items() if k in MOVIE_FIELDS}
-            rel_movie['cast'] = str(movie.cast)
-            return make_response(jsonify(rel_movie), 200)
+            Movie.clear_relations(movie_id)
+            rel_movie['cast'] = []
         else:
-            return make_response(jsonify(error="Movie not found"), 400)
+            rel_movie['cast'] = Movie.remove_relations(movie_id, actor_ids)
+        return make_response(jsonify(rel_movie), 200)
     except Exception as e:
-        # db.session.rollback()
         return make_response(jsonify(error=f"Error occurred: {str(e)}"), 400)
+
+
+@idempotent
+def add_movies():
+    """
+    Add new movies from a JSON array of records
+    """
+    items, error = get_bulk_items()
+    if error:
+        return error
+
+    return create_records(movie_serializer, items, validate_movie)
+
+
+def update_movies():
+    """
+    Update movie records from a JSON array of records with ids
+    """
+    items, error = get_bulk_items()
+    if error:
+        return error
+
+    return update_records(movie_serializer, items, validate_movie)
+
+
+def delete_movies():
+    """
+    Delete movies from a JSON array of ids
+    """
+    items, error = get_bulk_items()
+    if error:
+        return error
+
+    return delete_records(Movie, items)
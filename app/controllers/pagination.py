@@ -0,0 +1,140 @@
+from flask import Response, current_app, jsonify, make_response, request, stream_with_context, url_for
+from sqlalchemy import and_, or_, select
+
+from core import db
+from settings.constants import PAGE_LIMIT_MAX, STREAM_CHUNK_SIZE, STREAM_FORMATS
+
+
+def get_page_params(data, filters=None):
+    """
+    Validate list parameters:
+        limit  - max number of records to return
+        after  - return records following the one with this id in the sort order (keyset cursor)
+        stream - stream records chunk by chunk as `json` array or `ndjson`
+    and filters, sort order and fields if the entity `filters` are given
+
+    data: dict with request parameters
+    filters: optional entity filters
+    return: tuple (params, error), error is a ready response or None
+    """
+    params = {'limit': None, 'after': None, 'stream': data.get('stream')}
+    for key in ('limit', 'after'):
+        if key in data:
+            try:
+                params[key] = int(data[key])
+            except ValueError:
+                return None, make_response(jsonify(error=f"{key.capitalize()} must be an integer"), 400)
+
+    if params['stream'] is not None and params['stream'] not in STREAM_FORMATS:
+        return None, make_response(jsonify(error=f"Stream must be one of: {', '.join(STREAM_FORMATS)}"), 400)
+
+    limit = params['limit']
+    if limit is not None and (limit < 1 or (limit > PAGE_LIMIT_MAX and not params['stream'])):
+        return None, make_response(jsonify(error=f"Limit must be between 1 and {PAGE_LIMIT_MAX}"), 400)
+
+    if filters:
+        query, error = filters.parse(data)
+        if error:
+            return None, make_response(jsonify(error=error), 400)
+        params.update(query)
+
+    return params, None
+
+
+def list_records(serializer, params, relation=None):
+    """
+    Get records, filtered and sorted (by id by default) with one statement,
+    paginated with keyset cursor or streamed
+
+    serializer: entity serializer
+    params: dict from `get_page_params`
+    relation: optional relation to attach to every record
+    """
+    if params.get('fields'):
+        serializer = serializer.project(params['fields'])
+    id_column = serializer.model.__table__.c.id
+    column, descending = params.get('sort') or (id_column, False)
+
+    stmt = serializer.select().where(*params.get('where', ())).order_by(*_order(column, id_column, descending))
+    if params['after'] is not None:
+        stmt = stmt.where(_after(column, id_column, descending, params['after']))
+    if params['limit'] is not None:
+        stmt = stmt.limit(params['limit'])
+
+    if params['stream']:
+        return stream_records(stmt, serializer.encode_row, params['stream'], relation)
+
+    records = [serializer.encode_row(row) for row in db.session.execute(stmt)]
+    if relation:
+        relation.attach(records)
+    response = make_response(jsonify(records), 200)
+    if params['limit'] is not None and len(records) == params['limit']:
+        # there may be more records - point the client to the next page
+        args = {**request.args.to_dict(), 'after': records[-1]['id']}
+        response.headers['Link'] = f'<{url_for(request.endpoint, _external=True, **args)}>; rel="next"'
+    return response
+
+
+def _order(column, id_column, descending):
+    """
+    Sort order with id as the tie-breaker, NULLs last in ascending order
+    and first in descending order (the reverse of the ascending index order)
+    """
+    if column is id_column:
+        return [id_column.desc() if descending else id_column]
+    if descending:
+        return [column.desc().nulls_first(), id_column.desc()]
+    return [column.asc().nulls_last(), id_column]
+
+
+def _after(column, id_column, descending, after):
+    """
+    Keyset condition for records following the record `after` in the sort order of `_order`,
+    its sort value is read by a subquery so the page is still one statement
+    """
+    if column is id_column:
+        return id_column < after if descending else id_column > after
+
+    cursor = column.table.alias('cursor')
+    value = select(cursor.c[column.name]).where(cursor.c.id == after).scalar_subquery()
+    if descending:
+        return or_(column < value, and_(column == value, id_column < after),
+                   and_(value.is_(None), or_(column.is_not(None), id_column < after)))
+    return or_(column > value, and_(column == value, id_column > after),
+               and_(column.is_(None), or_(value.is_not(None), id_column > after)))
+
+
+def stream_records(stmt, encode_row, fmt, relation=None):
+    """
+    Stream statement results from a server-side cursor, one chunk per round trip,
+    so memory does not depend on the number of records
+
+    stmt: select statement to stream
+    encode_row: function to turn a row into a dict
+    fmt: `json` (one JSON array) or `ndjson` (one JSON object per line)
+    relation: optional relation to attach to every record, loaded once per chunk
+    """
+    dumps = current_app.json.dumps
+
+    def generate():
+        started = False
+        result = db.session.execute(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+        for rows in result.partitions():
+            records = [encode_row(row) for row in rows]
+            if relation:
+                relation.attach(records)
+            yield _encode_chunk([dumps(record) for record in records], fmt, started)
+            started = True
+        if fmt == 'json':
+            yield ']' if started else '[]'
+
+    return Response(stream_with_context(generate()), status=200, mimetype=STREAM_FORMATS[fmt])
+
+
+def _encode_chunk(chunk, fmt, started):
+    """
+    Join encoded records of one chunk
+    """
+    if fmt == 'ndjson':
+        return '\n'.join(chunk) + '\n'
+    return (',' if started else '[') + ','.join(chunk)
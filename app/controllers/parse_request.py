@@ -1,23 +1,87 @@
+import logging
+
 from flask import request
 
+log = logging.getLogger(__name__)
+
 
 def get_request_data():
     """
     Get keys & values from the request.
-    Parses requests with content type "application/x-www-form-urlencoded".
+    Parses requests with content type "application/x-www-form-urlencoded"
+    or "application/json" with an object body.
 
     Returns:
         dict: A dictionary with keys and values from the request.
     """
     try:
-        # Ensure the request content type is "application/x-www-form-urlencoded"
-        if request.content_type == "application/x-www-form-urlencoded":
+        if request.mimetype == "application/x-www-form-urlencoded":
             # Retrieve form data as a dictionary
             data = request.form.to_dict()
             return data
+        elif request.is_json:
+            data = request.get_json()
+            if not isinstance(data, dict):
+                raise ValueError("Invalid JSON body. Expected an object.")
+            return data
         else:
-            raise ValueError("Invalid content type. Expected 'application/x-www-form-urlencoded'.")
+            raise ValueError("Invalid content type. Expected 'application/x-www-form-urlencoded' or 'application/json'.")
     except Exception as e:
-        # Handle any exceptions and log them if needed
-        print(f"Error parsing request data: {e}")
+        log.debug("Error parsing request data: %s", e)
         return {}
+
+
+def get_request_list(key):
+    """
+    Get all values of a key repeated in the request form
+    (e.g. `relation_id=1&relation_id=2`) or given as a JSON array.
+
+    Returns:
+        list: Values of the key, empty if it is missing.
+    """
+    if request.mimetype == "application/x-www-form-urlencoded":
+        return request.form.getlist(key)
+    value = get_request_data().get(key)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def parse_relation_ids():
+    """
+    Get integer ids from repeated `relation_id` keys of the request form
+    or a `relation_id` JSON array.
+
+    Returns:
+        list: Unique ids in request order.
+    Raises:
+        ValueError: If there is no id or some id is not an integer.
+    """
+    rel_ids = get_request_list('relation_id')
+    if any(isinstance(rel_id, (bool, float)) for rel_id in rel_ids):
+        raise ValueError("relation_id must be integer")
+    ids = list(dict.fromkeys(int(rel_id) for rel_id in rel_ids))
+    if not ids:
+        raise ValueError("No relation_id specified")
+    return ids
+
+
+def get_request_args():
+    """
+    Get keys & values from the request query string.
+
+    Returns:
+        dict: A dictionary with keys and values from the query string.
+    """
+    return request.args.to_dict()
+
+
+def get_request_json():
+    """
+    Get JSON value from the request body.
+    Parses requests with content type "application/json".
+
+    Returns:
+        JSON value from the request or None if it is missing or malformed.
+    """
+    return request.get_json(silent=True)
@@ -0,0 +1,253 @@
+import heapq
+import logging
+import threading
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+
+from flask import current_app, jsonify, make_response, request, url_for
+from sqlalchemy import case, func, literal, or_, select, union_all
+
+from core import db
+from models.actor import Actor
+from models.movie import Movie
+from models.versions import get_versions
+from settings.constants import SEARCH_INDEX_WAIT, SEARCH_LIMIT_MAX, SEARCH_SIMILARITY
+from .conditional import check_etag, with_etag
+from .parse_request import get_request_args
+
+log = logging.getLogger(__name__)
+
+# result type -> model
+ENTITIES = {'actor': Actor, 'movie': Movie}
+
+# match ranks: whole name, prefix of the name or of one of its words, fuzzy only
+EXACT, PREFIX, FUZZY = 2, 1, 0
+MATCHES = {EXACT: 'exact', PREFIX: 'prefix', FUZZY: 'fuzzy'}
+
+
+def trigrams(text):
+    """
+    Trigrams of a text as pg_trgm extracts them: words of letters and digits,
+    lower case, padded with two spaces in front and one behind
+    """
+    grams = set()
+    word = []
+    for char in text.lower() + ' ':
+        if char.isalnum():
+            word.append(char)
+        elif word:
+            padded = f"  {''.join(word)} "
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+            word = []
+    return grams
+
+
+def word_starts(name):
+    """
+    Positions where a name or one of its words starts (after a space)
+    """
+    return [0] + [i + 1 for i, char in enumerate(name) if char == ' ' and i + 1 < len(name)]
+
+
+class NameIndex(object):
+    """
+    In-process name index of one entity, used on databases without trigram indexes.
+
+    Prefix matches come from a sorted array of name suffixes starting at word
+    boundaries (a flattened trie: one binary search, then a scan of the matches),
+    fuzzy matches from an inverted index of trigrams with pg_trgm similarity,
+    counted from the postings of the query trigrams.
+    The index is rebuilt when the table version changes, so it sees the writes
+    of every worker. Rebuilds run in a background thread, searches wait for them
+    a little and use the previous index if they take longer.
+    """
+
+    def __init__(self, model):
+        """
+        model: model class with `name`
+        """
+        self.model = model
+        self.version = None
+        self.data = ({}, [], {}, {})
+        self.loading = None
+        self._lock = threading.Lock()
+
+    def refresh(self, version):
+        """
+        Bring the index to `version` of the table: the first build blocks, a rebuild
+        is waited for up to SEARCH_INDEX_WAIT seconds
+
+        return: True if the index is at `version` (or newer), False if it is older
+        """
+        if self.version is None:
+            with self._lock:
+                if self.version is None:
+                    self.load()
+        if self.version < version:
+            self.reload().wait(SEARCH_INDEX_WAIT)
+        return self.version >= version
+
+    def load(self):
+        """
+        Build the index from the table in the current app context (blocking)
+        """
+        # read before the names, which may only be newer: writes bump versions after commit
+        version = get_versions([self.model.__table__])[0]
+        names, keys, postings, sizes = {}, [], {}, {}
+        for row_id, name in db.session.execute(select(self.model.id, self.model.name)):
+            lower = name.lower()
+            names[row_id] = (name, lower)
+            keys.extend((lower[start:], row_id) for start in word_starts(lower))
+            grams = trigrams(name)
+            sizes[row_id] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(row_id)
+        keys.sort()
+        self.data, self.version = (names, keys, postings, sizes), version
+
+    def reload(self):
+        """
+        Rebuild the index in a background thread, unless it is rebuilding already
+
+        return: event set once the rebuild is done
+        """
+        with self._lock:
+            done = self.loading
+            if done is None:
+                done = self.loading = threading.Event()
+                thread = threading.Thread(target=self._reload, args=(current_app._get_current_object(), done),
+                                          name=f'{self.model.__tablename__}-name-index', daemon=True)
+                thread.start()
+            return done
+
+    def _reload(self, app, done):
+        try:
+            with app.app_context():
+                self.load()
+        except Exception:
+            log.exception("Name index rebuild failed")
+        finally:
+            self.loading = None
+            done.set()
+
+    def search(self, query):
+        """
+        query: lower case search text
+        return: list of (rank, score, name, id)
+        """
+        names, keys, postings, sizes = self.data
+        query_grams = trigrams(query)
+        # counting the postings gives how many query trigrams each name shares
+        shared = Counter(chain.from_iterable(postings.get(gram, ()) for gram in query_grams))
+
+        def score(row_id, count):
+            total = len(query_grams) + sizes[row_id] - count
+            return count / total if total else 0.0
+
+        matches = {}
+        i = bisect_left(keys, (query,))
+        while i < len(keys) and keys[i][0].startswith(query):
+            row_id = keys[i][1]
+            matches[row_id] = (EXACT if names[row_id][1] == query else PREFIX, score(row_id, shared[row_id]))
+            i += 1
+
+        # a similar name shares at least SEARCH_SIMILARITY of the query trigrams
+        least = SEARCH_SIMILARITY * len(query_grams)
+        for row_id, count in shared.items():
+            if count >= least and row_id not in matches:
+                similarity = score(row_id, count)
+                if similarity >= SEARCH_SIMILARITY:
+                    matches[row_id] = (FUZZY, similarity)
+        return [(match[0], match[1], names[row_id][0], row_id) for row_id, match in matches.items()]
+
+
+name_indexes = {entity: NameIndex(model) for entity, model in ENTITIES.items()}
+
+
+def search(query, entities, limit, offset):
+    """
+    Find records by name, ranked by match kind (exact, prefix, fuzzy), then by trigram similarity
+
+    query: lower case search text
+    entities: list of result types to search
+    limit, offset: page of the ranked results
+    return: tuple (list of (type, rank, score, name, id), current),
+            current is False if the results come from an index still being rebuilt
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return _search_sql(query, entities, limit, offset), True
+
+    versions = get_versions([ENTITIES[entity].__table__ for entity in entities])
+    results, current = [], True
+    for entity, version in zip(entities, versions):
+        current = name_indexes[entity].refresh(version) and current
+        results.extend((entity, *match) for match in name_indexes[entity].search(query))
+    ranked = heapq.nsmallest(offset + limit, results,
+                             key=lambda result: (-result[1], -result[2], result[3], result[0], result[4]))
+    return ranked[offset:], current
+
+
+def _search_sql(query, entities, limit, offset):
+    """
+    One ranked UNION ALL over the entities, matched with the trigram (pg_trgm GIN) indexes on lower(name)
+    """
+    # `%` matches names at least as similar as the server's threshold, set to SEARCH_SIMILARITY
+    # for this transaction (a pooled server connection may change between transactions)
+    # so the results are the ones of the in-process index
+    db.session.execute(select(func.set_config('pg_trgm.similarity_threshold', str(SEARCH_SIMILARITY), True)))
+    selects = []
+    for entity in entities:
+        model = ENTITIES[entity]
+        name = func.lower(model.name)
+        prefix = or_(name.startswith(query, autoescape=True), name.contains(f' {query}', autoescape=True))
+        rank = case((name == query, EXACT), (prefix, PREFIX), else_=FUZZY)
+        selects.append(select(literal(entity).label('type'), rank.label('rank'),
+                              func.similarity(name, query).label('score'), model.name, model.id)
+                       .where(or_(prefix, name.op('%')(query))))
+    matches = union_all(*selects).subquery()
+    stmt = select(matches) \
+        .order_by(matches.c.rank.desc(), matches.c.score.desc(), matches.c.name, matches.c.type, matches.c.id) \
+        .limit(limit).offset(offset)
+    return db.session.execute(stmt).all()
+
+
+def search_names():
+    """
+    Search actors and movies by name for type-ahead:
+        q      - search text, matches whole names, prefixes of names or their words,
+                 and similar names (typos)
+        type   - `actor` or `movie`, both by default
+        limit  - max number of results
+        offset - number of results to skip
+    """
+    args = get_request_args()
+    query = args.get('q', '').strip().lower()
+    if not query:
+        return make_response(jsonify(error="No query specified"), 400)
+
+    entities = [args['type']] if 'type' in args else list(ENTITIES)
+    if any(entity not in ENTITIES for entity in entities):
+        return make_response(jsonify(error=f"Type must be one of: {', '.join(ENTITIES)}"), 400)
+
+    try:
+        limit, offset = int(args.get('limit', 10)), int(args.get('offset', 0))
+    except ValueError:
+        return make_response(jsonify(error="Limit and offset must be integers"), 400)
+    if not 1 <= limit <= SEARCH_LIMIT_MAX or offset < 0:
+        return make_response(jsonify(error=f"Limit must be between 1 and {SEARCH_LIMIT_MAX}, "
+                                           f"offset must not be negative"), 400)
+
+    etag, not_modified = check_etag([ENTITIES[entity].__table__ for entity in entities])
+    if not_modified:
+        return not_modified
+
+    matches, current = search(query, entities, limit, offset)
+    results = [{'type': entity, 'id': row_id, 'name': name, 'match': MATCHES[rank], 'score': round(score, 3)}
+               for entity, rank, score, name, row_id in matches]
+    response = make_response(jsonify(results), 200)
+    if len(results) == limit:
+        args = {**args, 'offset': offset + limit}
+        response.headers['Link'] = f'<{url_for(request.endpoint, _external=True, **args)}>; rel="next"'
+    # results of a previous index are not tagged with the versions they don't have yet
+    return with_etag(response, etag) if current else response
@@ -0,0 +1,188 @@
+from sqlalchemy import Date, select
+
+from core import db
+from core.cache import cache, entity_key, relation_key
+from models.actor import Actor
+from models.base import related_column, relation_column
+from models.movie import Movie
+from models.relations import association
+from settings.constants import ACTOR_FIELDS, MOVIE_FIELDS, DATE_FORMAT
+
+
+def _format_date(value):
+    return value.strftime(DATE_FORMAT) if value is not None else None
+
+
+class Serializer(object):
+    """
+    Turns records of one entity into response dicts.
+
+    Reads only the declared columns as plain row tuples (no ORM hydration)
+    and maps them through an encoder compiled once per entity.
+    """
+
+    def __init__(self, model, fields):
+        """
+        model: model class
+        fields: list of column names to expose
+        """
+        self.model = model
+        self.fields = tuple(fields)
+        self.columns = tuple(model.__table__.c[field] for field in self.fields)
+        self.encode_row = self._compile()
+        self._projections = {}
+
+    def _compile(self):
+        """
+        Build `encode_row(row) -> dict` specialized for the entity columns
+        """
+        namespace = {'_format_date': _format_date}
+        items = []
+        for i, column in enumerate(self.columns):
+            value = f'row[{i}]'
+            if isinstance(column.type, Date):
+                value = f'_format_date({value})'
+            items.append(f'{column.name!r}: {value}')
+        source = f"def encode_row(row):\n    return {{{', '.join(items)}}}\n"
+        exec(compile(source, f'<{self.model.__name__} encoder>', 'exec'), namespace)
+        return namespace['encode_row']
+
+    def select(self):
+        """
+        Select statement for the exposed columns only
+        """
+        return select(*self.columns)
+
+    def project(self, fields):
+        """
+        Serializer of a subset of the exposed fields (sparse fieldset),
+        `id` is always included, encoders are compiled once per subset
+
+        fields: list of exposed field names
+        """
+        fields = tuple(field for field in self.fields if field == 'id' or field in fields)
+        if fields not in self._projections:
+            self._projections[fields] = Serializer(self.model, fields)
+        return self._projections[fields]
+
+    def get(self, row_id):
+        """
+        Get encoded record by id, read through the cache.
+        A record loaded before a concurrent write may be cached after the write
+        invalidated it and served until it expires, responses tagged with versions
+        use `get_current`
+
+        row_id: record id
+        return: dict or None if the record does not exist
+        """
+        key = entity_key(self.model.__table__, row_id)
+        record = cache.get(key)
+        if record is None:
+            row = db.session.execute(self.select().where(self.model.id == row_id)).first()
+            if row is None:
+                return None
+            record = self.encode_row(row)
+            cache.set(key, record)
+        return dict(record)
+
+    def get_current(self, row_id):
+        """
+        Get encoded record by id at its current version: the version is read from the
+        database with a primary key lookup and the cached record is used only if it has it,
+        so records cached before a write of another process are never served
+
+        row_id: record id
+        return: dict or None if the record does not exist
+        """
+        key = entity_key(self.model.__table__, row_id)
+        record = cache.get(key)
+        if record is not None:
+            version = db.session.execute(select(self.model.version).where(self.model.id == row_id)).scalar()
+            if version == record['version']:
+                return dict(record)
+            cache.delete(key)
+            if version is None:
+                return None
+        return self.get(row_id)
+
+    def encode(self, obj):
+        """
+        Encode an already loaded model instance
+        """
+        return self.encode_row(tuple(getattr(obj, field) for field in self.fields))
+
+
+class Relation(object):
+    """
+    Attaches related records to encoded records.
+
+    Related rows of a whole batch of records are read with one IN query
+    over `association`, instead of one lazy load per record.
+    """
+
+    def __init__(self, model, key, serializer):
+        """
+        model: model class of the owner records
+        key: name of the attached list in the owner dicts
+        serializer: serializer of the related entity
+        """
+        self.model = model
+        self.key = key
+        self.serializer = serializer
+        self.owner = relation_column(model)
+        self.related = related_column(model)
+
+    def select(self, row_ids):
+        """
+        Select statement for (owner id, *related columns) of the given owners
+        """
+        table = self.serializer.model.__table__
+        return select(self.owner, *self.serializer.columns) \
+            .join_from(association, table, self.related == table.c.id) \
+            .where(self.owner.in_(row_ids)) \
+            .order_by(self.owner, self.related)
+
+    def get(self, row_id, stamp):
+        """
+        Get encoded related records of one owner, read through the cache.
+        The entry is stamped with the table versions read before loading it and
+        used only with the same stamp: an entry loaded before a concurrent write
+        and cached after the write invalidated it has the stamp of the versions
+        before the write, so it is never served once they are bumped
+
+        row_id: owner record id
+        stamp: ETag of the response, made from the versions of the tables it reads
+        return: list of dicts
+        """
+        key = relation_key(self.model.__table__, row_id)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == stamp:
+            records = entry[1]
+        else:
+            encode_row = self.serializer.encode_row
+            records = [encode_row(row[1:]) for row in db.session.execute(self.select([row_id]))]
+            cache.set(key, [stamp, records])
+        return [dict(record) for record in records]
+
+    def attach(self, records):
+        """
+        Add the list of related records to each of the encoded records
+
+        records: list of dicts with `id`
+        return: the same records
+        """
+        groups = {}
+        for record in records:
+            record[self.key] = groups.setdefault(record['id'], [])
+        if groups:
+            encode_row = self.serializer.encode_row
+            for row in db.session.execute(self.select(list(groups))):
+                groups[row[0]].append(encode_row(row[1:]))
+        return records
+
+
+actor_serializer = Serializer(Actor, ACTOR_FIELDS)
+movie_serializer = Serializer(Movie, MOVIE_FIELDS)
+
+actor_filmography = Relation(Actor, 'filmography', movie_serializer)
+movie_cast = Relation(Movie, 'cast', actor_serializer)
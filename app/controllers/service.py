@@ -0,0 +1,30 @@
+from flask import Response, jsonify, make_response
+
+from core import db
+from core.cache import cache
+from core.metrics import registry
+from core.pool import pool_stats
+from settings.constants import METRICS
+
+
+def get_cache_stats():
+    """
+    Get cache backend counters
+    """
+    return make_response(jsonify(cache.stats()), 200)
+
+
+def get_pool_stats():
+    """
+    Get database connection pool counters
+    """
+    return make_response(jsonify(pool_stats(db.session.get_bind())), 200)
+
+
+def get_metrics():
+    """
+    Get request and SQL metrics of this process in the Prometheus text format
+    """
+    if not METRICS:
+        return make_response(jsonify(error="Metrics are off"), 404)
+    return Response(registry.render(), status=200, mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,43 @@
+from flask import jsonify, make_response
+
+from models.actor import Actor
+from models.movie import Movie
+from models.relations import association
+from models.rollups import actors_by_gender_decade, movies_by_cast_size, movies_by_genre_year
+from settings.constants import STATS_ROLLUPS
+from .conditional import check_etag, with_etag
+
+
+def get_stats(rollup, tables):
+    """
+    Groups of a rollup with their counts, read from the rollup table
+    when STATS_ROLLUPS is on, otherwise by GROUP BY over the tables
+
+    tables: tables the groups are counted from
+    """
+    etag, not_modified = check_etag(tables)
+    if not_modified:
+        return not_modified
+
+    return with_etag(make_response(jsonify(rollup.rows(STATS_ROLLUPS)), 200), etag)
+
+
+def get_movie_stats():
+    """
+    Get number of movies per genre per year
+    """
+    return get_stats(movies_by_genre_year, [Movie.__table__])
+
+
+def get_cast_size_stats():
+    """
+    Get number of movies per cast size (number of actors)
+    """
+    return get_stats(movies_by_cast_size, [Movie.__table__, association])
+
+
+def get_actor_stats():
+    """
+    Get number of actors per gender and birth decade
+    """
+    return get_stats(actors_by_gender_decade, [Actor.__table__])
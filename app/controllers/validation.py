@@ -0,0 +1,104 @@
+from datetime import datetime as dt
+
+from sqlalchemy import Date, Integer, String
+
+from models.actor import Actor
+from models.movie import Movie
+from settings.constants import (ACTOR_FIELDS, ACTOR_REQUIRED_FIELDS, DATE_FORMAT,
+                                MOVIE_FIELDS, MOVIE_REQUIRED_FIELDS, READ_ONLY_FIELDS)
+
+
+def _parse_date(value):
+    return dt.strptime(value, DATE_FORMAT).date()
+
+
+def _parse_int(value):
+    if isinstance(value, (bool, float)):
+        raise TypeError("Not an integer")
+    return int(value)
+
+
+def _parse_string(length):
+    def parse(value):
+        if not isinstance(value, str) or (length is not None and len(value) > length):
+            raise ValueError("Not a string of allowed length")
+        return value
+    return parse
+
+
+class Validator(object):
+    """
+    Validates request fields of one entity and converts them to column types.
+
+    Rules are derived once from the model columns: a converter and an error
+    message per field, required fields and the set of allowed fields.
+    A call is a single pass over the request fields.
+    """
+
+    def __init__(self, model, fields, required):
+        """
+        model: model class
+        fields: list of fields allowed in requests
+        required: list of fields required to create a record, columns which are
+                  not nullable are required as well
+        """
+        columns = [model.__table__.c[field] for field in fields]
+        self.required = tuple(required) + tuple(
+            column.name for column in columns
+            if not column.nullable and not column.primary_key and column.name not in required)
+        self.converters = {column.name: self._compile(column) for column in columns}
+
+    @staticmethod
+    def _compile(column):
+        """
+        Build `convert(value)` for the column and its error message
+        """
+        label = column.name.replace('_', ' ').capitalize()
+        if isinstance(column.type, Date):
+            parse, message = _parse_date, f"Date must be in {DATE_FORMAT} format"
+        elif isinstance(column.type, Integer):
+            parse, message = _parse_int, f"{label} must be an integer"
+        elif isinstance(column.type, String):
+            length = column.type.length
+            parse, message = _parse_string(length), f"{label} must be a string of at most {length} characters"
+        else:
+            parse, message = (lambda value: value), None
+
+        if column.nullable:
+            def convert(value):
+                return None if value is None else parse(value)
+            return convert, message
+        return parse, message
+
+    def __call__(self, data, partial=False):
+        """
+        data: dict with entity fields
+        partial: validate only the fields that are present (update)
+        return: tuple (data, error), error is a message or None
+        """
+        # Check if all required fields specified
+        if not partial:
+            missing_fields = [field for field in self.required if field not in data]
+            if missing_fields:
+                return None, f"Missing fields: {', '.join(missing_fields)}"
+
+        # Reject invalid fields
+        converters = self.converters
+        invalid_fields = [field for field in data if field not in converters]
+        if invalid_fields:
+            return None, f"Invalid fields: {', '.join(invalid_fields)}"
+
+        result = {}
+        for field, value in data.items():
+            convert, message = converters[field]
+            try:
+                result[field] = convert(value)
+            except (ValueError, TypeError):
+                return None, message
+        return result, None
+
+
+validate_actor = Validator(Actor, [field for field in ACTOR_FIELDS if field not in READ_ONLY_FIELDS],
+                           ACTOR_REQUIRED_FIELDS)
+validate_movie = Validator(Movie, [field for field in MOVIE_FIELDS if field not in READ_ONLY_FIELDS],
+                           MOVIE_REQUIRED_FIELDS)
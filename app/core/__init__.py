@@ -1,24 +1,60 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.record_queries import get_recorded_queries
+from sqlalchemy import MetaData
 
-from settings.constants import DB_URL
+from settings.constants import DB_URL, RECORD_QUERIES, SCHEMA_CHECK
+from .metrics import init_metrics, instrument_engine
+from .migrations import check_schema
+from .pool import configure_engine, engine_options
+from .profiling import init_profiling, record_statements
+from .session import SessionProxy
 
-db = SQLAlchemy()
+# constraint names as PostgreSQL gives them, so migrations can refer to them by name
+NAMING_CONVENTION = {
+    'ix': 'ix_%(column_0_label)s',
+    'uq': '%(table_name)s_%(column_0_name)s_key',
+    'fk': '%(table_name)s_%(column_0_name)s_fkey',
+    'pk': '%(table_name)s_pkey',
+}
+
+db = SQLAlchemy(metadata=MetaData(naming_convention=NAMING_CONVENTION))
+db.session = SessionProxy(db.session)
 
 
 def create_app():
     """Construct the core application."""
     app = Flask(__name__, instance_relative_config=False)
     app.config['SQLALCHEMY_DATABASE_URI'] = DB_URL
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(DB_URL)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # silence the deprecation warning
+    app.config['SQLALCHEMY_RECORD_QUERIES'] = RECORD_QUERIES
+
+    if RECORD_QUERIES:
+        app.after_request(add_query_count)
+    init_profiling(app)
+    init_metrics(app)
 
     db.init_app(app)
 
     with app.app_context():
+        configure_engine(db.engine)
+        instrument_engine(db.engine)
+        record_statements(db.engine)
+
         # Imports
         from . import routes
 
-        # Create tables for our models
-        db.create_all()
+        # Tables are created by migrations (`alembic upgrade head`)
+        if SCHEMA_CHECK:
+            check_schema(db.engine)
+
+        return app
+
 
-        return app
\ No newline at end of file
+def add_query_count(response):
+    """
+    Report number of SQL statements executed by the request
+    """
+    response.headers['X-Query-Count'] = str(len(get_recorded_queries()))
+    return response
@@ -0,0 +1,147 @@
+import io
+import sys
+
+from flask_sqlalchemy.record_queries import _listen as record_queries
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.util import await_only
+
+from settings.constants import DB_URL, RECORD_QUERIES
+from . import create_app
+from .metrics import instrument_engine
+from .pool import configure_engine, engine_options
+from .profiling import record_statements
+from .session import bind_session
+
+# sync driver -> async driver of the same database
+ASYNC_DRIVERS = {'postgresql': 'asyncpg', 'sqlite': 'aiosqlite'}
+
+
+def async_url(db_url):
+    """
+    Database URL for the async driver of the configured database
+    """
+    url = make_url(db_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for '{backend}' databases")
+    if backend == 'sqlite' and url.database in (None, '', ':memory:'):
+        raise ValueError("In-memory SQLite is not shared with the async engine, use a database file")
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+class AsyncApp(object):
+    """
+    ASGI application serving the Flask routes as async handlers.
+
+    Every request gets its own `AsyncSession` and its view runs inside
+    `AsyncSession.run_sync`: `db.session` is bound to the sync facade of that
+    session, so the same controllers, validation and serialization are used,
+    while every statement awaits the async driver and the event loop keeps
+    serving other requests meanwhile.
+    """
+
+    def __init__(self, app, engine):
+        """
+        app: Flask application with the routes
+        engine: async engine
+        """
+        self.app = app
+        self.engine = engine
+        self.sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            body = await _read_body(receive)
+            async with self.sessions() as session:
+                await session.run_sync(self._dispatch, _environ(scope, body), send)
+
+    def _dispatch(self, session, environ, send):
+        """
+        Run the view and send its response, `send` is awaited from within the session greenlet
+        so streamed bodies are sent chunk by chunk
+        """
+        with bind_session(session), self.app.request_context(environ):
+            try:
+                response = self.app.full_dispatch_request()
+            except Exception as e:
+                response = self.app.make_response(self.app.handle_exception(e))
+            try:
+                headers = [(key.lower().encode('latin-1'), value.encode('latin-1'))
+                           for key, value in response.headers.items()]
+                await_only(send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers}))
+                for chunk in response.iter_encoded():
+                    if chunk:
+                        await_only(send({'type': 'http.response.body', 'body': chunk, 'more_body': True}))
+                await_only(send({'type': 'http.response.body', 'body': b''}))
+            finally:
+                response.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app():
+    """
+    Construct the application for the async serving mode
+    """
+    app = create_app()
+    url = async_url(DB_URL)
+    engine = create_async_engine(url, **engine_options(url, asynchronous=True))
+    configure_engine(engine.sync_engine)
+    instrument_engine(engine.sync_engine)
+    record_statements(engine.sync_engine)
+    if RECORD_QUERIES:
+        record_queries(engine.sync_engine)
+    return AsyncApp(app, engine)
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def _environ(scope, body):
+    """
+    WSGI environ of an ASGI HTTP request
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
@@ -0,0 +1,199 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from settings.constants import CACHE_BACKEND, CACHE_SIZE, CACHE_TTL, CACHE_URL
+
+
+def entity_key(table, row_id):
+    """
+    Cache key of an encoded record
+    """
+    return f'{table.name}:{row_id}'
+
+
+def relation_key(table, row_id):
+    """
+    Cache key of the encoded related records of a record
+    """
+    return f'{table.name}:{row_id}:relations'
+
+
+class Cache(object):
+    """
+    Interface of cache backends, values are JSON-compatible.
+    Counts hits, misses and evictions.
+    """
+
+    name = None
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        return: cached value or None
+        """
+        raise NotImplementedError
+
+    def get_many(self, keys):
+        """
+        return: dict key -> value of the cached keys
+        """
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def stats(self):
+        return {'backend': self.name, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class NullCache(Cache):
+    """
+    Caching disabled, every lookup is a miss
+    """
+
+    name = 'none'
+
+    def get(self, key):
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+
+class LRUCache(Cache):
+    """
+    In-process cache bounded by size, least recently used entries are evicted first.
+    Entries expire after `ttl` seconds, which also bounds staleness
+    between worker processes since each one has its own cache.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_size, ttl):
+        super().__init__()
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def stats(self):
+        return {**super().stats(), 'size': len(self._data), 'max_size': self.max_size}
+
+
+class SharedCache(Cache):
+    """
+    Cache shared by all workers in a key-value server.
+
+    client: redis-like client with `get(key)`, `set(key, value, ex=seconds)` and `delete(*keys)`
+    Evictions happen on the server and are not counted here.
+    """
+
+    name = 'shared'
+
+    def __init__(self, client, ttl, prefix='api:'):
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+
+class LocalClient(object):
+    """
+    In-process stand-in for a redis client (development and tests)
+    """
+
+    def __init__(self):
+        self._data = {}
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None or (item[0] is not None and item[0] < time.monotonic()):
+            return None
+        return item[1]
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self.get(key) is not None:
+            return None
+        self._data[key] = (time.monotonic() + ex if ex is not None else None, value)
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self._data.pop(key, None)
+
+
+def create_cache(backend=CACHE_BACKEND):
+    """
+    Construct the cache configured in settings
+    """
+    if backend == 'none':
+        return NullCache()
+    if backend == 'shared':
+        if not CACHE_URL:
+            return SharedCache(LocalClient(), CACHE_TTL)
+        import redis  # optional dependency, needed only for a shared cache server
+        return SharedCache(redis.Redis.from_url(CACHE_URL), CACHE_TTL)
+    if backend == 'memory':
+        return LRUCache(CACHE_SIZE, CACHE_TTL)
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+cache = create_cache()
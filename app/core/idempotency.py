@@ -0,0 +1,176 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, jsonify, make_response, request
+
+from settings.constants import (CACHE_URL, IDEMPOTENCY_BACKEND, IDEMPOTENCY_KEY_MAX, IDEMPOTENCY_PENDING_TTL,
+                                IDEMPOTENCY_SIZE, IDEMPOTENCY_TTL)
+from .cache import LocalClient
+
+# A record is a list: [request fingerprint] while the first request runs,
+# [request fingerprint, status, mimetype, body, etag] once its response is stored
+
+
+class MemoryStore(object):
+    """
+    In-process key -> record store bounded by size, the oldest entries are evicted first.
+    Entries expire after their ttl. Each worker process has its own store.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                return None
+            return item[1]
+
+    def add(self, key, record, ttl):
+        """
+        Store a record unless the key has one already
+
+        return: True if stored
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] >= time.monotonic():
+                return False
+            self._set(key, record, ttl)
+            return True
+
+    def set(self, key, record, ttl):
+        with self._lock:
+            self._set(key, record, ttl)
+
+    def _set(self, key, record, ttl):
+        self._data[key] = (time.monotonic() + ttl, record)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SharedStore(object):
+    """
+    Store shared by all workers in a key-value server, expiry is left to the server
+
+    client: redis-like client with `get(key)`, `set(key, value, ex=seconds, nx=False)` and `delete(*keys)`
+    """
+
+    def __init__(self, client, prefix='api:idempotency:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def add(self, key, record, ttl):
+        return bool(self.client.set(self.prefix + key, json.dumps(record), ex=ttl, nx=True))
+
+    def set(self, key, record, ttl):
+        self.client.set(self.prefix + key, json.dumps(record), ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def create_store(backend=IDEMPOTENCY_BACKEND):
+    """
+    Construct the idempotency key store configured in settings, None if keys are ignored
+    """
+    if backend == 'none':
+        return None
+    if backend == 'shared':
+        if not CACHE_URL:
+            return SharedStore(LocalClient())
+        import redis  # optional dependency, needed only for a shared store server
+        return SharedStore(redis.Redis.from_url(CACHE_URL))
+    if backend == 'memory':
+        return MemoryStore(IDEMPOTENCY_SIZE)
+    raise ValueError(f"Unknown idempotency backend: {backend}")
+
+
+store = create_store()
+
+
+def fingerprint():
+    """
+    Digest of the request a key was first used with
+    """
+    digest = hashlib.sha256()
+    for part in (request.method, request.full_path, request.mimetype):
+        digest.update(part.encode() + b'\0')
+    digest.update(request.get_data())
+    return digest.hexdigest()[:32]
+
+
+def replay(record):
+    """
+    Response stored for a key
+    """
+    _, status, mimetype, body, etag = record
+    response = Response(body, status=status, mimetype=mimetype)
+    if etag:
+        response.headers['ETag'] = etag
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Answer retries of a request sent with the same `Idempotency-Key` header
+    with the response to the first one, without running the view again.
+
+    Keys are scoped to the route and method. Successful responses are stored for
+    IDEMPOTENCY_TTL seconds; after an error the key is released, so a retry runs
+    the view again. Reusing a key for another request is rejected with 422,
+    a retry arriving while the first request still runs with 409.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None or store is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX:
+            error = f"Idempotency-Key must have 1 to {IDEMPOTENCY_KEY_MAX} characters"
+            return make_response(jsonify(error=error), 400)
+
+        key = hashlib.sha256(f'{request.method} {request.path} {key}'.encode()).hexdigest()[:32]
+        current = fingerprint()
+        while not store.add(key, [current], IDEMPOTENCY_PENDING_TTL):
+            record = store.get(key)
+            if record is None:
+                # expired meanwhile
+                continue
+            if record[0] != current:
+                return make_response(jsonify(error="Idempotency-Key was used for another request"), 422)
+            if len(record) == 1:
+                response = make_response(jsonify(error="A request with this Idempotency-Key is in progress"), 409)
+                response.headers['Retry-After'] = '1'
+                return response
+            return replay(record)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            store.delete(key)
+            raise
+        if 200 <= response.status_code < 300 and not response.is_streamed:
+            store.set(key, [current, response.status_code, response.mimetype, response.get_data(as_text=True),
+                            response.headers.get('ETag')], IDEMPOTENCY_TTL)
+        else:
+            store.delete(key)
+        return response
+    return wrapper
@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from settings.constants import METRICS, SLOW_QUERY_MS
+
+# upper bounds of the latency histogram buckets, seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+slow_query_log = logging.getLogger('app.slow_queries')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return '{' + ','.join(pairs + ([extra] if extra else [])) + '}' if pairs or extra else ''
+
+
+class Metric(object):
+    """
+    Metric with a value per combination of label values
+    """
+
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name, self.description, self.labels = name, description, tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        """
+        return: lines of the metric in the text exposition format
+        """
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted((key, self._copy(value)) for key, value in self.values.items())
+        for key, value in items:
+            lines.extend(self._render(key, value))
+        return lines
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def _render(self, key, value):
+        return [f'{self.name}{_labels(self.labels, key)} {value}']
+
+
+class Histogram(Metric):
+    """
+    Counts of observations per bucket (not cumulative, summed up when rendered), their sum and count
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self.values.get(labels) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[i] += 1
+            self.values[labels] = (counts, total + value)
+
+    @staticmethod
+    def _copy(value):
+        return list(value[0]), value[1]
+
+    def _render(self, key, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f'{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}')
+        lines.append(f'{self.name}_sum{_labels(self.labels, key)} {total}')
+        lines.append(f'{self.name}_count{_labels(self.labels, key)} {cumulative}')
+        return lines
+
+
+class Registry(object):
+    """
+    Metrics of this process (every worker of a preforking server has its own)
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+registry = Registry()
+requests_total = registry.add(Counter(
+    'http_requests_total', 'Requests by route, method and status', ('route', 'method', 'status')))
+request_seconds = registry.add(Histogram(
+    'http_request_duration_seconds', 'Time to handle a request', ('route', 'method')))
+statements_total = registry.add(Counter(
+    'db_statements_total', 'SQL statements executed by requests', ('route',)))
+request_db_seconds = registry.add(Histogram(
+    'db_request_duration_seconds', 'Time a request spent executing SQL statements', ('route',)))
+slow_statements_total = registry.add(Counter(
+    'db_slow_statements_total', f'SQL statements slower than {SLOW_QUERY_MS} ms', ('route',)))
+
+
+def _route():
+    """
+    Route of the request as registered (`/api/actor`), so label values are bounded
+    """
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_db = [0, 0.0]
+
+
+def _record_request(response):
+    if 'metrics_start' not in g:
+        # an earlier before_request function failed
+        return response
+    route, method, started, db = _route(), request.method, g.metrics_start, g.metrics_db
+    if response.is_streamed:
+        # the body runs its statements after this, the request is recorded when it is closed
+        response.call_on_close(lambda: _observe(route, method, response.status_code, started, db))
+    else:
+        _observe(route, method, response.status_code, started, db)
+    return response
+
+
+def _observe(route, method, status, started, db):
+    statements, db_seconds = db
+    requests_total.inc(route, method, status)
+    request_seconds.observe(time.perf_counter() - started, route, method)
+    statements_total.inc(route, amount=statements)
+    request_db_seconds.observe(db_seconds, route)
+
+
+def init_metrics(app):
+    """
+    Record latency, status and SQL time of every request when METRICS is on
+    """
+    if METRICS:
+        app.before_request(_start_request)
+        app.after_request(_record_request)
+
+
+def instrument_engine(engine):
+    """
+    Time the statements of an engine for the request metrics and the slow query log,
+    nothing is hooked when both are off
+    """
+    if not METRICS and not SLOW_QUERY_MS:
+        return
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _record_statement(statement, conn.info['metrics_start'].pop())
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        # a statement failing in the database has no after_cursor_execute
+        if context.connection is not None and context.connection.info.get('metrics_start'):
+            _record_statement(context.statement, context.connection.info['metrics_start'].pop())
+
+
+def _record_statement(statement, started):
+    """
+    Count a statement in the metrics of its request and log it if slow
+    """
+    elapsed = time.perf_counter() - started
+    in_request = has_request_context() and 'metrics_db' in g
+    if in_request:
+        g.metrics_db[0] += 1
+        g.metrics_db[1] += elapsed
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        route = _route() if has_request_context() else None
+        slow_query_log.warning('%.1f ms %s: %s', elapsed * 1000, route or '-', statement)
+        if in_request:
+            slow_statements_total.inc(route)
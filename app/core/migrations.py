@@ -0,0 +1,57 @@
+import os
+import re
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REVISIONS_DIR = os.path.join(APP_DIR, 'migrations', 'versions')
+
+
+def head():
+    """
+    Latest revision of the linear migration history, from the numbered revision
+    file names (`0002_add_index.py`) so the check does not import Alembic
+    """
+    revisions = [match.group(1) for match in map(re.compile(r'^(\d+)_\w*\.py$').match, os.listdir(REVISIONS_DIR))
+                 if match]
+    return max(revisions, key=int)
+
+
+def current(engine):
+    """
+    Revision the database is migrated to, None if it was never migrated
+    """
+    try:
+        with engine.connect() as connection:
+            return connection.execute(text('SELECT version_num FROM alembic_version')).scalar()
+    except DBAPIError:
+        return None
+
+
+def check_schema(engine):
+    """
+    Fail fast if the database is not at the latest revision,
+    costs one single-row SELECT instead of reflecting the schema
+
+    engine: engine to check
+    """
+    expected, found = head(), current(engine)
+    if found != expected:
+        raise RuntimeError(f"Database schema is at revision {found}, expected {expected}: "
+                           f"run `alembic upgrade head` from the app directory")
+
+
+def upgrade(connection=None, revision='head'):
+    """
+    Migrate the database to `revision`, the same as `alembic upgrade`
+
+    connection: connection to migrate (e.g. of an in-memory database), a new one to DB_URL by default
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(APP_DIR, 'alembic.ini'))
+    config.set_main_option('script_location', os.path.join(APP_DIR, 'migrations'))
+    config.attributes['connection'] = connection
+    command.upgrade(config, revision)
@@ -0,0 +1,128 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from settings.constants import (DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE,
+                                DB_POOL_TIMEOUT, DB_STATEMENT_TIMEOUT, DB_TRANSACTION_POOLING)
+
+
+class TimedPool(object):
+    """
+    Pool mixin which records how long checkouts wait for a connection
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._lock:
+                self.waits += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+
+class TimedQueuePool(TimedPool, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(db_url, asynchronous=False):
+    """
+    Engine options for the database URL configured from settings
+
+    db_url: database connection URL
+    asynchronous: options for `create_async_engine`
+    return: dict for `SQLALCHEMY_ENGINE_OPTIONS`
+    """
+    url = make_url(db_url)
+    options = {'pool_pre_ping': DB_POOL_PRE_PING, 'pool_recycle': DB_POOL_RECYCLE}
+
+    # in-memory SQLite keeps its single shared connection
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+
+    options.update(poolclass=TimedAsyncQueuePool if asynchronous else TimedQueuePool, pool_size=DB_POOL_SIZE,
+                   max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+
+    if url.get_backend_name() == 'postgresql':
+        connect_args = {}
+        if DB_STATEMENT_TIMEOUT and not DB_TRANSACTION_POOLING:
+            if url.get_driver_name() == 'asyncpg':
+                connect_args['server_settings'] = {'statement_timeout': str(DB_STATEMENT_TIMEOUT)}
+            else:
+                connect_args['options'] = f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'
+        if DB_TRANSACTION_POOLING:
+            # a pooled server connection may change between transactions
+            if url.get_driver_name() == 'asyncpg':
+                connect_args['prepared_statement_cache_size'] = 0
+            elif url.get_driver_name() == 'psycopg':
+                connect_args['prepare_threshold'] = None
+        options['connect_args'] = connect_args
+    return options
+
+
+def configure_engine(engine):
+    """
+    Settings which cannot be passed as engine options
+    """
+    if engine.dialect.name == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def enable_foreign_keys(dbapi_connection, connection_record):
+            # SQLite enforces foreign keys (and ON DELETE CASCADE) only when asked to, per connection
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA foreign_keys = ON')
+            cursor.close()
+
+    # per-transaction statement timeout, behind a transaction-level pooler
+    if engine.dialect.name == 'postgresql' and DB_STATEMENT_TIMEOUT and DB_TRANSACTION_POOLING:
+        @event.listens_for(engine, 'begin')
+        def set_statement_timeout(connection):
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT}')
+
+
+def pool_stats(engine):
+    """
+    Connections of the engine pool and checkout wait times
+    """
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {'pool': type(pool).__name__, 'status': pool.status()}
+
+    stats = {
+        'pool': type(pool).__name__,
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        'max_overflow': pool._max_overflow,
+        'timeout': pool.timeout(),
+    }
+    if isinstance(pool, TimedPool):
+        stats['waits'] = {
+            'count': pool.waits,
+            'total_ms': round(pool.wait_total * 1000, 3),
+            'avg_ms': round(pool.wait_total * 1000 / pool.waits, 3) if pool.waits else 0,
+            'max_ms': round(pool.wait_max * 1000, 3),
+            'timeouts': pool.timeouts,
+        }
+    return stats
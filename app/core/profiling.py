@@ -0,0 +1,220 @@
+import cProfile
+import hmac
+import json
+import os
+import re
+import sys
+import time
+import uuid
+
+from flask import g, has_request_context, jsonify, make_response, request
+from sqlalchemy import event
+
+from settings.constants import PROFILE_DIR, PROFILE_TOKEN
+
+PROFILE_FORMATS = ['pstats', 'speedscope']
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+class Tracer(object):
+    """
+    Deterministic profiler recording every Python and C function call with its
+    start and end time, for the evented profiles of speedscope
+    """
+
+    def __init__(self):
+        self.frames, self.index, self.events, self.stack = [], {}, [], []
+        self.start = time.perf_counter()
+
+    def _frame(self, key, name, file, line=None):
+        if key not in self.index:
+            self.index[key] = len(self.frames)
+            self.frames.append({'name': name, 'file': file, **({'line': line} if line else {})})
+        return self.index[key]
+
+    def __call__(self, frame, kind, arg):
+        at = (time.perf_counter() - self.start) * 1000
+        if kind == 'call':
+            code = frame.f_code
+            index = self._frame(code, code.co_name, code.co_filename, code.co_firstlineno)
+            self._open(frame, index, at)
+        elif kind == 'c_call':
+            name = getattr(arg, '__qualname__', None) or getattr(arg, '__name__', repr(arg))
+            index = self._frame(('c', name, getattr(arg, '__module__', None)), name,
+                                getattr(arg, '__module__', None) or '<built-in>')
+            self._open(arg, index, at)
+        # only calls started while tracing are closed, so the events are always nested
+        elif kind == 'return' and self.stack and self.stack[-1][0] is frame \
+                or kind in ('c_return', 'c_exception') and self.stack and self.stack[-1][0] is arg:
+            self.events.append({'type': 'C', 'frame': self.stack.pop()[1], 'at': at})
+
+    def _open(self, key, index, at):
+        self.stack.append((key, index))
+        self.events.append({'type': 'O', 'frame': index, 'at': at})
+
+    def enable(self):
+        sys.setprofile(self)
+
+    def disable(self):
+        sys.setprofile(None)
+        at = (time.perf_counter() - self.start) * 1000
+        while self.stack:
+            self.events.append({'type': 'C', 'frame': self.stack.pop()[1], 'at': at})
+        self.end = at
+
+
+class Profile(object):
+    """
+    Profile of one request with the SQL statements it executed
+    """
+
+    def __init__(self, fmt):
+        self.fmt, self.statements, self.seconds = fmt, [], None
+        # a streamed response is profiled until it is closed
+        self.streamed = False
+        self.profiler = Tracer() if fmt == 'speedscope' else cProfile.Profile()
+        self.start = time.perf_counter()
+        self.profiler.enable()
+
+    def stop(self):
+        if self.seconds is None:
+            self.profiler.disable()
+            self.seconds = time.perf_counter() - self.start
+
+    def add_statement(self, statement, started, ended):
+        self.statements.append({'statement': statement, 'start_ms': round((started - self.start) * 1000, 3),
+                                'duration_ms': round((ended - started) * 1000, 3)})
+
+    def sql_ms(self):
+        return sum(statement['duration_ms'] for statement in self.statements)
+
+    def file_name(self, name):
+        return f'{name}.pstats' if self.fmt == 'pstats' else f'{name}.speedscope.json'
+
+    def save(self, name):
+        """
+        Write the profile to PROFILE_DIR: `<name>.pstats` with the SQL statements in `<name>.sql.json`,
+        or `<name>.speedscope.json` with the statements as a second profile on the same time axis
+
+        return: file name of the profile
+        """
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, name)
+        if self.fmt == 'pstats':
+            self.profiler.dump_stats(f'{path}.pstats')
+            with open(f'{path}.sql.json', 'w') as file:
+                json.dump(self.statements, file, indent=2)
+        else:
+            with open(f'{path}.speedscope.json', 'w') as file:
+                json.dump(self.speedscope(name), file)
+        return self.file_name(name)
+
+    def speedscope(self, name):
+        tracer = self.profiler
+        frames = list(tracer.frames)
+        events = []
+        offset = (self.start - tracer.start) * 1000
+        for statement in self.statements:
+            frames.append({'name': statement['statement'], 'file': 'SQL'})
+            start = statement['start_ms'] + offset
+            events.append({'type': 'O', 'frame': len(frames) - 1, 'at': start})
+            events.append({'type': 'C', 'frame': len(frames) - 1, 'at': start + statement['duration_ms']})
+        end = max([tracer.end] + [event['at'] for event in events])
+        profile = {'type': 'evented', 'unit': 'milliseconds', 'startValue': 0, 'endValue': end}
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'shared': {'frames': frames},
+            'profiles': [{**profile, 'name': 'Python', 'events': tracer.events},
+                         {**profile, 'name': f'SQL ({len(self.statements)} statements)', 'events': events}],
+        }
+
+
+def _start_profile():
+    fmt = request.headers.get('X-Profile')
+    if not fmt:
+        return None
+    # compared as bytes, strings with non-ASCII characters are not comparable
+    if not hmac.compare_digest(request.headers.get('X-Profile-Token', '').encode(), PROFILE_TOKEN.encode()):
+        return make_response(jsonify(error="Invalid profile token"), 403)
+    if fmt not in PROFILE_FORMATS:
+        return make_response(jsonify(error=f"Profile format must be one of: {', '.join(PROFILE_FORMATS)}"), 400)
+    try:
+        g.profile = Profile(fmt)
+    except ValueError:
+        # cProfile of Python 3.12+ profiles one thread at a time
+        return make_response(jsonify(error="Another request is being profiled"), 409)
+
+
+def _save_profile(response):
+    profile = g.get('profile')
+    if profile is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_')}" \
+           f"-{uuid.uuid4().hex[:8]}"
+    if response.is_streamed:
+        # the body is generated after the headers are sent, with the statements it executes:
+        # the profile is saved when the server closes the response, without Server-Timing
+        profile.streamed = True
+        response.headers['X-Profile-File'] = profile.file_name(name)
+        response.call_on_close(lambda: _close_profile(profile, name))
+        return response
+    del g.profile
+    profile.stop()
+    response.headers['X-Profile-File'] = profile.save(name)
+    response.headers['Server-Timing'] = (f'app;dur={profile.seconds * 1000:.1f}, '
+                                         f'sql;dur={profile.sql_ms():.1f};desc="{len(profile.statements)} statements"')
+    return response
+
+
+def _close_profile(profile, name):
+    profile.stop()
+    profile.save(name)
+
+
+def _stop_profile(exception=None):
+    # the response was not finished (e.g. a failing after_request function),
+    # the request context of a streamed body is torn down before the body is generated
+    profile = g.get('profile')
+    if profile is not None and not profile.streamed:
+        del g.profile
+        profile.stop()
+
+
+def init_profiling(app):
+    """
+    Profile single requests sent with `X-Profile: pstats|speedscope` and the
+    `X-Profile-Token` of PROFILE_TOKEN. Nothing is hooked when PROFILE_TOKEN is not set.
+    """
+    if PROFILE_TOKEN:
+        app.before_request(_start_profile)
+        app.after_request(_save_profile)
+        app.teardown_request(_stop_profile)
+
+
+def record_statements(engine):
+    """
+    Record the statements executed by profiled requests
+    """
+    if not PROFILE_TOKEN:
+        return
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profile_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _add_statement(statement, conn.info['profile_start'].pop())
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        # a statement failing in the database has no after_cursor_execute
+        if context.connection is not None and context.connection.info.get('profile_start'):
+            _add_statement(context.statement, context.connection.info['profile_start'].pop())
+
+
+def _add_statement(statement, started):
+    if has_request_context() and 'profile' in g:
+        g.profile.add_statement(statement, started, time.perf_counter())
@@ -2,7 +2,13 @@ from flask import Flask, request
 from flask import current_app as app
 
 from controllers.actor import *
+from controllers.export import *
+from controllers.graph import *
+from controllers.imports import *
 from controllers.movie import *
+from controllers.search import *
+from controllers.service import *
+from controllers.stats import *
 
 # Route to get all actors in the database
 @app.route('/api/actors', methods=['GET'])
@@ -20,6 +26,22 @@ def movies():
     """
     return get_all_movies()
 
+# Route to get all actors with their filmography
+@app.route('/api/actors/filmography', methods=['GET'])
+def actors_filmography():
+    """
+    Get all actors in db with their movies
+    """
+    return get_all_actors_filmography()
+
+# Route to get all movies with their cast
+@app.route('/api/movies/cast', methods=['GET'])
+def movies_cast():
+    """
+    Get all movies in db with their actors
+    """
+    return get_all_movies_cast()
+
 # Route to manipulate actor records
 @app.route('/api/actor', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def actor():
@@ -50,24 +72,150 @@ def movie():
     elif request.method == 'DELETE':
         return delete_movie()
 
+# Route to manipulate actor records in bulk
+@app.route('/api/actors/bulk', methods=['POST', 'PUT', 'DELETE'])
+def actors_bulk():
+    """
+    Manipulate actor records in bulk
+    """
+    if request.method == 'POST':
+        return add_actors()
+    elif request.method == 'PUT':
+        return update_actors()
+    elif request.method == 'DELETE':
+        return delete_actors()
+
+# Route to manipulate movie records in bulk
+@app.route('/api/movies/bulk', methods=['POST', 'PUT', 'DELETE'])
+def movies_bulk():
+    """
+    Manipulate movie records in bulk
+    """
+    if request.method == 'POST':
+        return add_movies()
+    elif request.method == 'PUT':
+        return update_movies()
+    elif request.method == 'DELETE':
+        return delete_movies()
+
 # Route to manipulate actor relations
-@app.route('/api/actor-relations', methods=['PUT', 'DELETE'])
+@app.route('/api/actor-relations', methods=['GET', 'PUT', 'DELETE'])
 def actor_relation():
     """
     Manipulate actor's relations
     """
-    if request.method == 'PUT':
+    if request.method == 'GET':
+        return get_actor_relations()
+    elif request.method == 'PUT':
         return actor_add_relation()
     elif request.method == 'DELETE':
         return actor_clear_relations()
 
 # Route to manipulate movie relations
-@app.route('/api/movie-relations', methods=['PUT', 'DELETE'])
+@app.route('/api/movie-relations', methods=['GET', 'PUT', 'DELETE'])
 def movie_relation():
     """
     Manipulate movie's relations
     """
-    if request.method == 'PUT':
+    if request.method == 'GET':
+        return get_movie_relations()
+    elif request.method == 'PUT':
         return movie_add_relation()
     elif request.method == 'DELETE':
         return movie_clear_relations()
+
+# Route to get cache counters
+@app.route('/api/_cache', methods=['GET'])
+def cache_stats():
+    """
+    Get cache hits, misses and evictions
+    """
+    return get_cache_stats()
+
+# Route to get connection pool counters
+@app.route('/api/_pool', methods=['GET'])
+def pool_stats():
+    """
+    Get checked-out, idle and overflow connections and wait times
+    """
+    return get_pool_stats()
+
+# Route to get request metrics for Prometheus
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Get per-route request counts, latencies and SQL time
+    """
+    return get_metrics()
+
+# Route to search actors and movies by name
+@app.route('/api/search', methods=['GET'])
+def name_search():
+    """
+    Search actors and movies by name prefix or similarity
+    """
+    return search_names()
+
+# Route to get actors who co-starred with an actor
+@app.route('/api/actors/costars', methods=['GET'])
+def actor_costars():
+    """
+    Get co-stars of an actor with the shared movies
+    """
+    return get_costars()
+
+# Route to get actors within a number of shared movies from an actor
+@app.route('/api/actors/neighbourhood', methods=['GET'])
+def actor_neighbourhood():
+    """
+    Get actors at most `depth` shared movies away
+    """
+    return get_neighbourhood()
+
+# Route to get degrees of separation between two actors
+@app.route('/api/actors/separation', methods=['GET'])
+def actor_separation():
+    """
+    Get the shortest chain of co-starring between two actors
+    """
+    return get_separation()
+
+# Route to get number of movies per genre per year
+@app.route('/api/stats/movies', methods=['GET'])
+def movie_stats():
+    """
+    Get movie counts grouped by genre and year
+    """
+    return get_movie_stats()
+
+# Route to get distribution of cast sizes
+@app.route('/api/stats/cast-sizes', methods=['GET'])
+def cast_size_stats():
+    """
+    Get movie counts grouped by number of actors
+    """
+    return get_cast_size_stats()
+
+# Route to get number of actors per gender and birth decade
+@app.route('/api/stats/actors', methods=['GET'])
+def actor_stats():
+    """
+    Get actor counts grouped by gender and birth decade
+    """
+    return get_actor_stats()
+
+# Route to export a whole table
+@app.route('/api/export', methods=['GET'])
+def export():
+    """
+    Stream a table as CSV, NDJSON or columnar binary
+    """
+    return export_data()
+
+# Route to import records of a table
+@app.route('/api/import', methods=['POST'])
+def import_records():
+    """
+    Upsert records streamed as CSV or NDJSON
+    """
+    return import_data()
@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# session bound to the current task by the async serving mode
+_bound_session = ContextVar('bound_session', default=None)
+
+
+class SessionProxy(object):
+    """
+    `db.session` which defers to the session bound with `bind_session`,
+    so models and controllers run unchanged on the sync facade of an `AsyncSession`
+    """
+
+    def __init__(self, scoped):
+        """
+        scoped: Flask-SQLAlchemy scoped session used otherwise
+        """
+        self._scoped = scoped
+
+    def __call__(self):
+        return _bound_session.get() or self._scoped()
+
+    def __getattr__(self, name):
+        return getattr(_bound_session.get() or self._scoped, name)
+
+    def remove(self):
+        """
+        Remove the scoped session on app context teardown,
+        a bound session is closed by its owner
+        """
+        if _bound_session.get() is None:
+            self._scoped.remove()
+
+
+@contextmanager
+def bind_session(session):
+    """
+    Use `session` for `db.session` within the block
+    """
+    token = _bound_session.set(session)
+    try:
+        yield session
+    finally:
+        _bound_session.reset(token)
@@ -0,0 +1,45 @@
+"""
+Export the catalog tables into files, all read in one transaction
+so they are a consistent snapshot of the database
+
+Usage (from the `app` directory):
+    python export.py [--format csv|ndjson|columnar] [--gzip] [--out DIR] [table ...]
+
+Exports actors, movies and association by default.
+"""
+import argparse
+import os
+import time
+
+from core import create_app, db
+from controllers.export import EXPORT_TABLES, export_file_name, export_table, snapshot
+from settings.constants import EXPORT_FORMATS
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the catalog tables')
+    parser.add_argument('tables', nargs='*', default=list(EXPORT_TABLES), help=', '.join(EXPORT_TABLES))
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--gzip', action='store_true', help='compress the files')
+    parser.add_argument('--out', default='.', help='directory to write the files to')
+    args = parser.parse_args()
+    unknown = [name for name in args.tables if name not in EXPORT_TABLES]
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(unknown)}")
+
+    os.makedirs(args.out, exist_ok=True)
+    with create_app().app_context():
+        snapshot()
+        for name in args.tables:
+            table, start, size = EXPORT_TABLES[name], time.perf_counter(), 0
+            path = os.path.join(args.out, export_file_name(table, args.format, args.gzip))
+            with open(path, 'wb') as file:
+                for chunk in export_table(table, args.format, args.gzip):
+                    file.write(chunk)
+                    size += len(chunk)
+            print(f'{path}: {size} bytes in {time.perf_counter() - start:.2f} s')
+        db.session.rollback()
+
+
+if __name__ == '__main__':
+    main()
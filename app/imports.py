@@ -0,0 +1,60 @@
+"""
+Import records of a table from a CSV or NDJSON file (optionally gzipped),
+upserted by name in batches
+
+Usage (from the `app` directory):
+    python imports.py actors actors.csv
+    python imports.py association credits.ndjson.gz --batch-size 10000
+
+Association records are `actor` and `movie` names. Progress is saved after every
+batch to `<file>.checkpoint`, a rerun resumes from it; it is removed when the
+import completes.
+"""
+import argparse
+import gzip
+import json
+import os
+
+from core import create_app
+from controllers.imports import IMPORT_TABLES, Import, read_records
+from settings.constants import IMPORT_BATCH_SIZE, IMPORT_FORMATS
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import records of a table')
+    parser.add_argument('table', choices=IMPORT_TABLES)
+    parser.add_argument('path', help='CSV or NDJSON file, .gz to decompress')
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help='by default from the file extension')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    name = args.path[:-3] if args.path.endswith('.gz') else args.path
+    fmt = args.format or os.path.splitext(name)[1].lstrip('.')
+    if fmt not in IMPORT_FORMATS:
+        parser.error(f"unknown format {fmt!r}, use --format")
+
+    checkpoint_path = f'{args.path}.checkpoint'
+    start = 0
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as file:
+            start = json.load(file)['checkpoint']
+        print(f'Resuming after record {start}')
+
+    def save(report):
+        with open(checkpoint_path, 'w') as file:
+            json.dump(report, file)
+        print(f"{report['checkpoint']} records, {report['loaded']} loaded, {report['rejected']} rejected, "
+              f"{report['rows_per_second']} records/s")
+
+    opener = gzip.open if args.path.endswith('.gz') else open
+    with create_app().app_context(), opener(args.path, 'rt', encoding='utf-8', newline='') as file:
+        report = Import(args.table, args.batch_size, start, save).run(read_records(file, fmt))
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    for reject in report['rejects']:
+        print(f"record {reject['record']}: {reject['error']}")
+    print(json.dumps({key: value for key, value in report.items() if key != 'rejects'}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+from core import db
+from models import actor, movie, relations, rollups, versions
+from settings.constants import DB_URL
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get('connection') is None:
+    fileConfig(config.config_file_name)
+
+target_metadata = db.Model.metadata
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """
+    Leave dialect-specific indexes created by migrations only (`*_trgm`) out of autogenerate
+    """
+    return not (type_ == 'index' and name.endswith('_trgm'))
+
+
+def run_migrations_offline():
+    """
+    Emit the migration SQL as a script instead of running it
+    """
+    context.configure(url=DB_URL, target_metadata=target_metadata, literal_binds=True, render_as_batch=True,
+                      include_object=include_object)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """
+    Run the migrations on the connection passed by `core.migrations.upgrade`
+    or on a new one to DB_URL
+    """
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        _run(connection)
+        return
+
+    engine = create_engine(DB_URL, poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        _run(connection)
+
+
+def _run(connection):
+    # batch mode recreates tables where SQLite cannot ALTER them
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True,
+                      include_object=include_object)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,51 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 17:45:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the schema earlier versions of the app created with `db.create_all()`,
+    # their databases are marked as migrated to this revision with `alembic stamp 0001`
+    op.create_table(
+        'actors',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('gender', sa.String(length=11), nullable=True),
+        sa.Column('date_of_birth', sa.Date(), nullable=True),
+        sa.PrimaryKeyConstraint('id', name='actors_pkey'),
+        sa.UniqueConstraint('name', name='actors_name_key'),
+    )
+    op.create_table(
+        'movies',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=True),
+        sa.Column('genre', sa.String(length=20), nullable=True),
+        sa.PrimaryKeyConstraint('id', name='movies_pkey'),
+        sa.UniqueConstraint('name', name='movies_name_key'),
+    )
+    op.create_table(
+        'association',
+        sa.Column('actor_id', sa.Integer(), nullable=False),
+        sa.Column('movie_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['actor_id'], ['actors.id'], name='association_actor_id_fkey'),
+        sa.ForeignKeyConstraint(['movie_id'], ['movies.id'], name='association_movie_id_fkey'),
+        sa.PrimaryKeyConstraint('actor_id', 'movie_id', name='association_pkey'),
+    )
+
+
+def downgrade():
+    op.drop_table('association')
+    op.drop_table('movies')
+    op.drop_table('actors')
@@ -0,0 +1,42 @@
+"""indexes and cascading relation deletes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 18:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+FOREIGN_KEYS = [('association_actor_id_fkey', 'actors', 'actor_id'),
+                ('association_movie_id_fkey', 'movies', 'movie_id')]
+# names given to the unnamed foreign keys of SQLite databases created by `db.create_all()`
+# when the table is reflected for the batch copy (PostgreSQL gave them the same names)
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def upgrade():
+    with op.batch_alter_table('association', naming_convention=NAMING_CONVENTION) as batch_op:
+        for name, table, column in FOREIGN_KEYS:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, table, [column], ['id'], ondelete='CASCADE')
+        batch_op.create_index('ix_association_movie_id_actor_id', ['movie_id', 'actor_id'])
+    op.create_index('ix_movies_year', 'movies', ['year'])
+    op.create_index('ix_movies_genre', 'movies', ['genre'])
+    op.create_index('ix_actors_date_of_birth', 'actors', ['date_of_birth'])
+
+
+def downgrade():
+    op.drop_index('ix_actors_date_of_birth', table_name='actors')
+    op.drop_index('ix_movies_genre', table_name='movies')
+    op.drop_index('ix_movies_year', table_name='movies')
+    with op.batch_alter_table('association', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_index('ix_association_movie_id_actor_id')
+        for name, table, column in FOREIGN_KEYS:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, table, [column], ['id'])
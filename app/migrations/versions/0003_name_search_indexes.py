@@ -0,0 +1,34 @@
+"""trigram indexes for name search
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 18:30:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+TABLES = ['actors', 'movies']
+
+
+def upgrade():
+    # other databases search names with the in-process index (controllers/search.py)
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in TABLES:
+        # serves similarity (%) and LIKE matches, prefixes of words included
+        op.create_index(f'ix_{table}_name_trgm', table, [sa.text('lower(name) gin_trgm_ops')],
+                        postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.drop_index(f'ix_{table}_name_trgm', table_name=table)
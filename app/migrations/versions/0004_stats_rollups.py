@@ -0,0 +1,37 @@
+"""statistics rollups
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 21:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# rollup table -> (group key columns, count column)
+ROLLUPS = {
+    'stats_movies_genre_year': ([('genre', sa.String()), ('year', sa.Integer())], 'movies'),
+    'stats_movies_cast_size': ([('cast_size', sa.Integer())], 'movies'),
+    'stats_actors_gender_decade': ([('gender', sa.String()), ('decade', sa.Integer())], 'actors'),
+}
+
+
+def upgrade():
+    # filled by `python rollups.py` when STATS_ROLLUPS is turned on
+    for name, (keys, count) in ROLLUPS.items():
+        op.create_table(
+            name,
+            *[sa.Column(key, key_type, nullable=False) for key, key_type in keys],
+            sa.Column(count, sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint(*[key for key, _ in keys], name=f'{name}_pkey'),
+        )
+
+
+def downgrade():
+    for name in reversed(list(ROLLUPS)):
+        op.drop_table(name)
@@ -0,0 +1,28 @@
+"""record versions for optimistic concurrency
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 23:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+TABLES = ['actors', 'movies']
+
+
+def upgrade():
+    # existing records start at version 1, like new ones
+    for table in TABLES:
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('version')
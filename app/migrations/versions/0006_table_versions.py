@@ -0,0 +1,30 @@
+"""table versions for conditional requests
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 10:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ['actors', 'movies', 'association']
+
+
+def upgrade():
+    versions = op.create_table(
+        'versions',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name', name='versions_pkey'),
+    )
+    op.bulk_insert(versions, [{'name': name, 'version': 0} for name in VERSIONED_TABLES])
+
+
+def downgrade():
+    op.drop_table('versions')
@@ -12,16 +12,20 @@ class Actor(Model, db.Model):
     name = db.Column(db.String(50), unique=True, nullable=False)
     # gender -> string, size 11
     gender = db.Column(db.String(11))
-    # date_of_birth -> date
-    date_of_birth = db.Column(db.Date)
+    # date_of_birth -> date, indexed
+    date_of_birth = db.Column(db.Date, index=True)
+    # version -> integer, incremented by every update (optimistic concurrency)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
 
     # Use `db.relationship` method to define the Actor's relationship with Movie.
     # Set `backref` as 'cast', uselist=True
     # Set `secondary` as 'association'
+    # Relations are deleted by the database, not loaded to be deleted one by one
     movies = db.relationship('Movie',
                              backref='cast',
                              uselist=True,
-                             secondary=association)
+                             secondary=association,
+                             passive_deletes=True)
 
     def __repr__(self):
         return '<Actor {}>'.format(self.name)
\ No newline at end of file
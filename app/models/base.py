@@ -1,60 +1,267 @@
+import io
+from datetime import date
+
+from sqlalchemy import Integer, bindparam, delete, exists, insert, literal, or_, select, text, update
+from sqlalchemy import column as sql_column, table as sql_table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.sql import Select
+
 from core import db
+from core.cache import cache, entity_key, relation_key
+from models.relations import association
+from models.versions import bump_versions
+from settings.constants import STATS_ROLLUPS
+
+
+def relation_column(cls):
+    """
+    Column of the `association` table that references the class table
+    """
+    return next(column for column in association.c if column.references(cls.__table__.c.id))
+
+
+def related_column(cls):
+    """
+    Column of the `association` table that references the related table
+    """
+    owner = relation_column(cls)
+    return next(column for column in association.c if column is not owner)
+
+
+def related_table(cls):
+    """
+    Table of the records related to the class ones
+    """
+    return next(iter(related_column(cls).foreign_keys)).column.table
 
 
-def commit(obj):
+def changed_tables(cls, changed=(), related=()):
     """
-    Function for convenient commit
+    Tables changed by a write, see `invalidate`
     """
-    db.session.add(obj)
-    db.session.commit()
-    db.session.refresh(obj)
-    return obj
+    return ([cls.__table__] if changed else []) + ([association] if related else [])
+
+
+def bump(cls, changed=(), related=()):
+    """
+    Bump versions of the tables changed by a write, after its commit
+
+    return: dict table name -> new version
+    """
+    return bump_versions(changed_tables(cls, changed, related))
+
+
+# callables notified of committed relation changes in this process:
+# listener(added, removed, version), added and removed are lists of
+# (actor_id, movie_id) pairs, version is the new version of `association`
+relation_listeners = []
+
+
+def edges(cls, row_id, rel_ids):
+    """
+    Relations of a record as `association` (actor_id, movie_id) pairs
+    """
+    if relation_column(cls) is association.c[0]:
+        return [(row_id, rel_id) for rel_id in rel_ids]
+    return [(rel_id, row_id) for rel_id in rel_ids]
+
+
+def notify_relations(versions, added=(), removed=()):
+    """
+    Pass relations added or removed by a committed write to `relation_listeners`
+
+    versions: new table versions returned by `bump`
+    """
+    if association.name in versions:
+        for listener in relation_listeners:
+            listener(added, removed, versions[association.name])
+
+
+def invalidate(cls, changed=(), relations=(), related=()):
+    """
+    Drop cached entries affected by a committed write
+
+    cls: class
+    changed: ids of records which changed or were deleted
+    relations: ids of records whose relations changed
+    related: ids of related records whose relations changed
+    """
+    table, rel_table = cls.__table__, related_table(cls)
+    cache.delete(*[entity_key(table, row_id) for row_id in changed],
+                 *[relation_key(table, row_id) for row_id in relations],
+                 *[relation_key(rel_table, row_id) for row_id in related])
+
+
+# materialized counts kept up to date by the write methods when STATS_ROLLUPS is on,
+# see models/rollups.py
+rollups = []
+
+
+def update_rollups(cls, sign, rows=(), relations=(), related=()):
+    """
+    Take records affected by a write out of the rollups (sign -1) before the write
+    changes them, and put them back (sign 1) after
+
+    cls: class
+    rows: ids of changed records (list or select)
+    relations: ids of records whose relations change
+    related: ids of related records whose relations change
+    """
+    if not STATS_ROLLUPS:
+        return
+    for rollup in rollups:
+        groups = []
+        if rollup.source is cls.__table__:
+            groups += [rows, relations] if rollup.relations else [rows]
+        elif rollup.relations and rollup.source is related_table(cls):
+            groups.append(related)
+        groups = [row_ids for row_ids in groups if isinstance(row_ids, Select) or len(row_ids)]
+        if groups:
+            rollup.apply(or_(*[rollup.source.c.id.in_(row_ids) for row_ids in groups]), sign)
+
+
+def guarded_update(table, fields):
+    """
+    UPDATE of `fields` by id for executemany (parameters `b_id` and `b_<field>`), incrementing
+    the version, which skips records whose fields all have the given values already
+    """
+    params = {field: bindparam(f'b_{field}', type_=table.c[field].type) for field in fields}
+    return (update(table).where(table.c.id == bindparam('b_id'))
+            .where(or_(*[table.c[field].is_distinct_from(param) for field, param in params.items()]))
+            .values(**params, version=table.c.version + 1))
+
+
+def dialect_insert(table):
+    """
+    INSERT of the dialect of the session, with ON CONFLICT clauses on PostgreSQL and SQLite
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    return insert(table)
+
+
+def insert_ignore(table, columns, sel):
+    """
+    INSERT ... SELECT that skips rows conflicting with the primary key
+    on dialects supporting ON CONFLICT DO NOTHING
+    """
+    stmt = dialect_insert(table).from_select(columns, sel)
+    return stmt.on_conflict_do_nothing() if hasattr(stmt, 'on_conflict_do_nothing') else stmt
+
+
+def _copy_value(value):
+    """
+    Value in the COPY text format
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def stage(table, columns, rows):
+    """
+    Copy rows into a temporary staging table with the columns of `table`,
+    emptied at commit, with COPY FROM STDIN (PostgreSQL with psycopg2)
+
+    table: target table
+    columns: list of column names
+    rows: list of tuples in the order of `columns`
+    return: staging table or None if COPY is not available
+    """
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return None
+    cursor = db.session.connection().connection.dbapi_connection.cursor()
+    if not hasattr(cursor, 'copy_expert'):
+        return None
+    name, names = f'staging_{table.name}', ', '.join(columns)
+    db.session.execute(text(f'CREATE TEMPORARY TABLE IF NOT EXISTS {name} ON COMMIT DELETE ROWS '
+                            f'AS SELECT {names} FROM {table.name} WITH NO DATA'))
+    data = io.StringIO(''.join('\t'.join(map(_copy_value, row)) + '\n' for row in rows))
+    cursor.copy_expert(f'COPY {name} ({names}) FROM STDIN', data)
+    return sql_table(name, *[sql_column(column) for column in columns])
 
 
 class Model(object):
     @classmethod
     def create(cls, **kwargs):
         """
-        Create new record
+        Create new record with one INSERT ... RETURNING
 
         cls: class
         kwargs: dict with object parameters
+        return: created row (all columns)
         """
-        obj = cls(**kwargs)
-        return commit(obj)
+        table = cls.__table__
+        row = db.session.execute(insert(table).values(**kwargs).returning(*table.c)).one()
+        update_rollups(cls, 1, rows=[row.id])
+        db.session.commit()
+        bump(cls, changed=[row.id])
+        invalidate(cls, changed=[row.id])
+        return row
 
     @classmethod
-    def update(cls, row_id, **kwargs):
+    def update(cls, row_id, versions=None, **kwargs):
         """
-        Update record by id
+        Update record by id with one UPDATE ... RETURNING, incrementing its version.
+        With `versions` it is a compare-and-swap: the record is updated only if it still
+        has one of these versions, without reading or locking it first.
+        Nothing is written if no field changes, the record keeps its version.
 
         cls: class
         row_id: record id
+        versions: list of expected record versions or None to update any version
         kwargs: dict with object parameters
+        return: updated (or unchanged) row (all columns) or None if the record doesn't exist
+                or has another version
         """
-        obj = cls.query.filter_by(id=row_id).first()
-        # return commit(obj)
-        if obj:
-            for key, value in kwargs.items():
-                setattr(obj, key, value)
-            return commit(obj)
-        return None  # If the record doesn't exist
+        table = cls.__table__
+        fields = {key: value for key, value in kwargs.items() if key != 'id'}
+        if fields:
+            update_rollups(cls, -1, rows=[row_id])
+            stmt = update(table).where(table.c.id == row_id)
+            if versions is not None:
+                stmt = stmt.where(table.c.version.in_(versions))
+            stmt = stmt.where(or_(*[table.c[key].is_distinct_from(value) for key, value in fields.items()]))
+            row = db.session.execute(stmt.values(**fields, version=table.c.version + 1).returning(*table.c)).first()
+            if row:
+                update_rollups(cls, 1, rows=[row_id])
+                db.session.commit()
+                bump(cls, changed=[row_id])
+                invalidate(cls, changed=[row_id])
+                return row
+            db.session.rollback()
+
+        # missing, another version or no change: the record as it is
+        stmt = select(*table.c).where(table.c.id == row_id)
+        if versions is not None:
+            stmt = stmt.where(table.c.version.in_(versions))
+        return db.session.execute(stmt).first()
 
     @classmethod
     def delete(cls, row_id):
         """
-        Delete record by id
+        Delete record and its relations by id
 
         cls: class
         row_id: record id
         return: int (1 if deleted else 0)
         """
-        obj = cls.query.filter_by(id=row_id).first()
-        if obj:
-            db.session.delete(obj)
-            db.session.commit()
-            return 1  # Successfully deleted
-        return 0  # Record not found
+        table, owner, related = cls.__table__, relation_column(cls), related_column(cls)
+        update_rollups(cls, -1, rows=[row_id], relations=[row_id], related=select(related).where(owner == row_id))
+        stmt = delete(association).where(owner == row_id).returning(related)
+        rel_ids = list(db.session.execute(stmt).scalars())
+        deleted = db.session.execute(delete(table).where(table.c.id == row_id).returning(table.c.id)).first()
+        update_rollups(cls, 1, related=rel_ids)
+        db.session.commit()
+        versions = bump(cls, changed=[row_id] if deleted else [], related=rel_ids)
+        invalidate(cls, changed=[row_id], relations=[row_id], related=rel_ids)
+        notify_relations(versions, removed=edges(cls, row_id, rel_ids))
+        return 1 if deleted else 0
 
     @classmethod
     def add_relation(cls, row_id, rel_obj):
@@ -63,14 +270,10 @@ class Model(object):
 
         cls: class
         row_id: record id
-        rel_obj: related object
+        rel_obj: already loaded related object
+        return: list of related ids
         """
-        obj = cls.query.filter_by(id=row_id).first()
-        if cls.__name__ == 'Actor':
-            obj.filmography.append(rel_obj)
-        elif cls.__name__ == 'Movie':
-            obj.cast.append(rel_obj)
-        return commit(obj)
+        return cls.add_relations(row_id, [rel_obj.id])
 
     @classmethod
     def remove_relation(cls, row_id, rel_obj):
@@ -79,30 +282,227 @@ class Model(object):
 
         cls: class
         row_id: record id
-        rel_obj: related object
+        rel_obj: already loaded related object
+        return: list of remaining related ids
         """
-        obj = cls.query.filter_by(id=row_id).first()
-        if obj:
-            if cls.__name__ == 'Actor' and rel_obj in obj.filmography:
-                obj.filmography.remove(rel_obj)
-            elif cls.__name__ == 'Movie' and rel_obj in obj.cast:
-                obj.cast.remove(rel_obj)
-            return commit(obj)
-        return None  # Record not found
+        return cls.remove_relations(row_id, [rel_obj.id])
 
     @classmethod
     def clear_relations(cls, row_id):
         """
-        Remove all relations by id
+        Remove all relations by id with one DELETE
+
+        cls: class
+        row_id: record id
+        return: int (number of removed relations)
+        """
+        owner, related = relation_column(cls), related_column(cls)
+        update_rollups(cls, -1, relations=[row_id], related=select(related).where(owner == row_id))
+        stmt = delete(association).where(owner == row_id).returning(related)
+        rel_ids = list(db.session.execute(stmt).scalars())
+        update_rollups(cls, 1, relations=[row_id], related=rel_ids)
+        db.session.commit()
+        versions = bump(cls, related=rel_ids)
+        invalidate(cls, relations=[row_id], related=rel_ids)
+        notify_relations(versions, removed=edges(cls, row_id, rel_ids))
+        return len(rel_ids)
+
+    @classmethod
+    def bulk_create(cls, rows):
+        """
+        Create records with one multi-row INSERT in a single transaction
+
+        cls: class
+        rows: list of dicts with object parameters
+        return: list of created rows (all columns) in the order of `rows`
+        """
+        table = cls.__table__
+        stmt = insert(table).returning(*table.c, sort_by_parameter_order=True)
+        created = db.session.execute(stmt, rows).all()
+        update_rollups(cls, 1, rows=[row.id for row in created])
+        db.session.commit()
+        bump(cls, changed=created)
+        invalidate(cls, changed=[row.id for row in created])
+        return created
+
+    @classmethod
+    def bulk_update(cls, rows):
+        """
+        Update records by id with batched UPDATE statements in a single transaction,
+        records whose fields all keep their values are not written and keep their version
+
+        cls: class
+        rows: list of dicts with `id` and object parameters, ids must exist
+        return: dict id -> updated (or unchanged) row (all columns)
+        """
+        table = cls.__table__
+        current = {row.id: row for row in db.session.execute(
+            select(table).where(table.c.id.in_([row['id'] for row in rows])))}
+        changes = [row for row in rows
+                   if any(getattr(current[row['id']], key) != value for key, value in row.items() if key != 'id')]
+        changed = [row['id'] for row in changes]
+        if changes:
+            update_rollups(cls, -1, rows=changed)
+            groups = {}
+            for row in changes:
+                groups.setdefault(tuple(sorted(key for key in row if key != 'id')), []).append(row)
+            for fields, group in groups.items():
+                db.session.execute(guarded_update(table, fields),
+                                   [{f'b_{key}': value for key, value in row.items()} for row in group])
+            update_rollups(cls, 1, rows=changed)
+            current.update((row.id, row) for row in db.session.execute(select(table).where(table.c.id.in_(changed))))
+        db.session.commit()
+        bump(cls, changed=changed)
+        invalidate(cls, changed=changed)
+        return current
+
+    @classmethod
+    def bulk_delete(cls, row_ids):
+        """
+        Delete records and their relations by ids in a single transaction
+
+        cls: class
+        row_ids: list of record ids
+        return: set of deleted ids
+        """
+        table, owner, related = cls.__table__, relation_column(cls), related_column(cls)
+        update_rollups(cls, -1, rows=row_ids, relations=row_ids, related=select(related).where(owner.in_(row_ids)))
+        stmt = delete(association).where(owner.in_(row_ids)).returning(owner, related)
+        relations = db.session.execute(stmt).all()
+        rel_ids = {rel_id for _, rel_id in relations}
+        deleted = db.session.execute(delete(table).where(table.c.id.in_(row_ids)).returning(table.c.id))
+        deleted = set(deleted.scalars())
+        update_rollups(cls, 1, related=rel_ids)
+        db.session.commit()
+        versions = bump(cls, changed=deleted, related=rel_ids)
+        invalidate(cls, changed=deleted, relations=deleted, related=rel_ids)
+        notify_relations(versions, removed=[pair for row_id, rel_id in relations
+                                            for pair in edges(cls, row_id, [rel_id])])
+        return deleted
+
+    @classmethod
+    def existing_ids(cls, row_ids):
+        """
+        Get ids which have a record
+
+        cls: class
+        row_ids: list of record ids
+        return: set of existing ids
+        """
+        return set(db.session.execute(select(cls.id).where(cls.id.in_(row_ids))).scalars())
+
+    @classmethod
+    def relation_ids(cls, row_id):
+        """
+        Get ids of records related to the record
+
+        cls: class
+        row_id: record id
+        return: list of related ids
+        """
+        owner, related = relation_column(cls), related_column(cls)
+        return list(db.session.execute(select(related).where(owner == row_id).order_by(related)).scalars())
+
+    @classmethod
+    def add_relations(cls, row_id, rel_ids):
+        """
+        Add relations with one set-based INSERT straight into `association`,
+        existing relations are skipped
+
+        cls: class
+        row_id: record id
+        rel_ids: list of related record ids
+        return: list of related ids or None (nothing added) if some related record doesn't exist
+        """
+        owner, related, rel_table = relation_column(cls), related_column(cls), related_table(cls)
+        linked = exists().where(owner == row_id, related == rel_table.c.id)
+        sel = select(literal(row_id, Integer), rel_table.c.id).where(rel_table.c.id.in_(rel_ids), ~linked)
+        update_rollups(cls, -1, relations=[row_id], related=rel_ids)
+        db.session.execute(insert_ignore(association, [owner, related], sel))
+        update_rollups(cls, 1, relations=[row_id], related=rel_ids)
+        ids = cls.relation_ids(row_id)
+        # every existing related record is linked now
+        if not set(rel_ids).issubset(ids):
+            db.session.rollback()
+            return None
+        db.session.commit()
+        versions = bump(cls, related=rel_ids)
+        invalidate(cls, relations=[row_id], related=rel_ids)
+        notify_relations(versions, added=edges(cls, row_id, rel_ids))
+        return ids
+
+    @classmethod
+    def remove_relations(cls, row_id, rel_ids):
+        """
+        Remove certain relations with one DELETE
 
         cls: class
         row_id: record id
+        rel_ids: list of related record ids
+        return: list of remaining related ids
+        """
+        owner, related = relation_column(cls), related_column(cls)
+        stmt = delete(association).where(owner == row_id, related.in_(rel_ids)).returning(related)
+        update_rollups(cls, -1, relations=[row_id], related=rel_ids)
+        removed = list(db.session.execute(stmt).scalars())
+        update_rollups(cls, 1, relations=[row_id], related=rel_ids)
+        ids = cls.relation_ids(row_id)
+        db.session.commit()
+        versions = bump(cls, related=rel_ids)
+        invalidate(cls, relations=[row_id], related=rel_ids)
+        notify_relations(versions, removed=edges(cls, row_id, removed))
+        return ids
+
+    @classmethod
+    def bulk_upsert(cls, rows):
+        """
+        Insert records or update the ones with the same unique `name`, in a single
+        transaction. On PostgreSQL the rows are copied into a staging table and
+        upserted from it with one statement, elsewhere with batched multi-row INSERT statements.
+
+        cls: class
+        rows: list of dicts with all imported object parameters, names unique within the list
+        return: list of ids of the created or updated records
+        """
+        table, columns = cls.__table__, list(rows[0])
+        update_rollups(cls, -1, rows=select(table.c.id).where(table.c.name.in_([row['name'] for row in rows])))
+        staging = stage(table, columns, [tuple(row[column] for column in columns) for row in rows])
+        stmt = dialect_insert(table)
+        if staging is not None:
+            stmt, rows = stmt.from_select(columns, select(*staging.c)), None
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c.name],
+                                          set_={**{column: stmt.excluded[column] for column in columns
+                                                   if column != 'name'}, 'version': table.c.version + 1})
+        # executed for many rows with RETURNING, batched into multi-row INSERT statements
+        ids = list(db.session.execute(stmt.returning(table.c.id), rows).scalars())
+        update_rollups(cls, 1, rows=ids)
+        db.session.commit()
+        bump(cls, changed=ids)
+        invalidate(cls, changed=ids)
+        return ids
+
+    @classmethod
+    def bulk_add_relations(cls, pairs):
+        """
+        Add relations in a single transaction, existing relations are skipped.
+        On PostgreSQL the pairs are copied into a staging table first.
+
+        cls: class
+        pairs: list of (record id, related record id), the records must exist
         """
-        obj = cls.query.filter_by(id=row_id).first()
-        if obj:
-            if cls.__name__ == 'Actor':
-                obj.filmography.clear()
-            elif cls.__name__ == 'Movie':
-                obj.cast.clear()
-            return commit(obj)
-        return None  # Record not found
\ No newline at end of file
+        owner, related = relation_column(cls), related_column(cls)
+        row_ids, rel_ids = {row_id for row_id, _ in pairs}, {rel_id for _, rel_id in pairs}
+        update_rollups(cls, -1, relations=row_ids, related=rel_ids)
+        columns = [owner.name, related.name]
+        staging = stage(association, columns, pairs)
+        if staging is not None:
+            db.session.execute(insert_ignore(association, columns, select(*staging.c)))
+        else:
+            stmt = dialect_insert(association)
+            stmt = stmt.on_conflict_do_nothing() if hasattr(stmt, 'on_conflict_do_nothing') else stmt
+            db.session.execute(stmt, [dict(zip(columns, pair)) for pair in pairs])
+        update_rollups(cls, 1, relations=row_ids, related=rel_ids)
+        db.session.commit()
+        versions = bump(cls, related=rel_ids)
+        invalidate(cls, relations=row_ids, related=rel_ids)
+        notify_relations(versions, added=[pair for row_id, rel_id in pairs for pair in edges(cls, row_id, [rel_id])])
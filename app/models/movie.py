@@ -11,18 +11,22 @@ class Movie(Model, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     # name -> string, size 50, unique, not nullable
     name =  db.Column(db.String(50), unique=True, nullable=False)
-    # year -> integer
-    year = db.Column(db.Integer)
-    # genre -> string, size 20
-    genre = db.Column(db.String(20))
+    # year -> integer, indexed
+    year = db.Column(db.Integer, index=True)
+    # genre -> string, size 20, indexed
+    genre = db.Column(db.String(20), index=True)
+    # version -> integer, incremented by every update (optimistic concurrency)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
 
     # Use `db.relationship` method to define the Movie's relationship with Actor.
     # Set `backref` as 'filmography', uselist=True
     # Set `secondary` as 'association'
+    # Relations are deleted by the database, not loaded to be deleted one by one
     actors = db.relationship('Actor',
                              backref='filmography',
                              uselist=True,
-                             secondary=association)
+                             secondary=association,
+                             passive_deletes=True)
 
     def __repr__(self):
         return '<Movie {}>'.format(self.name)
\ No newline at end of file
@@ -1,11 +1,14 @@
 from core import db
-from sqlalchemy import Table, Column, Integer, ForeignKey
+from sqlalchemy import Table, Column, Index, Integer, ForeignKey
 
 # Table name -> 'association'
 # Columns: 'actor_id' -> db.Integer, db.ForeignKey -> 'actors.id', primary_key = True
 #          'movie_id' -> db.Integer, db.ForeignKey -> 'movies.id', primary_key = True
+# Relations are deleted with their actor or movie (ON DELETE CASCADE).
+# The primary key serves lookups by actor, the reverse index lookups by movie.
 association = Table(
     'association', db.Model.metadata,
-    Column('actor_id', Integer, ForeignKey('actors.id'), primary_key=True),
-    Column('movie_id', Integer, ForeignKey('movies.id'), primary_key=True)
+    Column('actor_id', Integer, ForeignKey('actors.id', ondelete='CASCADE'), primary_key=True),
+    Column('movie_id', Integer, ForeignKey('movies.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_association_movie_id_actor_id', 'movie_id', 'actor_id')
 )
\ No newline at end of file
@@ -0,0 +1,116 @@
+from sqlalchemy import Column, Integer, String, Table, cast, delete, extract, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from core import db
+from models.actor import Actor
+from models.base import rollups
+from models.movie import Movie
+from models.relations import association
+
+# Rollup keys are primary key columns, so NULL values are stored as these
+NULL_KEYS = {String: '', Integer: -2147483648}
+
+
+class Rollup(object):
+    """
+    Materialized GROUP BY count over a table.
+
+    The rollup table has a row per group with the number of source records in it.
+    Write methods of the models take the records they change out of their groups
+    before the change and put them back after it, with one upsert adding
+    (or subtracting) the counts of the affected groups.
+    """
+
+    def __init__(self, name, source, keys, count, relations=False):
+        """
+        name: rollup table name
+        source: table of the counted records
+        keys: dict group key name -> (column type, expression over the source)
+        count: name of the count column
+        relations: groups depend on the relations of the records (`association`)
+        """
+        self.source, self.keys, self.count, self.relations = source, keys, count, relations
+        self.table = Table(name, db.Model.metadata,
+                           *[Column(key, key_type, primary_key=True) for key, (key_type, _) in keys.items()],
+                           Column(count, Integer, nullable=False))
+        rollups.append(self)
+
+    def select(self, where=None, sign=1):
+        """
+        GROUP BY count of the source records (matching `where`), multiplied by `sign`
+        """
+        groups = select(*[func.coalesce(expression, NULL_KEYS[key_type]).label(key)
+                          for key, (key_type, expression) in self.keys.items()]).select_from(self.source)
+        if where is not None:
+            groups = groups.where(where)
+        groups = groups.subquery()
+        total = func.count() if sign == 1 else func.count() * sign
+        return select(*groups.c, total.label(self.count)).group_by(*groups.c)
+
+    def apply(self, where, sign):
+        """
+        Add (sign 1) or subtract (sign -1) the source records matching `where`
+        """
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql' and sign < 0:
+            # writes of the same records wait for each other, so the next write
+            # takes out what this one put back
+            db.session.execute(select(self.source.c.id).where(where).order_by(self.source.c.id).with_for_update())
+        stmt = (postgresql if dialect == 'postgresql' else sqlite).insert(self.table) \
+            .from_select(list(self.keys) + [self.count], self.select(where, sign))
+        total = self.table.c[self.count]
+        db.session.execute(stmt.on_conflict_do_update(index_elements=list(self.keys),
+                                                      set_={self.count: total + stmt.excluded[self.count]}))
+
+    def rebuild(self):
+        """
+        Fill the rollup from the whole source table
+        """
+        db.session.execute(delete(self.table))
+        db.session.execute(insert(self.table).from_select(list(self.keys) + [self.count], self.select()))
+
+    def rows(self, materialized):
+        """
+        Groups with their counts, from the rollup table or by GROUP BY over the source
+
+        return: list of dicts
+        """
+        if materialized:
+            stmt = select(self.table).where(self.table.c[self.count] > 0)
+        else:
+            stmt = self.select().subquery()
+            stmt = select(stmt)
+        stmt = stmt.order_by(*[stmt.selected_columns[key] for key in self.keys])
+        return [{key: None if key in self.keys and value == NULL_KEYS[self.keys[key][0]] else value
+                 for key, value in row.items()} for row in db.session.execute(stmt).mappings()]
+
+
+def decade(column):
+    """
+    First year of the decade of a date
+    """
+    return cast(extract('year', column), Integer) // 10 * 10
+
+
+movies_by_genre_year = Rollup('stats_movies_genre_year', Movie.__table__, {
+    'genre': (String, Movie.genre),
+    'year': (Integer, Movie.year),
+}, count='movies')
+
+movies_by_cast_size = Rollup('stats_movies_cast_size', Movie.__table__, {
+    'cast_size': (Integer, select(func.count()).where(association.c.movie_id == Movie.id).scalar_subquery()),
+}, count='movies', relations=True)
+
+actors_by_gender_decade = Rollup('stats_actors_gender_decade', Actor.__table__, {
+    'gender': (String, Actor.gender),
+    'decade': (Integer, decade(Actor.date_of_birth)),
+}, count='actors')
+
+
+def rebuild_rollups():
+    """
+    Fill all rollups from the tables in one transaction
+    """
+    for rollup in rollups:
+        rollup.rebuild()
+    db.session.commit()
@@ -0,0 +1,47 @@
+from core import db
+from sqlalchemy import Table, Column, Integer, String, select, update
+
+# Table name -> 'versions'
+# Columns: 'name' -> versioned table name, primary_key = True
+#          'version' -> number of committed writes to the table
+# Every versioned table has a row, seeded by the migration creating the table
+versions = Table(
+    'versions', db.Model.metadata,
+    Column('name', String(50), primary_key=True),
+    Column('version', Integer, nullable=False, default=0)
+)
+
+
+def bump_versions(tables):
+    """
+    Increment versions of the tables changed by a committed write, in a transaction of its own.
+    Bumped after the write commits, a version row is locked only for this one statement,
+    so concurrent writers of a table don't wait for each other's transactions on it.
+    A version is never older than the data it tags: readers may at most see the data
+    of a write before its version, and fetch it again once it is bumped.
+
+    tables: list of changed tables
+    return: dict table name -> new version
+    """
+    if not tables:
+        return {}
+    rows = db.session.execute(update(versions)
+                              .where(versions.c.name.in_([table.name for table in tables]))
+                              .values(version=versions.c.version + 1)
+                              .returning(versions.c.name, versions.c.version))
+    bumped = dict(rows.all())
+    db.session.commit()
+    return bumped
+
+
+def get_versions(tables):
+    """
+    Get current versions of the tables with one primary key lookup
+
+    tables: list of tables
+    return: list of versions in the order of `tables`
+    """
+    rows = db.session.execute(select(versions.c.name, versions.c.version)
+                              .where(versions.c.name.in_([table.name for table in tables])))
+    found = dict(rows.all())
+    return [found.get(table.name, 0) for table in tables]
@@ -0,0 +1,16 @@
+"""
+Rebuild the statistics rollups from the tables
+
+Usage (from the `app` directory):
+    python rollups.py
+
+Run it when turning STATS_ROLLUPS on: writes made while it was off
+are not counted in the rollups.
+"""
+from core import create_app
+from models.rollups import rebuild_rollups, rollups
+
+if __name__ == '__main__':
+    with create_app().app_context():
+        rebuild_rollups()
+        print(f'Rebuilt {", ".join(rollup.table.name for rollup in rollups)}')
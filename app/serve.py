@@ -0,0 +1,103 @@
+"""
+Production server: the app under gunicorn with preforked workers
+
+Usage (from the `app` directory):
+    python serve.py          # WSGI workers with threads
+    python serve.py --asgi   # async serving mode on uvicorn workers
+
+Workers, threads and recycling are set in `settings/constants.py`.
+With more than one worker records are cached only in a shared cache server
+(CACHE_BACKEND=shared with CACHE_URL), or not at all by default.
+
+Send HUP to the master process to reload code and settings gracefully: the master
+reads `settings/constants.py` again and starts new workers, which import the app
+themselves, while the old ones finish their requests. Environment variables are
+those the master was started with, changing them needs a restart.
+With SERVER_PRELOAD=1 the app is built once in the master instead, workers start
+faster and share its memory, but HUP restarts them on the code already loaded:
+restart the server to deploy.
+"""
+import importlib
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+# every worker drops cached records of its own writes only: without a shared cache server
+# the workers read through to the database
+os.environ.setdefault('CACHE_BACKEND', 'shared' if os.environ.get('CACHE_URL') else 'none')
+
+from settings import constants
+
+
+class Server(BaseApplication):
+    """
+    Gunicorn application running the `create_app()` factory
+    """
+
+    def __init__(self, asgi=False):
+        """
+        asgi: serve `create_asgi_app()` on uvicorn workers
+        """
+        self.asgi = asgi
+        super().__init__()
+
+    def load_config(self):
+        # on start and on every HUP, workers forked afterwards get the new module
+        settings = importlib.reload(constants)
+        check_cache(settings.SERVER_WORKERS, settings.CACHE_BACKEND, settings.CACHE_URL)
+        options = {
+            'bind': settings.SERVER_BIND,
+            'workers': settings.SERVER_WORKERS,
+            'max_requests': settings.SERVER_MAX_REQUESTS,
+            'max_requests_jitter': settings.SERVER_MAX_REQUESTS_JITTER,
+            'timeout': settings.SERVER_TIMEOUT,
+            'graceful_timeout': settings.SERVER_GRACEFUL_TIMEOUT,
+            'preload_app': settings.SERVER_PRELOAD,
+        }
+        if settings.SERVER_PRELOAD:
+            # the app built in the master is shared by the forked workers
+            options['post_fork'] = dispose_engines
+        if self.asgi:
+            options['worker_class'] = 'uvicorn.workers.UvicornWorker'
+        else:
+            options.update(worker_class='gthread', threads=settings.SERVER_THREADS)
+        for key, value in options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        if self.asgi:
+            from core.asgi import create_asgi_app
+            return create_asgi_app()
+        from core import create_app
+        return create_app()
+
+
+def check_cache(workers, backend, url):
+    """
+    Refuse to run several workers with per-process caches, which would keep
+    serving records changed through other workers until they expire
+    """
+    if workers > 1 and not (backend == 'none' or backend == 'shared' and url):
+        sys.exit(f"CACHE_BACKEND={backend} is not shared by the {workers} workers: "
+                 f"set CACHE_BACKEND=shared with CACHE_URL, or CACHE_BACKEND=none")
+
+
+def dispose_engines(server, worker):
+    """
+    Forget database connections inherited from the master,
+    so workers never share sockets, each one opens its own
+    """
+    from core import db
+    from core.asgi import AsyncApp
+
+    app = worker.app.wsgi()
+    if isinstance(app, AsyncApp):
+        app.engine.sync_engine.dispose(close=False)
+        app = app.app
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+if __name__ == '__main__':
+    Server(asgi='--asgi' in sys.argv[1:]).run()
@@ -2,8 +2,128 @@ import os
 # db connection URL (In order to submit your project do NOT change this value!!!)
 DB_URL = os.environ['DB_URL']
 # entities properties
-ACTOR_FIELDS = ['id', 'name', 'gender', 'date_of_birth']
-MOVIE_FIELDS = ['id', 'name', 'year', 'genre']
+ACTOR_FIELDS = ['id', 'name', 'gender', 'date_of_birth', 'version']
+MOVIE_FIELDS = ['id', 'name', 'year', 'genre', 'version']
+# properties set by the database only (versions are incremented by every update)
+READ_ONLY_FIELDS = ['version']
+# list endpoints filters: equality (`?genre=horror`), ranges (`?year_from=2010&year_to=2019`)
+# and sort order (`?sort=-year`), sort fields must be indexed
+ACTOR_FILTERS = ['gender', 'date_of_birth']
+ACTOR_RANGE_FILTERS = ['date_of_birth']
+ACTOR_SORT_FIELDS = ['id', 'name', 'date_of_birth']
+MOVIE_FILTERS = ['year', 'genre']
+MOVIE_RANGE_FILTERS = ['year']
+MOVIE_SORT_FIELDS = ['id', 'name', 'year', 'genre']
 
 # date of birth format
-DATE_FORMAT = '%d.%m.%Y'
\ No newline at end of file
+DATE_FORMAT = '%d.%m.%Y'
+
+# list endpoints pagination
+PAGE_LIMIT_MAX = 1000
+# rows fetched per round trip when streaming list endpoints
+STREAM_CHUNK_SIZE = 1000
+# supported streaming formats -> response mimetype
+STREAM_FORMATS = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+
+# table export formats -> response mimetype (`columnar` is described in controllers/export.py)
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson', 'columnar': 'application/octet-stream'}
+
+# bulk import: records validated and written per transaction, input formats,
+# and rejected records listed in the report (all are counted)
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 5000))
+IMPORT_FORMATS = ['csv', 'ndjson']
+IMPORT_REJECTS_MAX = 100
+
+# max number of records in one bulk request
+BULK_LIMIT_MAX = 1000
+
+# report number of SQL statements of each request in `X-Query-Count` header (for tests)
+RECORD_QUERIES = os.environ.get('RECORD_QUERIES') == '1'
+
+# per-route request latency, status and SQL time counters served at `/metrics` (Prometheus text format)
+METRICS = os.environ.get('METRICS') == '1'
+# log SQL statements taking at least this many milliseconds (`app.slow_queries` logger), 0 - off
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 0))
+
+# requests sent with this token in `X-Profile-Token` and `X-Profile: pstats|speedscope` are profiled,
+# profiling is off if not set
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+# directory of the saved profiles
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'profiles'))
+
+# entity lookups cache: `memory` (in-process LRU), `shared` (CACHE_URL redis or local fake) or `none`
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_URL = os.environ.get('CACHE_URL')
+# max number of cached entries (memory backend)
+CACHE_SIZE = int(os.environ.get('CACHE_SIZE', 10000))
+# seconds a cached entry lives
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 60))
+
+# responses to requests with an `Idempotency-Key` (POST and relation PUT): `memory` (in-process),
+# `shared` (CACHE_URL redis or local fake) or `none` to ignore the keys
+IDEMPOTENCY_BACKEND = os.environ.get('IDEMPOTENCY_BACKEND', 'memory')
+# seconds a response is replayed for retries of its key
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 60 * 60))
+# seconds a key is reserved by a request still running (bounds a crashed worker's reservation)
+IDEMPOTENCY_PENDING_TTL = 60
+# max number of stored responses (memory backend)
+IDEMPOTENCY_SIZE = int(os.environ.get('IDEMPOTENCY_SIZE', 100000))
+IDEMPOTENCY_KEY_MAX = 255
+
+# name search: max results per page and min trigram similarity of fuzzy matches
+SEARCH_LIMIT_MAX = 50
+SEARCH_SIMILARITY = 0.3
+# seconds a search waits for a rebuild of the in-process name index (databases without
+# trigram indexes) after a write, before it uses the previous index
+SEARCH_INDEX_WAIT = 0.1
+
+# /api/stats served from rollup tables maintained by every write instead of GROUP BY
+# over the whole tables (PostgreSQL and SQLite), run `python rollups.py` after turning it on
+STATS_ROLLUPS = os.environ.get('STATS_ROLLUPS') == '1'
+
+# co-star graph: max hops (shared movies) between actors a query may walk,
+# and number of relation changes kept beside the compressed adjacency before it is compacted
+GRAPH_DEPTH_MAX = 6
+GRAPH_DELTA_MAX = 10000
+
+# fields required to create a record
+ACTOR_REQUIRED_FIELDS = ['name', 'gender', 'date_of_birth']
+MOVIE_REQUIRED_FIELDS = ['name', 'genre', 'year']
+
+# database connection pool
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+# connections opened above DB_POOL_SIZE at peak, closed when returned
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+# seconds to wait for a free connection before failing
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+# seconds after which a connection is replaced (-1 never)
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+# test connections on checkout, so connections dropped by a failover are replaced
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+# milliseconds a statement may run on PostgreSQL (0 no limit)
+DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))
+# running behind a transaction-level pooler (e.g. PgBouncer transaction mode):
+# no connection startup options and no server-side prepared statements
+DB_TRANSACTION_POOLING = os.environ.get('DB_TRANSACTION_POOLING') == '1'
+
+# production server (serve.py), CPUs available to the process
+CPU_COUNT = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+SERVER_BIND = os.environ.get('SERVER_BIND', '0.0.0.0:8000')
+# worker processes
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 2 * CPU_COUNT + 1))
+# threads per worker, requests mostly wait on the database so more threads than CPUs,
+# but not more than the connections a worker may open
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', min(4 * CPU_COUNT, DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+# requests after which a worker is replaced to bound memory growth (0 never),
+# jittered so workers do not restart together
+SERVER_MAX_REQUESTS = int(os.environ.get('SERVER_MAX_REQUESTS', 10000))
+SERVER_MAX_REQUESTS_JITTER = int(os.environ.get('SERVER_MAX_REQUESTS_JITTER', SERVER_MAX_REQUESTS // 10))
+# seconds a request may take, and workers are given to finish requests on reload or shutdown
+SERVER_TIMEOUT = int(os.environ.get('SERVER_TIMEOUT', 30))
+SERVER_GRACEFUL_TIMEOUT = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30))
+# build the app once in the master and fork workers from it: less memory and faster worker
+# starts, but a HUP does not load new code then (see serve.py)
+SERVER_PRELOAD = os.environ.get('SERVER_PRELOAD') == '1'
+
+# check on startup that the database is migrated to the latest revision
+SCHEMA_CHECK = os.environ.get('SCHEMA_CHECK', '1') == '1'
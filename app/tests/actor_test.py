@@ -1,8 +1,12 @@
+import json
+from datetime import datetime as dt
+
 import pytest
 import requests
 
 ACTOR_LIST_ROUTE = 'http://127.0.0.1:8000/api/actors'
 ACTOR_ID_ROUTE = 'http://127.0.0.1:8000/api/actor'
+ACTOR_BULK_ROUTE = 'http://127.0.0.1:8000/api/actors/bulk'
 
 
 @pytest.mark.parametrize(('body', 'expected_response'), [(dict([]), 200)])
@@ -89,4 +93,244 @@ def test_delete_actor(body, expected_response):
         body = dict(id=post_response.json()['id'])  # get the actor id that was just created
 
     response = requests.delete(ACTOR_ID_ROUTE, data=body)
-    assert response.status_code == expected_response
\ No newline at end of file
+    assert response.status_code == expected_response
+
+@pytest.mark.parametrize(
+    ('params', 'expected_response'),
+    [
+        (dict(limit=2), 200),
+        (dict(limit=1, after=1), 200),
+        (dict(stream='json'), 200),
+        (dict(stream='ndjson', limit=5), 200),
+        (dict(limit='two'), 400), # limit should be integer
+        (dict(after='one'), 400), # after should be integer
+        (dict(limit=0), 400), # limit should be positive
+        (dict(stream='xml'), 400) # stream format should be supported
+    ]
+)
+def test_get_actors_page(params, expected_response):
+    response = requests.get(ACTOR_LIST_ROUTE, params=params)
+    assert response.status_code == expected_response
+
+
+def test_get_actors_pages_follow_cursor():
+    for i in range(3):
+        requests.post(ACTOR_ID_ROUTE, data=dict(name=f'Paged Actor {i}', gender='male', date_of_birth='01.01.1980'))
+
+    seen = []
+    response = requests.get(ACTOR_LIST_ROUTE, params=dict(limit=2))
+    while True:
+        assert response.status_code == 200
+        seen += [actor['id'] for actor in response.json()]
+        if 'next' not in response.links:
+            break
+        response = requests.get(response.links['next']['url'])
+
+    assert seen == sorted(seen)
+    assert seen == [actor['id'] for actor in requests.get(ACTOR_LIST_ROUTE).json()]
+
+
+def test_stream_actors():
+    records = requests.get(ACTOR_LIST_ROUTE).json()
+    assert requests.get(ACTOR_LIST_ROUTE, params=dict(stream='json')).json() == records
+
+    response = requests.get(ACTOR_LIST_ROUTE, params=dict(stream='ndjson'))
+    assert response.headers['Content-Type'].startswith('application/x-ndjson')
+    assert [json.loads(line) for line in response.text.splitlines()] == records
+
+
+@pytest.mark.parametrize(
+    ('method', 'body', 'expected_response'),
+    [
+        ('post', [], 400), # at least one record should be specified
+        ('post', dict(name='Bulk Actor'), 400), # records should be sent as an array
+        ('put', 'not json', 400),
+        ('delete', [7**10] * 1001, 400) # number of records should not exceed BULK_LIMIT_MAX
+    ]
+)
+def test_actors_bulk_invalid_body(method, body, expected_response):
+    response = getattr(requests, method)(ACTOR_BULK_ROUTE, json=body)
+    assert response.status_code == expected_response
+
+
+def test_add_actors_bulk():
+    body = [
+        dict(name='Bulk Keanu Reeves', gender='male', date_of_birth='02.09.1964'),
+        dict(name='Bulk Carrie-Anne Moss', gender='female', date_of_birth='21.08.1967'),
+        dict(name='Bulk Laurence Fishburne', date_of_birth='30.07.1961'), # all required fields should be specified
+        dict(name='Bulk Hugo Weaving', gender='male', date_of_birth='04/04/1960'), # date of birth should be in format DATE_FORMAT
+        dict(name='Bulk Keanu Reeves', gender='male', date_of_birth='02.09.1964'), # name should be unique
+        dict(name='Bulk Joe Pantoliano', gender='male', date_of_birth='12.09.1951', salary=1) # inputted fields should exist
+    ]
+    response = requests.post(ACTOR_BULK_ROUTE, json=body)
+    assert response.status_code == 200
+
+    results = response.json()
+    assert [result['status'] for result in results] == [200, 200, 400, 400, 400, 400]
+    assert results[0]['record']['name'] == 'Bulk Keanu Reeves'
+    assert results[0]['record']['date_of_birth'] == '02.09.1964'
+    assert requests.get(ACTOR_ID_ROUTE, data=dict(id=results[1]['record']['id'])).json() == results[1]['record']
+
+    # names taken by existing records are rejected too
+    response = requests.post(ACTOR_BULK_ROUTE, json=body[:1])
+    assert response.json()[0]['status'] == 400
+
+
+def test_update_delete_actors_bulk():
+    created = requests.post(ACTOR_BULK_ROUTE, json=[
+        dict(name='Bulk Tom Hardy', gender='male', date_of_birth='15.09.1977'),
+        dict(name='Bulk Charlize Theron', gender='male', date_of_birth='07.08.1975')
+    ]).json()
+    ids = [result['record']['id'] for result in created]
+
+    response = requests.put(ACTOR_BULK_ROUTE, json=[
+        dict(id=ids[1], gender='female'),
+        dict(id=ids[0], name='Bulk Thomas Hardy', date_of_birth='15.09.1977'),
+        dict(id=7**10, gender='male'), # such actor id record should exist
+        dict(id='one', gender='male'), # id should be integer
+        dict(gender='male'), # id should be specified
+        dict(id=ids[0], salary=1) # inputted fields should exist
+    ])
+    assert response.status_code == 200
+    results = response.json()
+    assert [result['status'] for result in results] == [200, 200, 400, 400, 400, 400]
+    assert results[0]['record']['gender'] == 'female'
+    assert requests.get(ACTOR_ID_ROUTE, data=dict(id=ids[0])).json()['name'] == 'Bulk Thomas Hardy'
+    # records without fields to change, or sent with their current values, are not written
+    response = requests.put(ACTOR_BULK_ROUTE, json=[dict(id=ids[1]), dict(id=ids[0], gender='female')])
+    assert [result['record']['version'] for result in response.json()] == [2, 3]
+    response = requests.put(ACTOR_BULK_ROUTE, json=[
+        dict(id=ids[1], gender='female', date_of_birth='07.08.1975'), dict(id=ids[0], gender='male')])
+    assert [result['record']['version'] for result in response.json()] == [2, 4]
+    assert response.json()[1]['record']['gender'] == 'male'
+
+    response = requests.delete(ACTOR_BULK_ROUTE, json=[ids[0], dict(id=ids[1]), 7**10, 'one'])
+    assert response.status_code == 200
+    assert [result['status'] for result in response.json()] == [200, 200, 400, 400]
+    assert requests.get(ACTOR_ID_ROUTE, data=dict(id=ids[0])).status_code == 400
+
+
+def test_actor_query_count(assert_query_count):
+    # every write also bumps the table version
+    response = requests.post(ACTOR_ID_ROUTE, data=dict(name='Counted Actor', gender='male', date_of_birth='01.01.1980'))
+    assert_query_count(response, 2)
+    body = dict(id=response.json()['id'])
+
+    assert_query_count(requests.get(ACTOR_ID_ROUTE, data=body), 1) # the record, tagged with its version
+    assert_query_count(requests.put(ACTOR_ID_ROUTE, data=dict(body, gender='female')), 2)
+    assert_query_count(requests.delete(ACTOR_ID_ROUTE, data=body), 3) # relations and the record
+    assert_query_count(requests.delete(ACTOR_ID_ROUTE, data=body), 2) # nothing to bump
+
+
+def test_update_actor_if_match(assert_query_count):
+    response = requests.post(ACTOR_ID_ROUTE, data=dict(name='Versioned Actor', gender='male', date_of_birth='01.01.1980'))
+    actor_id = response.json()['id']
+    body = dict(id=actor_id)
+    assert response.json()['version'] == 1
+    etag = requests.get(ACTOR_ID_ROUTE, data=body).headers['ETag']
+    assert etag == f'"{actor_id}.1"' == response.headers['ETag']
+    assert requests.get(ACTOR_ID_ROUTE, data=body, headers={'If-None-Match': etag}).status_code == 304
+
+    # another record with the same version has another ETag
+    other = requests.post(ACTOR_ID_ROUTE, data=dict(name='Other Versioned Actor', gender='male', date_of_birth='01.01.1980')).json()
+    other_body = dict(id=other['id'])
+    assert requests.get(ACTOR_ID_ROUTE, data=other_body, headers={'If-None-Match': etag}).status_code == 200
+    assert requests.put(ACTOR_ID_ROUTE, data=dict(other_body, gender='female'), headers={'If-Match': etag}).status_code == 409
+
+    # compare-and-swap in the UPDATE itself, no read before it
+    response = requests.put(ACTOR_ID_ROUTE, data=dict(body, gender='female'), headers={'If-Match': etag})
+    assert response.status_code == 200
+    assert response.json()['version'] == 2
+    assert response.headers['ETag'] == f'"{actor_id}.2"'
+    assert_query_count(response, 2)
+
+    # a concurrent update with the same version loses
+    response = requests.put(ACTOR_ID_ROUTE, data=dict(body, gender=None), headers={'If-Match': etag})
+    assert response.status_code == 409
+    actor = requests.get(ACTOR_ID_ROUTE, data=body).json()
+    assert (actor['gender'], actor['version']) == ('female', 2)
+
+    headers = {'If-Match': f'W/"{actor_id}.2"'}
+    assert requests.put(ACTOR_ID_ROUTE, data=dict(body, gender='male'), headers=headers).status_code == 409
+    headers = {'If-Match': f'"{actor_id}.1", "{actor_id}.2"'}
+    assert requests.put(ACTOR_ID_ROUTE, data=dict(body, gender='male'), headers=headers).status_code == 200
+    assert requests.put(ACTOR_ID_ROUTE, data=dict(body, gender='female'), headers={'If-Match': '*'}).status_code == 200
+    # updates without If-Match increment the version too
+    assert requests.put(ACTOR_ID_ROUTE, data=dict(body, gender='male')).json()['version'] == 5
+    assert requests.put(ACTOR_ID_ROUTE, data=dict(body, version=1)).status_code == 400 # version is read-only
+
+    # nothing to change: no write, the version stays
+    # (no fields: the record is read, the same values: the UPDATE matches nothing, then it is read)
+    for data, queries in ((body, 1), (dict(body, gender='male'), 2)):
+        response = requests.put(ACTOR_ID_ROUTE, data=data, headers={'If-Match': f'"{actor_id}.5"'})
+        assert response.status_code == 200
+        assert (response.json()['gender'], response.json()['version']) == ('male', 5)
+        assert response.headers['ETag'] == f'"{actor_id}.5"'
+        assert_query_count(response, queries)
+    assert requests.put(ACTOR_ID_ROUTE, data=body, headers={'If-Match': f'"{actor_id}.4"'}).status_code == 409
+
+    requests.delete(ACTOR_ID_ROUTE, data=other_body)
+    requests.delete(ACTOR_ID_ROUTE, data=body)
+    response = requests.put(ACTOR_ID_ROUTE, data=dict(body, gender='male'), headers={'If-Match': f'"{actor_id}.5"'})
+    assert response.status_code == 400 # record does not exist
+
+
+@pytest.mark.parametrize(
+    ('body', 'expected_response'),
+    [
+        (dict(name='Json Florence Pugh', gender='female', date_of_birth='03.01.1996'), 200),
+        (dict(name='Json Anya Taylor-Joy', gender=None, date_of_birth='16.04.1996'), 200), # gender is nullable
+        (dict(name='Json Paul Mescal', gender='male'), 400), # all required fields should be specified
+        (dict(name='Json Jacob Elordi', gender='male', date_of_birth=19970826), 400), # date of birth should be in format DATE_FORMAT
+        (dict(name=None, gender='male', date_of_birth='26.08.1997'), 400), # name is not nullable
+        (dict(name='J' * 51, gender='male', date_of_birth='26.08.1997'), 400), # name should fit the column
+        (dict(name=42, gender='male', date_of_birth='26.08.1997'), 400), # name should be a string
+        ([dict(name='Json Austin Butler')], 400) # body should be an object
+    ]
+)
+def test_add_actor_json(body, expected_response):
+    response = requests.post(ACTOR_ID_ROUTE, json=body)
+    assert response.status_code == expected_response
+
+
+def test_update_actor_json():
+    actor_id = requests.post(ACTOR_ID_ROUTE, json=dict(name='Json Jenna Ortega', gender='female', date_of_birth='27.09.2002')).json()['id']
+
+    response = requests.put(ACTOR_ID_ROUTE, json=dict(id=actor_id, date_of_birth='27.09.2001'))
+    assert response.status_code == 200
+    assert response.json()['date_of_birth'] == '27.09.2001'
+
+    assert requests.put(ACTOR_ID_ROUTE, json=dict(id=None, gender='male')).status_code == 400
+    assert requests.put(ACTOR_ID_ROUTE, json=dict(id=actor_id, gender=['male'])).status_code == 400
+    assert requests.get(ACTOR_ID_ROUTE, json=dict(id=actor_id)).json()['gender'] == 'female'
+
+
+@pytest.mark.parametrize(
+    ('params', 'expected_response'),
+    [
+        (dict(gender='female'), 200),
+        (dict(date_of_birth_from='01.01.1980', date_of_birth_to='31.12.1989', sort='-date_of_birth'), 200),
+        (dict(fields='name'), 200),
+        (dict(date_of_birth_from='1980-01-01'), 400), # date should be in DATE_FORMAT
+        (dict(sort='gender'), 400), # gender is not indexed
+        (dict(fields=''), 400) # some fields should be specified
+    ]
+)
+def test_filter_actors(params, expected_response):
+    response = requests.get(ACTOR_LIST_ROUTE, params=params)
+    assert response.status_code == expected_response
+
+
+def test_filter_actors_records():
+    requests.post(ACTOR_BULK_ROUTE, json=[
+        dict(name='Filtered Florence Pugh', gender='female', date_of_birth='03.01.1996'),
+        dict(name='Filtered Austin Butler', gender='male', date_of_birth='17.08.1991')
+    ])
+
+    params = dict(gender='female', date_of_birth_from='01.01.1995', sort='-date_of_birth', fields='name,date_of_birth')
+    actors = requests.get(ACTOR_LIST_ROUTE, params=params).json()
+    assert 'Filtered Florence Pugh' in [actor['name'] for actor in actors]
+    assert all(sorted(actor) == ['date_of_birth', 'id', 'name'] for actor in actors)
+    births = [dt.strptime(actor['date_of_birth'], '%d.%m.%Y') for actor in actors]
+    assert births == sorted(births, reverse=True)
+    assert all(birth.year >= 1995 for birth in births)
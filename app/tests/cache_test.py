@@ -0,0 +1,82 @@
+import pytest
+import requests
+
+ACTOR_ID_ROUTE = 'http://127.0.0.1:8000/api/actor'
+ACTOR_REL_ROUTE = 'http://127.0.0.1:8000/api/actor-relations'
+ACTOR_BULK_ROUTE = 'http://127.0.0.1:8000/api/actors/bulk'
+
+MOVIE_ID_ROUTE = 'http://127.0.0.1:8000/api/movie'
+MOVIE_REL_ROUTE = 'http://127.0.0.1:8000/api/movie-relations'
+
+CACHE_ROUTE = 'http://127.0.0.1:8000/api/_cache'
+
+
+@pytest.fixture
+def cache_stats():
+    stats = requests.get(CACHE_ROUTE).json()
+    if stats['backend'] == 'none':
+        pytest.skip("Server runs without cache")
+    return stats
+
+
+def test_cache_hits(cache_stats, assert_query_count):
+    actor_id = requests.post(ACTOR_ID_ROUTE, data=dict(name='Cached Actor', gender='male', date_of_birth='01.01.1980')).json()['id']
+
+    first = requests.get(ACTOR_ID_ROUTE, data=dict(id=actor_id))
+    second = requests.get(ACTOR_ID_ROUTE, data=dict(id=actor_id))
+    assert first.json() == second.json()
+
+    stats = requests.get(CACHE_ROUTE).json()
+    assert stats['misses'] > cache_stats['misses']
+    assert stats['hits'] > cache_stats['hits']
+    # only the version of the record is read, to check the cached one is current
+    assert_query_count(second, 1)
+
+
+def test_cache_invalidation(cache_stats):
+    actor = requests.post(ACTOR_ID_ROUTE, data=dict(name='Cached Cillian', gender='male', date_of_birth='25.05.1976')).json()
+    movie = requests.post(MOVIE_ID_ROUTE, data=dict(name='Cached Oppenheimer', genre='drama', year='2023')).json()
+    body = dict(id=actor['id'])
+
+    # cache the records and their relations
+    requests.get(ACTOR_ID_ROUTE, data=body)
+    requests.get(ACTOR_REL_ROUTE, data=body)
+    requests.get(MOVIE_REL_ROUTE, data=dict(id=movie['id']))
+
+    requests.put(ACTOR_ID_ROUTE, data=dict(body, name='Cached Cillian Murphy'))
+    assert requests.get(ACTOR_ID_ROUTE, data=body).json()['name'] == 'Cached Cillian Murphy'
+
+    requests.put(ACTOR_REL_ROUTE, data=dict(body, relation_id=movie['id']))
+    assert [m['id'] for m in requests.get(ACTOR_REL_ROUTE, data=body).json()['filmography']] == [movie['id']]
+    assert [a['id'] for a in requests.get(MOVIE_REL_ROUTE, data=dict(id=movie['id'])).json()['cast']] == [actor['id']]
+
+    requests.put(MOVIE_ID_ROUTE, data=dict(id=movie['id'], year='2024'))
+    assert requests.get(ACTOR_REL_ROUTE, data=body).json()['filmography'][0]['year'] == 2024
+
+    requests.delete(ACTOR_REL_ROUTE, data=body)
+    assert requests.get(MOVIE_REL_ROUTE, data=dict(id=movie['id'])).json()['cast'] == []
+
+    requests.put(ACTOR_REL_ROUTE, data=dict(body, relation_id=movie['id']))
+    requests.get(MOVIE_REL_ROUTE, data=dict(id=movie['id']))
+    requests.delete(ACTOR_BULK_ROUTE, json=[actor['id']])
+    assert requests.get(ACTOR_ID_ROUTE, data=body).status_code == 400
+    assert requests.get(MOVIE_REL_ROUTE, data=dict(id=movie['id'])).json()['cast'] == []
+
+
+def test_cache_relations(cache_stats, assert_query_count):
+    actors = [requests.post(ACTOR_ID_ROUTE, data=dict(name=name, gender='female', date_of_birth='07.02.1983')).json()['id']
+              for name in ('Cached Emily', 'Cached Benicio')]
+    movie = requests.post(MOVIE_ID_ROUTE, data=dict(name='Cached Sicario', genre='thriller', year='2015')).json()
+    body = dict(id=actors[0])
+    requests.put(ACTOR_REL_ROUTE, data=dict(body, relation_id=movie['id']))
+
+    requests.get(ACTOR_REL_ROUTE, data=body)
+    # versions of the tables and of the record, the relations are cached
+    assert_query_count(requests.get(ACTOR_REL_ROUTE, data=body), 2)
+
+    # relations are cached with the versions of the tables, a write to them
+    # makes the entry stale even if it doesn't invalidate it
+    requests.put(ACTOR_REL_ROUTE, data=dict(id=actors[1], relation_id=movie['id']))
+    response = requests.get(ACTOR_REL_ROUTE, data=body)
+    assert_query_count(response, 3)
+    assert response.json()['filmography'] == [movie]
@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.fixture
+def assert_query_count():
+    """
+    Check number of SQL statements executed by a request,
+    needs the server to run with RECORD_QUERIES=1
+    """
+    def check(response, expected):
+        if 'X-Query-Count' not in response.headers:
+            pytest.skip("Server does not record queries (run it with RECORD_QUERIES=1)")
+        assert int(response.headers['X-Query-Count']) == expected
+    return check
@@ -0,0 +1,76 @@
+import csv
+import gzip
+import json
+import os
+from datetime import datetime as dt
+
+import pytest
+import requests
+
+os.environ.setdefault('DB_URL', 'sqlite://')
+
+from controllers.export import read_columnar
+from settings.constants import DATE_FORMAT
+
+ACTOR_LIST_ROUTE = 'http://127.0.0.1:8000/api/actors'
+MOVIES_CAST_ROUTE = 'http://127.0.0.1:8000/api/movies/cast'
+
+EXPORT_ROUTE = 'http://127.0.0.1:8000/api/export'
+
+
+@pytest.fixture(scope='module')
+def actors():
+    """
+    Actors as the list endpoint returns them, as CSV strings
+    """
+    return [{key: '' if value is None else str(value) for key, value in record.items()}
+            for record in requests.get(ACTOR_LIST_ROUTE, params=dict(stream='json')).json()]
+
+
+@pytest.mark.parametrize(
+    ('params', 'expected_response'),
+    [
+        (dict(table='actors'), 200),
+        (dict(table='association', format='ndjson', compress='gzip'), 200),
+        (dict(), 400), # table should be specified
+        (dict(table='versions'), 400), # table should be exported
+        (dict(table='actors', format='xml'), 400), # format should be supported
+        (dict(table='actors', compress='zip'), 400) # compression should be gzip
+    ]
+)
+def test_export_params(params, expected_response):
+    response = requests.get(EXPORT_ROUTE, params=params)
+    assert response.status_code == expected_response
+
+
+def test_export_csv(actors):
+    response = requests.get(EXPORT_ROUTE, params=dict(table='actors'))
+    assert response.headers['Content-Type'].startswith('text/csv')
+    assert response.headers['Content-Disposition'] == 'attachment; filename="actors.csv"'
+    assert list(csv.DictReader(response.text.splitlines())) == actors
+
+    response = requests.get(EXPORT_ROUTE, params=dict(table='actors'), headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_export_ndjson_gzip(actors):
+    response = requests.get(EXPORT_ROUTE, params=dict(table='actors', format='ndjson', compress='gzip'))
+    assert response.headers['Content-Type'] == 'application/gzip'
+    records = [json.loads(line) for line in gzip.decompress(response.content).decode().splitlines()]
+    assert [{key: '' if value is None else str(value) for key, value in record.items()} for record in records] == actors
+
+
+def test_export_columnar(actors):
+    response = requests.get(EXPORT_ROUTE, params=dict(table='actors', format='columnar'))
+    names, rows = read_columnar(response.content)
+    assert names == ['id', 'name', 'gender', 'date_of_birth', 'version']
+    assert [row[:3] for row in rows] == [(int(actor['id']), actor['name'], actor['gender'] or None) for actor in actors]
+    assert [row[3] for row in rows] == [dt.strptime(actor['date_of_birth'], DATE_FORMAT).date()
+                                        if actor['date_of_birth'] else None for actor in actors]
+
+
+def test_export_association():
+    pairs = {(actor['id'], movie['id'])
+             for movie in requests.get(MOVIES_CAST_ROUTE).json() for actor in movie['cast']}
+    response = requests.get(EXPORT_ROUTE, params=dict(table='association', format='columnar'))
+    assert set(read_columnar(response.content)[1]) == pairs
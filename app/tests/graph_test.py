@@ -0,0 +1,135 @@
+import os
+import random
+
+import pytest
+import requests
+
+os.environ.setdefault('DB_URL', 'sqlite://')
+
+from controllers.graph import Snapshot
+
+ACTOR_BULK_ROUTE = 'http://127.0.0.1:8000/api/actors/bulk'
+MOVIE_BULK_ROUTE = 'http://127.0.0.1:8000/api/movies/bulk'
+ACTOR_RELATIONS_ROUTE = 'http://127.0.0.1:8000/api/actor-relations'
+
+COSTARS_ROUTE = 'http://127.0.0.1:8000/api/actors/costars'
+NEIGHBOURHOOD_ROUTE = 'http://127.0.0.1:8000/api/actors/neighbourhood'
+SEPARATION_ROUTE = 'http://127.0.0.1:8000/api/actors/separation'
+
+
+@pytest.fixture()
+def chain():
+    """
+    Actors a - b - c - d co-starring in a row (a and b in the first movie, ...) and a loner e
+    """
+    response = requests.post(ACTOR_BULK_ROUTE, json=[
+        dict(name=f'Graph Actor {name}', gender='female', date_of_birth='01.01.1990') for name in 'abcde'])
+    actors = [result['record']['id'] for result in response.json()]
+    response = requests.post(MOVIE_BULK_ROUTE, json=[
+        dict(name=f'Graph Movie {i}', genre='drama', year='2000') for i in range(3)])
+    movies = [result['record']['id'] for result in response.json()]
+    for i, movie_id in enumerate(movies):
+        for actor_id in actors[i:i + 2]:
+            requests.put(ACTOR_RELATIONS_ROUTE, data=dict(id=actor_id, relation_id=movie_id))
+    yield actors, movies
+    requests.delete(ACTOR_BULK_ROUTE, json=actors)
+    requests.delete(MOVIE_BULK_ROUTE, json=movies)
+
+
+@pytest.mark.parametrize(
+    ('route', 'params'),
+    [
+        (COSTARS_ROUTE, dict()), # id should be specified
+        (COSTARS_ROUTE, dict(id='first')), # id should be integer
+        (COSTARS_ROUTE, dict(id=-1)), # actor should exist
+        (NEIGHBOURHOOD_ROUTE, dict(id=-1, depth=2)),
+        (SEPARATION_ROUTE, dict(to=-1)) # from should be specified
+    ]
+)
+def test_graph_params(route, params):
+    response = requests.get(route, params=params)
+    assert response.status_code == 400
+
+
+def test_graph_depth_param(chain):
+    (a, *_), _ = chain
+    assert requests.get(NEIGHBOURHOOD_ROUTE, params=dict(id=a, depth=0)).status_code == 400
+    assert requests.get(NEIGHBOURHOOD_ROUTE, params=dict(id=a, depth=100)).status_code == 400
+
+
+def test_costars(chain):
+    (a, b, c, d, e), (m1, m2, m3) = chain
+    response = requests.get(COSTARS_ROUTE, params=dict(id=b))
+    assert response.status_code == 200
+    assert response.json() == [dict(id=a, name='Graph Actor a', movies=[m1]),
+                               dict(id=c, name='Graph Actor c', movies=[m2])]
+    assert requests.get(COSTARS_ROUTE, params=dict(id=e)).json() == []
+
+
+def test_neighbourhood(chain):
+    (a, b, c, d, e), _ = chain
+    results = requests.get(NEIGHBOURHOOD_ROUTE, params=dict(id=a, depth=2)).json()
+    assert [(result['id'], result['distance']) for result in results] == [(b, 1), (c, 2)]
+
+    response = requests.get(NEIGHBOURHOOD_ROUTE, params=dict(id=a, depth=3, limit=2))
+    assert [result['id'] for result in response.json()] == [b, c]
+    assert 'rel="next"' in response.headers['Link']
+    response = requests.get(response.links['next']['url'])
+    assert [result['id'] for result in response.json()] == [d]
+    assert 'Link' not in response.headers
+
+
+def test_separation(chain):
+    (a, b, c, d, e), (m1, m2, m3) = chain
+    response = requests.get(SEPARATION_ROUTE, params={'from': a, 'to': d})
+    assert response.status_code == 200
+    assert response.json()['degrees'] == 3
+    assert [(step['type'], step['id']) for step in response.json()['path']] == [
+        ('actor', a), ('movie', m1), ('actor', b), ('movie', m2), ('actor', c), ('movie', m3), ('actor', d)]
+
+    assert requests.get(SEPARATION_ROUTE, params={'from': a, 'to': a}).json()['degrees'] == 0
+    assert requests.get(SEPARATION_ROUTE, params={'from': a, 'to': d, 'depth': 2}).json() == dict(
+        degrees=None, path=[])
+    assert requests.get(SEPARATION_ROUTE, params={'from': a, 'to': e}).json()['degrees'] is None
+
+
+def test_graph_sees_relation_writes(chain):
+    (a, b, c, d, e), (m1, m2, m3) = chain
+    assert requests.get(SEPARATION_ROUTE, params={'from': a, 'to': d}).json()['degrees'] == 3
+
+    # a shortcut: a joins the last movie
+    requests.put(ACTOR_RELATIONS_ROUTE, data=dict(id=a, relation_id=m3))
+    assert requests.get(SEPARATION_ROUTE, params={'from': a, 'to': d}).json()['degrees'] == 1
+
+    # and leaves it again
+    requests.delete(ACTOR_RELATIONS_ROUTE, data=dict(id=a, relation_id=m3))
+    assert requests.get(SEPARATION_ROUTE, params={'from': a, 'to': d}).json()['degrees'] == 3
+
+    # the chain breaks when c leaves all movies
+    requests.delete(ACTOR_RELATIONS_ROUTE, data=dict(id=c))
+    assert requests.get(SEPARATION_ROUTE, params={'from': a, 'to': d}).json()['degrees'] is None
+    assert requests.get(COSTARS_ROUTE, params=dict(id=b)).json() == [dict(id=a, name='Graph Actor a', movies=[m1])]
+
+
+def test_snapshot_applies_writes():
+    rng = random.Random(7)
+    edges = {(rng.randint(1, 30), rng.randint(1, 20)) for _ in range(80)}
+    first = snapshot = Snapshot.build(0, sorted(edges))
+    for version in range(1, 41):
+        if version % 2:
+            added, removed = {(rng.randint(1, 30), rng.randint(1, 20)) for _ in range(3)}, set()
+        else:
+            added, removed = set(), set(rng.sample(sorted(edges), 3))
+        # a write already loaded by the snapshot changes nothing
+        for _ in range(1 + version % 3):
+            snapshot = snapshot.apply(sorted(added), sorted(removed), version)
+        edges = (edges - removed) | added
+
+    fresh = Snapshot.build(40, sorted(edges))
+    for actor_id in range(1, 31):
+        assert {costar: sorted(movies) for costar, movies in snapshot.costars(actor_id).items()} == \
+               {costar: sorted(movies) for costar, movies in fresh.costars(actor_id).items()}
+        assert snapshot.neighbourhood(actor_id, 3) == fresh.neighbourhood(actor_id, 3)
+        assert len(snapshot.path(1, actor_id, 6) or []) == len(fresh.path(1, actor_id, 6) or [])
+    # snapshots are immutable
+    assert first.actors is snapshot.actors and not first.added_movies and not first.removed
@@ -0,0 +1,122 @@
+import os
+import uuid
+
+import pytest
+import requests
+
+os.environ.setdefault('DB_URL', 'sqlite://')
+
+from core.cache import LocalClient
+from core.idempotency import MemoryStore, SharedStore
+
+ACTOR_ID_ROUTE = 'http://127.0.0.1:8000/api/actor'
+MOVIE_ID_ROUTE = 'http://127.0.0.1:8000/api/movie'
+ACTOR_RELATIONS_ROUTE = 'http://127.0.0.1:8000/api/actor-relations'
+ACTOR_BULK_ROUTE = 'http://127.0.0.1:8000/api/actors/bulk'
+
+
+def new_key():
+    return {'Idempotency-Key': str(uuid.uuid4())}
+
+
+def test_retried_post(assert_query_count):
+    headers, body = new_key(), dict(name='Idempotent Actor', gender='male', date_of_birth='01.01.1980')
+    response = requests.post(ACTOR_ID_ROUTE, data=body, headers=headers)
+    assert response.status_code == 200
+    assert 'Idempotent-Replayed' not in response.headers
+
+    # the retry gets the same record instead of a unique name error, without a statement
+    retry = requests.post(ACTOR_ID_ROUTE, data=body, headers=headers)
+    assert retry.status_code == 200
+    assert retry.json() == response.json()
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.headers['ETag'] == response.headers['ETag']
+    assert_query_count(retry, 0)
+
+    # without a key the request runs again
+    assert requests.post(ACTOR_ID_ROUTE, data=body).status_code == 400
+    requests.delete(ACTOR_ID_ROUTE, data=dict(id=response.json()['id']))
+
+
+@pytest.mark.parametrize(
+    ('headers', 'expected_response'),
+    [
+        ({'Idempotency-Key': ''}, 400), # key should not be empty
+        ({'Idempotency-Key': 'k' * 256}, 400), # key should fit
+    ]
+)
+def test_invalid_key(headers, expected_response):
+    response = requests.post(MOVIE_ID_ROUTE, data=dict(name='Keyed Movie', genre='drama', year='2000'), headers=headers)
+    assert response.status_code == expected_response
+
+
+def test_key_reused_for_another_request():
+    headers = new_key()
+    movie = requests.post(MOVIE_ID_ROUTE, data=dict(name='Keyed Movie 1', genre='drama', year='2000'),
+                          headers=headers).json()
+    response = requests.post(MOVIE_ID_ROUTE, data=dict(name='Keyed Movie 2', genre='drama', year='2000'),
+                             headers=headers)
+    assert response.status_code == 422
+    # keys are scoped to the route
+    response = requests.post(ACTOR_ID_ROUTE, data=dict(name='Keyed Actor', gender='male', date_of_birth='01.01.1980'),
+                             headers=headers)
+    assert response.status_code == 200
+    requests.delete(MOVIE_ID_ROUTE, data=dict(id=movie['id']))
+    requests.delete(ACTOR_ID_ROUTE, data=dict(id=response.json()['id']))
+
+
+def test_failed_request_is_not_stored():
+    headers, body = new_key(), dict(name='Unfinished Actor', gender='male')
+    assert requests.post(ACTOR_ID_ROUTE, data=body, headers=headers).status_code == 400
+    # the retry of a fixed request runs
+    response = requests.post(ACTOR_ID_ROUTE, data=dict(body, date_of_birth='01.01.1980'), headers=headers)
+    assert response.status_code == 200
+    requests.delete(ACTOR_ID_ROUTE, data=dict(id=response.json()['id']))
+
+
+def test_retried_relation_put(assert_query_count):
+    actor = requests.post(ACTOR_ID_ROUTE, data=dict(name='Keyed Relation Actor', gender='male',
+                                                    date_of_birth='01.01.1980')).json()
+    movie = requests.post(MOVIE_ID_ROUTE, data=dict(name='Keyed Relation Movie', genre='drama', year='2000')).json()
+    headers, body = new_key(), dict(id=actor['id'], relation_id=movie['id'])
+
+    response = requests.put(ACTOR_RELATIONS_ROUTE, data=body, headers=headers)
+    assert response.status_code == 200
+    retry = requests.put(ACTOR_RELATIONS_ROUTE, data=body, headers=headers)
+    assert retry.json() == response.json()
+    assert_query_count(retry, 0)
+
+    requests.delete(ACTOR_ID_ROUTE, data=dict(id=actor['id']))
+    requests.delete(MOVIE_ID_ROUTE, data=dict(id=movie['id']))
+
+
+def test_retried_bulk_post():
+    headers, body = new_key(), [dict(name=f'Keyed Bulk Actor {i}', gender='female', date_of_birth='01.01.1990')
+                                for i in range(2)]
+    response = requests.post(ACTOR_BULK_ROUTE, json=body, headers=headers)
+    assert [result['status'] for result in response.json()] == [200, 200]
+    retry = requests.post(ACTOR_BULK_ROUTE, json=body, headers=headers)
+    assert retry.json() == response.json()
+    requests.delete(ACTOR_BULK_ROUTE, json=[result['record']['id'] for result in response.json()])
+
+
+@pytest.mark.parametrize('store', [MemoryStore(2), SharedStore(LocalClient())], ids=['memory', 'shared'])
+def test_store(store):
+    assert store.add('a', ['fingerprint'], 60)
+    assert not store.add('a', ['other'], 60)
+    store.set('a', ['fingerprint', 200, 'application/json', '{}', None], 60)
+    assert store.get('a') == ['fingerprint', 200, 'application/json', '{}', None]
+    store.delete('a')
+    assert store.get('a') is None
+
+    # expired keys can be added again
+    assert store.add('b', ['fingerprint'], -1)
+    assert store.get('b') is None
+    assert store.add('b', ['fingerprint'], 60)
+
+
+def test_memory_store_evicts_oldest():
+    store = MemoryStore(2)
+    for key in 'abc':
+        store.set(key, [key], 60)
+    assert [store.get(key) for key in 'abc'] == [None, ['b'], ['c']]
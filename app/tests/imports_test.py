@@ -0,0 +1,110 @@
+import gzip
+import json
+
+import pytest
+import requests
+
+ACTOR_BULK_ROUTE = 'http://127.0.0.1:8000/api/actors/bulk'
+MOVIE_BULK_ROUTE = 'http://127.0.0.1:8000/api/movies/bulk'
+ACTOR_RELATIONS_ROUTE = 'http://127.0.0.1:8000/api/actor-relations'
+SEARCH_ROUTE = 'http://127.0.0.1:8000/api/search'
+
+IMPORT_ROUTE = 'http://127.0.0.1:8000/api/import'
+
+ACTORS_CSV = '''name,gender,date_of_birth
+Import Actor 1,female,01.02.1980
+Import Actor 2,male,
+Import Actor 3,male,1980-02-01
+'''
+
+
+def import_records(params, body):
+    return requests.post(IMPORT_ROUTE, params=params, data=body.encode() if isinstance(body, str) else body)
+
+
+def find(name, entity):
+    """
+    Id of a record by its name
+    """
+    results = requests.get(SEARCH_ROUTE, params=dict(q=name, type=entity)).json()
+    return next((result['id'] for result in results if result['name'] == name), None)
+
+
+@pytest.fixture()
+def cleanup():
+    names = {'actor': [], 'movie': []}
+    yield names
+    for entity, route in (('actor', ACTOR_BULK_ROUTE), ('movie', MOVIE_BULK_ROUTE)):
+        ids = [row_id for row_id in (find(name, entity) for name in names[entity]) if row_id]
+        if ids:
+            requests.delete(route, json=ids)
+
+
+@pytest.mark.parametrize(
+    ('params', 'expected_response'),
+    [
+        (dict(), 400), # table should be specified
+        (dict(table='versions'), 400), # table should be imported
+        (dict(table='actors', format='xml'), 400), # format should be supported
+        (dict(table='actors', compress='zip'), 400), # compression should be gzip
+        (dict(table='actors', start='first'), 400) # start should be integer
+    ]
+)
+def test_import_params(params, expected_response):
+    assert import_records(params, ACTORS_CSV).status_code == expected_response
+
+
+def test_import_csv(cleanup):
+    cleanup['actor'] += ['Import Actor 1', 'Import Actor 2']
+    response = import_records(dict(table='actors'), ACTORS_CSV)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report['loaded'], report['rejected'], report['checkpoint']) == (2, 1, 3)
+    assert report['rejects'] == [{'record': 3, 'error': 'Date must be in %d.%m.%Y format'}]
+
+    actor_id = find('Import Actor 2', 'actor')
+    actor = requests.get('http://127.0.0.1:8000/api/actor', data=dict(id=actor_id)).json()
+    assert actor == dict(id=actor_id, name='Import Actor 2', gender='male', date_of_birth=None, version=1)
+
+    # upserted by name: the same record is updated, not duplicated
+    report = import_records(dict(table='actors'), 'name,gender,date_of_birth\nImport Actor 2,female,03.04.1990\n').json()
+    assert report['loaded'] == 1
+    assert find('Import Actor 2', 'actor') == actor_id
+    actor = requests.get('http://127.0.0.1:8000/api/actor', data=dict(id=actor_id)).json()
+    assert (actor['gender'], actor['date_of_birth'], actor['version']) == ('female', '03.04.1990', 2)
+
+
+def test_import_start(cleanup):
+    cleanup['actor'] += ['Import Actor 1', 'Import Actor 2']
+    report = import_records(dict(table='actors', start=2), ACTORS_CSV).json()
+    assert (report['loaded'], report['rejected'], report['checkpoint']) == (0, 1, 3)
+    assert find('Import Actor 1', 'actor') is None
+
+
+def test_import_csv_extra_values(cleanup):
+    cleanup['actor'] += ['Import Actor 1', 'Import Actor 2']
+    body = 'name,gender,date_of_birth\nImport Actor 1,female,01.02.1980,extra\nImport Actor 2,male,\n'
+    response = import_records(dict(table='actors'), body)
+    assert response.status_code == 200
+    report = response.json()
+    # only the row with more values than the header is rejected
+    assert (report['loaded'], report['rejected'], report['checkpoint']) == (1, 1, 2)
+    assert report['rejects'] == [{'record': 1, 'error': 'More values than fields in the header'}]
+    assert find('Import Actor 1', 'actor') is None
+
+
+def test_import_ndjson_gzip_relations(cleanup):
+    cleanup['actor'] += ['Import Actor 1']
+    cleanup['movie'] += ['Import Movie 1']
+    movies = [{'name': 'Import Movie 1', 'genre': 'drama', 'year': 2001}, {'name': 'Import Movie 2', 'year': 2002}]
+    body = gzip.compress(''.join(json.dumps(movie) + '\n' for movie in movies).encode())
+    report = import_records(dict(table='movies', format='ndjson', compress='gzip'), body).json()
+    assert (report['loaded'], report['rejects']) == (1, [{'record': 2, 'error': 'Missing fields: genre'}])
+
+    import_records(dict(table='actors'), ACTORS_CSV)
+    relations = 'actor,movie\nImport Actor 1,Import Movie 1\nImport Actor 1,Import Movie 1\nNobody,Import Movie 1\n'
+    report = import_records(dict(table='association'), relations).json()
+    assert (report['loaded'], report['rejects']) == (1, [{'record': 3, 'error': 'Actor not found'}])
+
+    actor = requests.get(ACTOR_RELATIONS_ROUTE, data=dict(id=find('Import Actor 1', 'actor'))).json()
+    assert [movie['name'] for movie in actor['filmography']] == ['Import Movie 1']
@@ -0,0 +1,69 @@
+import os
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, delete, insert, select
+
+os.environ.setdefault('DB_URL', 'sqlite://')
+
+from controllers.serializers import actor_filmography, movie_cast
+from core.migrations import upgrade
+from core.pool import configure_engine
+from models.actor import Actor
+from models.movie import Movie
+from models.relations import association
+
+
+@pytest.fixture(scope='module')
+def connection():
+    """
+    Migrated in-memory SQLite database with a few related records
+    """
+    engine = create_engine('sqlite://')
+    configure_engine(engine)
+    with engine.connect() as connection:
+        upgrade(connection)
+        connection.execute(insert(Actor.__table__), [
+            {'id': i, 'name': f'Index Actor {i}', 'gender': 'male', 'date_of_birth': date(1950 + i, 1, 1)}
+            for i in range(1, 11)
+        ])
+        connection.execute(insert(Movie.__table__), [
+            {'id': i, 'name': f'Index Movie {i}', 'genre': 'drama', 'year': 2000 + i} for i in range(1, 11)
+        ])
+        connection.execute(insert(association), [{'actor_id': i, 'movie_id': 11 - i} for i in range(1, 11)])
+        connection.commit()
+        yield connection
+
+
+def plan(connection, stmt):
+    """
+    Query plan of a statement as one string
+    """
+    sql = stmt.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True})
+    return ' | '.join(row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}'))
+
+
+@pytest.mark.parametrize(
+    ('stmt', 'index'),
+    [
+        (movie_cast.select([1, 2]), 'ix_association_movie_id_actor_id'),  # cast of movies
+        (select(association.c.actor_id).where(association.c.movie_id == 1), 'ix_association_movie_id_actor_id'),
+        (actor_filmography.select([1, 2]), 'sqlite_autoindex_association_1'),  # filmography by the primary key
+        (select(Movie.id).where(Movie.year.between(2001, 2005)), 'ix_movies_year'),
+        (select(Movie.id).where(Movie.genre == 'drama'), 'ix_movies_genre'),
+        (select(Actor.id).where(Actor.date_of_birth >= date(1955, 1, 1)), 'ix_actors_date_of_birth'),
+    ]
+)
+def test_index_used(connection, stmt, index):
+    query_plan = plan(connection, stmt)
+    assert f'USING INDEX {index}' in query_plan or f'USING COVERING INDEX {index}' in query_plan
+
+
+def test_delete_cascades_to_relations(connection):
+    connection.execute(delete(Actor.__table__).where(Actor.id == 1))
+    connection.execute(delete(Movie.__table__).where(Movie.id == 1))
+    remaining = connection.execute(select(association.c.actor_id, association.c.movie_id)).all()
+    connection.rollback()
+
+    assert all(1 not in row for row in remaining)
+    assert len(remaining) == 8
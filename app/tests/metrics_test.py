@@ -0,0 +1,121 @@
+import os
+import re
+import time
+
+import pytest
+import requests
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+os.environ.setdefault('DB_URL', 'sqlite://')
+
+import core.metrics
+from core.metrics import Counter, Histogram, instrument_engine
+
+ACTOR_LIST_ROUTE = 'http://127.0.0.1:8000/api/actors'
+ACTOR_ROUTE = 'http://127.0.0.1:8000/api/actor'
+METRICS_ROUTE = 'http://127.0.0.1:8000/metrics'
+
+
+def scrape():
+    """
+    Samples of the metrics endpoint: dict `name{labels}` -> value
+    """
+    response = requests.get(METRICS_ROUTE)
+    if response.status_code == 404:
+        pytest.skip("server runs without METRICS=1")
+    assert response.status_code == 200
+    assert response.headers['Content-Type'].startswith('text/plain')
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in response.text.splitlines() if line and not line.startswith('#')}
+
+
+def test_request_counts():
+    before = scrape()
+    for _ in range(3):
+        assert requests.get(ACTOR_LIST_ROUTE).status_code == 200
+    assert requests.get(ACTOR_ROUTE, params=dict(id=-1)).status_code == 400
+    after = scrape()
+
+    ok = 'http_requests_total{route="/api/actors",method="GET",status="200"}'
+    bad = 'http_requests_total{route="/api/actor",method="GET",status="400"}'
+    assert after[ok] - before.get(ok, 0) == 3
+    assert after[bad] - before.get(bad, 0) == 1
+    # routes are labeled by their rule, not the requested path
+    assert not any('id=' in sample for sample in after)
+
+
+def test_latency_histogram():
+    requests.get(ACTOR_LIST_ROUTE)
+    samples = scrape()
+    labels = 'route="/api/actors",method="GET"'
+    buckets = [(sample, value) for sample, value in samples.items()
+               if sample.startswith('http_request_duration_seconds_bucket{' + labels)]
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts)  # cumulative
+    assert buckets[-1][0].endswith('le="+Inf"}')
+    assert counts[-1] == samples['http_request_duration_seconds_count{' + labels + '}']
+    assert samples['http_request_duration_seconds_sum{' + labels + '}'] > 0
+
+
+def test_statement_counts():
+    before = scrape()
+    response = requests.get(ACTOR_LIST_ROUTE)
+    after = scrape()
+    sample = 'db_statements_total{route="/api/actors"}'
+    statements = after[sample] - before.get(sample, 0)
+    assert statements >= 1
+    if 'X-Query-Count' in response.headers:
+        assert statements == int(response.headers['X-Query-Count'])
+    assert after['db_request_duration_seconds_count{route="/api/actors"}'] >= 1
+
+
+def test_streamed_statement_counts():
+    before = scrape()
+    response = requests.get(ACTOR_LIST_ROUTE, params=dict(stream='ndjson'))
+    assert response.status_code == 200
+    # recorded when the server closes the response, which may be after the body is read
+    sample = 'db_statements_total{route="/api/actors"}'
+    for _ in range(50):
+        after = scrape()
+        if after.get(sample, 0) > before.get(sample, 0):
+            break
+        time.sleep(0.02)
+    # the versions of the ETag and the select streaming the body
+    assert after[sample] - before.get(sample, 0) >= 2
+
+
+def test_failed_statement(monkeypatch):
+    monkeypatch.setattr(core.metrics, 'METRICS', True)
+    engine = create_engine('sqlite://')
+    instrument_engine(engine)
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text('SELECT * FROM missing'))
+        # the start time of the failed statement is not left for the next one
+        assert conn.info['metrics_start'] == []
+        assert conn.execute(text('SELECT 1')).scalar() == 1
+        assert conn.info['metrics_start'] == []
+
+
+def test_exposition_format():
+    counter = Counter('requests_total', 'Requests', ('route',))
+    counter.inc('/a"b\\')
+    counter.inc('/a"b\\', amount=2)
+    histogram = Histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value, '/a')
+
+    assert counter.render() == [
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total{route="/a\\"b\\\\"} 3',
+    ]
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 6.05',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+    assert all(re.match(r'^[a-z_]+(\{.*\})? \S+$', line) for line in histogram.render()[2:])
@@ -3,6 +3,7 @@ import requests
 
 MOVIE_LIST_ROUTE = 'http://127.0.0.1:8000/api/movies'
 MOVIE_ID_ROUTE = 'http://127.0.0.1:8000/api/movie'
+MOVIE_BULK_ROUTE = 'http://127.0.0.1:8000/api/movies/bulk'
 
 
 @pytest.mark.parametrize(('body', 'expected_response'), [(dict([]), 200)])
@@ -90,4 +91,134 @@ def test_delete_movie(body, expected_response):
         body = dict(id=post_response.json()['id'])  # get the movie id that was just created
 
     response = requests.delete(MOVIE_ID_ROUTE, data=body)
-    assert response.status_code == expected_response
\ No newline at end of file
+    assert response.status_code == expected_response
+
+@pytest.mark.parametrize(
+    ('params', 'expected_response'),
+    [
+        (dict(limit=2), 200),
+        (dict(limit=1, after=1), 200),
+        (dict(stream='json'), 200),
+        (dict(stream='ndjson', limit=5), 200),
+        (dict(limit='two'), 400), # limit should be integer
+        (dict(after='one'), 400), # after should be integer
+        (dict(limit=100000), 400), # limit should not exceed PAGE_LIMIT_MAX
+        (dict(stream='xml'), 400) # stream format should be supported
+    ]
+)
+def test_get_movies_page(params, expected_response):
+    response = requests.get(MOVIE_LIST_ROUTE, params=params)
+    assert response.status_code == expected_response
+
+
+def test_movies_bulk():
+    response = requests.post(MOVIE_BULK_ROUTE, json=[
+        dict(name='Bulk Alien', genre='horror', year='1979'),
+        dict(name='Bulk Aliens', genre='action', year=1986),
+        dict(name='Bulk Alien 3', genre='horror'), # all required fields should be specified
+        dict(name='Bulk Prometheus', genre='sci-fi', year='twenty twelve') # year should be integer
+    ])
+    assert response.status_code == 200
+    results = response.json()
+    assert [result['status'] for result in results] == [200, 200, 400, 400]
+    ids = [result['record']['id'] for result in results[:2]]
+
+    response = requests.put(MOVIE_BULK_ROUTE, json=[
+        dict(id=ids[0], genre='sci-fi'),
+        dict(id=ids[1], name='Bulk Alien'), # name should be unique
+        dict(id=ids[1], year='next') # year should be integer
+    ])
+    assert [result['status'] for result in response.json()] == [200, 400, 400]
+    assert requests.get(MOVIE_ID_ROUTE, data=dict(id=ids[0])).json()['genre'] == 'sci-fi'
+
+    response = requests.delete(MOVIE_BULK_ROUTE, json=ids + [ids[0]])
+    assert [result['status'] for result in response.json()] == [200, 200, 400]
+
+
+def test_movies_not_modified(assert_query_count):
+    response = requests.get(MOVIE_LIST_ROUTE)
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+
+    # nothing changed - only the version is read
+    response = requests.get(MOVIE_LIST_ROUTE, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.content == b''
+    assert response.headers['ETag'] == etag
+    assert_query_count(response, 1)
+
+    movie_id = requests.post(MOVIE_ID_ROUTE, data=dict(name='Conditional Movie', genre='drama', year='2001')).json()['id']
+    response = requests.get(MOVIE_LIST_ROUTE, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+    # entity endpoints are tagged too
+    etag = requests.get(MOVIE_ID_ROUTE, data=dict(id=movie_id)).headers['ETag']
+    assert etag == f'"{movie_id}.1"'
+    assert requests.get(MOVIE_ID_ROUTE, data=dict(id=movie_id), headers={'If-None-Match': etag}).status_code == 304
+    requests.put(MOVIE_ID_ROUTE, data=dict(id=movie_id, genre='comedy'))
+    response = requests.get(MOVIE_ID_ROUTE, data=dict(id=movie_id), headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json()['genre'] == 'comedy'
+    # an update changing nothing keeps the ETag
+    etag = response.headers['ETag']
+    assert requests.put(MOVIE_ID_ROUTE, data=dict(id=movie_id, genre='comedy')).headers['ETag'] == etag
+    assert requests.get(MOVIE_ID_ROUTE, data=dict(id=movie_id), headers={'If-None-Match': etag}).status_code == 304
+
+
+@pytest.mark.parametrize(
+    ('params', 'expected_response'),
+    [
+        (dict(genre='horror', year=2017), 200),
+        (dict(year_from=2000, year_to=2010, sort='-year'), 200),
+        (dict(sort='genre', fields='name,genre'), 200),
+        (dict(year='2zero17'), 400), # year should be integer
+        (dict(sort='budget'), 400), # sort field should be whitelisted
+        (dict(fields='name,budget'), 400) # fields should exist
+    ]
+)
+def test_filter_movies(params, expected_response):
+    response = requests.get(MOVIE_LIST_ROUTE, params=params)
+    assert response.status_code == expected_response
+
+
+def test_filter_movies_records(assert_query_count):
+    requests.post(MOVIE_BULK_ROUTE, json=[
+        dict(name='Filtered It', genre='horror', year=2017),
+        dict(name='Filtered Get Out', genre='horror', year=2017),
+        dict(name='Filtered Dunkirk', genre='war', year=2017)
+    ])
+
+    response = requests.get(MOVIE_LIST_ROUTE, params=dict(genre='horror', year=2017, fields='name'))
+    assert response.status_code == 200
+    assert ['id', 'name'] == sorted(response.json()[0])
+    assert {'Filtered It', 'Filtered Get Out'} <= {movie['name'] for movie in response.json()}
+    assert all(movie['name'] != 'Filtered Dunkirk' for movie in response.json())
+    assert_query_count(response, 2)
+
+    years = [movie['year'] for movie in requests.get(MOVIE_LIST_ROUTE, params=dict(year_from=2010, year_to=2020)).json()]
+    assert years and all(2010 <= year <= 2020 for year in years)
+
+
+@pytest.mark.parametrize('sort', ['year', '-year', 'genre', '-name'])
+def test_sorted_movies_pages_follow_cursor(sort):
+    # a movie without a year sorts last (first in descending order)
+    movie_id = requests.post(MOVIE_ID_ROUTE, data=dict(name=f'Yearless {sort}', genre='drama', year=2000)).json()['id']
+    requests.put(MOVIE_ID_ROUTE, json=dict(id=movie_id, year=None))
+
+    expected = requests.get(MOVIE_LIST_ROUTE, params=dict(sort=sort)).json()
+    seen = []
+    response = requests.get(MOVIE_LIST_ROUTE, params=dict(sort=sort, limit=3))
+    while True:
+        assert response.status_code == 200
+        seen += response.json()
+        if 'next' not in response.links:
+            break
+        response = requests.get(response.links['next']['url'])
+
+    assert seen == expected
+    field = sort.lstrip('-')
+    values = [movie[field] for movie in expected if movie[field] is not None]
+    assert values == sorted(values, reverse=sort.startswith('-'))
+    if field == 'year':
+        assert (expected[0] if sort.startswith('-') else expected[-1])['year'] is None
@@ -0,0 +1,25 @@
+import pytest
+import requests
+
+ACTORS_ROUTE = 'http://127.0.0.1:8000/api/actors'
+
+POOL_ROUTE = 'http://127.0.0.1:8000/api/_pool'
+
+
+@pytest.fixture
+def pool_stats():
+    stats = requests.get(POOL_ROUTE).json()
+    if 'waits' not in stats:
+        pytest.skip("Server runs without a queue pool")
+    return stats
+
+
+def test_pool_stats(pool_stats):
+    assert pool_stats['checked_out'] + pool_stats['idle'] <= pool_stats['size'] + pool_stats['max_overflow']
+    assert pool_stats['overflow'] <= pool_stats['max_overflow']
+
+    requests.get(ACTORS_ROUTE)
+    stats = requests.get(POOL_ROUTE).json()
+    assert stats['waits']['count'] > pool_stats['waits']['count']
+    assert stats['waits']['max_ms'] >= stats['waits']['avg_ms']
+    assert stats['waits']['timeouts'] == 0
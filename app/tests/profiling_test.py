@@ -0,0 +1,118 @@
+import importlib
+import json
+import os
+import pstats
+import sys
+
+import pytest
+
+os.environ.setdefault('DB_URL', 'sqlite://')
+
+import core
+import core.profiling
+from core import create_app, db
+from core.migrations import upgrade
+from models.actor import Actor
+
+TOKEN = 'profile-test-token'
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    """
+    Test client of an app on a migrated in-memory SQLite database with profiling on
+    """
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # in memory, whatever DB_URL the tests against a running server use
+        monkeypatch.setattr(core, 'DB_URL', 'sqlite://')
+        monkeypatch.setattr(core, 'SCHEMA_CHECK', False)
+        monkeypatch.setattr(core.profiling, 'PROFILE_TOKEN', TOKEN)
+        monkeypatch.setattr(core.profiling, 'PROFILE_DIR', str(tmp_path_factory.mktemp('profiles')))
+        app = create_app()
+        with app.app_context():
+            if 'actors' not in app.view_functions:
+                # routes are registered on the app that imported them first (another test module's)
+                importlib.reload(sys.modules['core.routes'])
+            upgrade(db.session.connection())
+            db.session.commit()
+            Actor.bulk_create([dict(name=f'Profiled Actor {i}') for i in range(5)])
+            yield app.test_client()
+
+
+def profile_path(response):
+    return os.path.join(core.profiling.PROFILE_DIR, response.headers['X-Profile-File'])
+
+
+def test_not_profiled(client):
+    response = client.get('/api/actors')
+    assert response.status_code == 200
+    assert 'X-Profile-File' not in response.headers
+
+
+@pytest.mark.parametrize(
+    ('headers', 'expected_response'),
+    [
+        ({'X-Profile': 'pstats'}, 403), # token is required
+        ({'X-Profile': 'pstats', 'X-Profile-Token': 'wrong'}, 403), # token should match
+        ({'X-Profile': 'pstats', 'X-Profile-Token': 'wr\xf6ng'}, 403), # non-ASCII token
+        ({'X-Profile': 'perf', 'X-Profile-Token': TOKEN}, 400), # format should be supported
+    ]
+)
+def test_profile_guard(client, headers, expected_response):
+    response = client.get('/api/actors', headers=headers)
+    assert response.status_code == expected_response
+    assert 'X-Profile-File' not in response.headers
+
+
+def test_pstats_profile(client):
+    response = client.get('/api/actors', headers={'X-Profile': 'pstats', 'X-Profile-Token': TOKEN})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 5
+    assert '-GET-api_actors-' in response.headers['X-Profile-File']
+    assert 'sql;dur=' in response.headers['Server-Timing']
+
+    stats = pstats.Stats(profile_path(response))
+    assert any(function == 'get_all_actors' for _, _, function in stats.stats)
+    with open(profile_path(response).replace('.pstats', '.sql.json')) as file:
+        statements = json.load(file)
+    assert statements and all(statement['duration_ms'] >= 0 for statement in statements)
+    assert any('FROM actors' in statement['statement'] for statement in statements)
+
+
+def test_speedscope_profile(client):
+    response = client.get('/api/actors', headers={'X-Profile': 'speedscope', 'X-Profile-Token': TOKEN})
+    assert response.status_code == 200
+    with open(profile_path(response)) as file:
+        profile = json.load(file)
+
+    frames = profile['shared']['frames']
+    python, sql = profile['profiles']
+    assert any(frame['name'] == 'get_all_actors' for frame in frames)
+    assert sql['name'].startswith('SQL (') and sql['events']
+    for events in (python['events'], sql['events']):
+        # events are nested and ordered in time
+        stack, at = [], 0
+        for event in events:
+            assert event['at'] >= at
+            at = event['at']
+            if event['type'] == 'O':
+                stack.append(event['frame'])
+            else:
+                assert stack.pop() == event['frame']
+        assert not stack
+        assert at <= python['endValue']
+
+
+def test_streamed_profile(client):
+    response = client.get('/api/actors?stream=ndjson', headers={'X-Profile': 'pstats', 'X-Profile-Token': TOKEN})
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response.headers
+    # saved when the server closes the response, after the body is generated
+    assert len(response.get_data().splitlines()) == 5
+    response.close()
+
+    stats = pstats.Stats(profile_path(response))
+    assert any(function == 'generate' for _, _, function in stats.stats)
+    with open(profile_path(response).replace('.pstats', '.sql.json')) as file:
+        statements = json.load(file)
+    assert any('FROM actors' in statement['statement'] for statement in statements)
@@ -7,6 +7,11 @@ ACTOR_REL_ROUTE = 'http://127.0.0.1:8000/api/actor-relations'
 MOVIE_ID_ROUTE = 'http://127.0.0.1:8000/api/movie'
 MOVIE_REL_ROUTE = 'http://127.0.0.1:8000/api/movie-relations'
 
+ACTORS_FILMOGRAPHY_ROUTE = 'http://127.0.0.1:8000/api/actors/filmography'
+MOVIES_CAST_ROUTE = 'http://127.0.0.1:8000/api/movies/cast'
+
+CACHE_ROUTE = 'http://127.0.0.1:8000/api/_cache'
+
 
 @pytest.mark.parametrize(
     ('body_add_actor','actor_id_corrected', 'body_add_movie','movie_id_corrected', 'expected_response'),
@@ -121,4 +126,125 @@ def test_delete_movie_relation(body_add_movie, movie_id_corrected, body_add_acto
     body_clear_rels = dict(id=movie_id)
     resp_clear_rels = requests.delete(MOVIE_REL_ROUTE, data={**body_clear_rels, **movie_id_corrected})
 
-    assert resp_clear_rels.status_code == expected_response
\ No newline at end of file
+    assert resp_clear_rels.status_code == expected_response
+
+def test_movie_add_relations_bulk():
+    movie_id = requests.post(MOVIE_ID_ROUTE, data=dict(name='Ocean\'s Eleven', genre='crime', year='2001')).json()['id']
+    cast = [requests.post(ACTOR_ID_ROUTE, data=dict(name=f'Ocean Crew {i}', gender='male', date_of_birth='01.01.1970')).json()['id']
+            for i in range(11)]
+
+    # add the whole cast at once, repeated relations are ignored
+    resp_add_rel = requests.put(MOVIE_REL_ROUTE, data=dict(id=movie_id, relation_id=cast + cast[:2]))
+    assert resp_add_rel.status_code == 200
+    assert resp_add_rel.json()['cast'] == cast
+
+    resp_add_rel = requests.put(MOVIE_REL_ROUTE, data=dict(id=movie_id, relation_id=cast[:3]))
+    assert resp_add_rel.json()['cast'] == cast
+
+    # nothing is added if some actor does not exist
+    resp_add_rel = requests.put(MOVIE_REL_ROUTE, data=dict(id=movie_id, relation_id=[cast[0], 7**10]))
+    assert resp_add_rel.status_code == 400
+
+    # remove certain relations
+    resp_remove_rels = requests.delete(MOVIE_REL_ROUTE, data=dict(id=movie_id, relation_id=cast[5:]))
+    assert resp_remove_rels.status_code == 200
+    assert resp_remove_rels.json()['cast'] == cast[:5]
+
+    resp_remove_rels = requests.delete(MOVIE_REL_ROUTE, data=dict(id=movie_id, relation_id=['one']))
+    assert resp_remove_rels.status_code == 400
+
+
+def test_actor_add_relations_bulk():
+    actor_id = requests.post(ACTOR_ID_ROUTE, data=dict(name='Daniel Craig', gender='male', date_of_birth='02.03.1968')).json()['id']
+    movies = [requests.post(MOVIE_ID_ROUTE, data=dict(name=f'Bond {i}', genre='action', year=2006 + i)).json()['id']
+              for i in range(5)]
+
+    resp_add_rel = requests.put(ACTOR_REL_ROUTE, data=dict(id=actor_id, relation_id=movies))
+    assert resp_add_rel.status_code == 200
+    assert resp_add_rel.json()['filmography'] == movies
+
+    resp_remove_rels = requests.delete(ACTOR_REL_ROUTE, data=dict(id=actor_id, relation_id=movies[:4]))
+    assert resp_remove_rels.json()['filmography'] == movies[4:]
+
+    resp_clear_rels = requests.delete(ACTOR_REL_ROUTE, data=dict(id=actor_id))
+    assert resp_clear_rels.json()['filmography'] == []
+
+
+def test_relations_query_count(assert_query_count):
+    movie_id = requests.post(MOVIE_ID_ROUTE, data=dict(name='Counted Movie', genre='drama', year='2000')).json()['id']
+    cast = [requests.post(ACTOR_ID_ROUTE, data=dict(name=f'Counted Cast {i}', gender='male', date_of_birth='01.01.1970')).json()['id']
+            for i in range(20)]
+
+    # movie, insert, resulting cast, version bump
+    assert_query_count(requests.put(MOVIE_REL_ROUTE, data=dict(id=movie_id, relation_id=cast)), 4)
+
+    # the movie record is cached by now
+    cached = requests.get(CACHE_ROUTE).json()['backend'] != 'none'
+    assert_query_count(requests.delete(MOVIE_REL_ROUTE, data=dict(id=movie_id, relation_id=cast[:10])), 4 - cached)
+    assert_query_count(requests.delete(MOVIE_REL_ROUTE, data=dict(id=movie_id)), 3 - cached)
+
+
+@pytest.mark.parametrize(
+    ('body', 'expected_response'),
+    [
+        (dict([]), 400), # id should be specified
+        (dict(id='one'), 400), # id should be integer
+        (dict(id=7**10), 400) # such record should exist
+    ]
+)
+def test_get_relations_invalid(body, expected_response):
+    assert requests.get(ACTOR_REL_ROUTE, data=body).status_code == expected_response
+    assert requests.get(MOVIE_REL_ROUTE, data=body).status_code == expected_response
+
+
+def test_get_relations():
+    movie = requests.post(MOVIE_ID_ROUTE, data=dict(name='Blade Runner 2049', genre='sci-fi', year='2017')).json()
+    actors = [requests.post(ACTOR_ID_ROUTE, data=dict(name=name, gender='male', date_of_birth='27.12.1995')).json()
+              for name in ('Ryan Gosling', 'Ana de Armas')]
+    requests.put(MOVIE_REL_ROUTE, data=dict(id=movie['id'], relation_id=[actor['id'] for actor in actors]))
+
+    response = requests.get(MOVIE_REL_ROUTE, data=dict(id=movie['id']))
+    assert response.status_code == 200
+    assert response.json() == dict(movie, cast=actors)
+
+    response = requests.get(ACTOR_REL_ROUTE, data=dict(id=actors[0]['id']))
+    assert response.status_code == 200
+    assert response.json() == dict(actors[0], filmography=[movie])
+
+    # records served from the same URL have their own ETags
+    etag = response.headers['ETag']
+    other = requests.get(ACTOR_REL_ROUTE, data=dict(id=actors[1]['id']), headers={'If-None-Match': etag})
+    assert other.status_code == 200 and other.headers['ETag'] != etag
+    assert requests.get(ACTOR_REL_ROUTE, data=dict(id=actors[0]['id']),
+                        headers={'If-None-Match': etag}).status_code == 304
+    assert requests.get(ACTOR_REL_ROUTE, data=dict(id=7**10), headers={'If-None-Match': etag}).status_code == 400
+
+
+def test_get_all_with_relations(assert_query_count):
+    response = requests.get(MOVIES_CAST_ROUTE)
+    assert response.status_code == 200
+    movies = response.json()
+    for movie in movies:
+        assert movie['cast'] == requests.get(MOVIE_REL_ROUTE, data=dict(id=movie['id'])).json()['cast']
+
+    assert requests.get(MOVIES_CAST_ROUTE, params=dict(stream='json')).json() == movies
+    assert requests.get(ACTORS_FILMOGRAPHY_ROUTE, params=dict(limit='two')).status_code == 400
+
+    # versions, page and all relations of the page
+    response = requests.get(ACTORS_FILMOGRAPHY_ROUTE, params=dict(limit=100))
+    assert response.status_code == 200
+    assert all('filmography' in actor for actor in response.json())
+    assert_query_count(response, 3)
+
+
+def test_add_relations_json():
+    movie_id = requests.post(MOVIE_ID_ROUTE, json=dict(name='Json Barbie', genre='comedy', year=2023)).json()['id']
+    cast = [requests.post(ACTOR_ID_ROUTE, json=dict(name=name, gender='female', date_of_birth='02.07.1990')).json()['id']
+            for name in ('Json Margot Robbie', 'Json Issa Rae')]
+
+    resp_add_rel = requests.put(MOVIE_REL_ROUTE, json=dict(id=movie_id, relation_id=cast))
+    assert resp_add_rel.status_code == 200
+    assert resp_add_rel.json()['cast'] == cast
+
+    assert requests.put(MOVIE_REL_ROUTE, json=dict(id=movie_id, relation_id=[1.5])).status_code == 400
+    assert requests.delete(MOVIE_REL_ROUTE, json=dict(id=movie_id, relation_id=cast[0])).json()['cast'] == cast[1:]
@@ -0,0 +1,82 @@
+import os
+from datetime import date
+
+import pytest
+
+os.environ.setdefault('DB_URL', 'sqlite://')
+
+import core
+import models.base
+from core import create_app, db
+from core.migrations import upgrade
+from models.actor import Actor
+from models.movie import Movie
+from models.rollups import rebuild_rollups, rollups
+
+
+@pytest.fixture(scope='module')
+def app():
+    """
+    App on a migrated in-memory SQLite database with rollups maintained by the writes
+    """
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # in memory, whatever DB_URL the tests against a running server use
+        monkeypatch.setattr(core, 'DB_URL', 'sqlite://')
+        monkeypatch.setattr(core, 'SCHEMA_CHECK', False)
+        monkeypatch.setattr(models.base, 'STATS_ROLLUPS', True)
+        app = create_app()
+        with app.app_context():
+            upgrade(db.session.connection())
+            db.session.commit()
+            yield app
+
+
+def check_rollups():
+    for rollup in rollups:
+        assert rollup.rows(materialized=True) == rollup.rows(materialized=False), rollup.table.name
+
+
+def test_rollups_follow_writes(app):
+    actors = [row.id for row in Actor.bulk_create([
+        dict(name=f'Rollup Actor {i}', gender='female' if i % 2 else None, date_of_birth=date(1960 + 3 * i, 1, 1))
+        for i in range(6)])]
+    movies = [row.id for row in Movie.bulk_create([
+        dict(name=f'Rollup Movie {i}', genre='drama', year=2000 + i % 3) for i in range(6)])]
+    movie = Movie.create(name='Rollup Movie', genre=None, year=None)
+    check_rollups()
+
+    Actor.update(actors[0], gender='male', date_of_birth=None)
+    assert Actor.update(actors[0], gender='male').version == 2 # nothing changed, nothing written
+    Movie.bulk_update([dict(id=movies[0], genre='comedy'), dict(id=movies[1], year=1999)])
+    assert Movie.bulk_update([dict(id=movies[0], genre='comedy')])[movies[0]].version == 2 # nothing written
+    check_rollups()
+
+    for actor_id in actors[:3]:
+        Actor.add_relations(actor_id, movies[:2])
+    Movie.add_relations(movie.id, actors)
+    check_rollups()
+
+    Actor.remove_relations(actors[0], [movies[0]])
+    Movie.remove_relations(movie.id, actors[:2])
+    Actor.clear_relations(actors[1])
+    check_rollups()
+
+    Movie.bulk_upsert([dict(name='Rollup Movie 4', genre='horror', year=2001),
+                       dict(name='Rollup Movie 9', genre='horror', year=2001)])
+    Actor.bulk_add_relations([(actors[3], movies[4]), (actors[4], movies[4]), (actors[3], movies[0])])
+    check_rollups()
+
+    Actor.delete(actors[2])
+    Movie.delete(movies[1])
+    Actor.bulk_delete(actors[3:5])
+    Movie.bulk_delete(movies[2:4])
+    check_rollups()
+
+
+def test_rebuild_rollups(app):
+    tables = [rollup.table for rollup in rollups]
+    for table in tables:
+        db.session.execute(table.delete())
+    rebuild_rollups()
+    check_rollups()
+    assert all(db.session.execute(table.select()).first() for table in tables)
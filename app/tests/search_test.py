@@ -0,0 +1,111 @@
+import os
+import threading
+
+import pytest
+import requests
+
+os.environ.setdefault('DB_URL', 'sqlite://')
+
+import core
+import controllers.search
+from controllers.search import NameIndex
+from core import create_app, db
+from core.migrations import upgrade
+from models.actor import Actor
+
+ACTOR_BULK_ROUTE = 'http://127.0.0.1:8000/api/actors/bulk'
+MOVIE_ID_ROUTE = 'http://127.0.0.1:8000/api/movie'
+
+SEARCH_ROUTE = 'http://127.0.0.1:8000/api/search'
+
+
+@pytest.fixture(scope='module')
+def actors():
+    response = requests.post(ACTOR_BULK_ROUTE, json=[
+        dict(name='Timothee Chalamet', gender='male', date_of_birth='27.12.1995'),
+        dict(name='Timothee Chalamet Jr', gender='male', date_of_birth='27.12.2025')
+    ])
+    return {result['record']['name']: result['record']['id'] for result in response.json()}
+
+
+@pytest.mark.parametrize(
+    ('params', 'expected_response'),
+    [
+        (dict(q='tim'), 200),
+        (dict(q='tim', type='actor', limit=5, offset=5), 200),
+        (dict(q=' '), 400), # query should be specified
+        (dict(q='tim', type='song'), 400), # type should be actor or movie
+        (dict(q='tim', limit=1000), 400), # limit should not exceed SEARCH_LIMIT_MAX
+        (dict(q='tim', offset='first'), 400) # offset should be integer
+    ]
+)
+def test_search_params(params, expected_response):
+    response = requests.get(SEARCH_ROUTE, params=params)
+    assert response.status_code == expected_response
+
+
+def test_search_ranking(actors):
+    results = requests.get(SEARCH_ROUTE, params=dict(q='Timothee Chalamet')).json()
+    assert [(result['name'], result['match']) for result in results[:2]] == [
+        ('Timothee Chalamet', 'exact'), ('Timothee Chalamet Jr', 'prefix')]
+    assert results[0] == dict(type='actor', id=actors['Timothee Chalamet'], name='Timothee Chalamet',
+                              match='exact', score=1.0)
+
+    # prefix of a word
+    results = requests.get(SEARCH_ROUTE, params=dict(q='chala', type='actor')).json()
+    assert {'Timothee Chalamet', 'Timothee Chalamet Jr'} <= {result['name'] for result in results}
+    assert all(result['match'] == 'prefix' for result in results if 'Chalamet' in result['name'])
+
+    # typo
+    results = requests.get(SEARCH_ROUTE, params=dict(q='timothy chalamet', type='actor')).json()
+    assert results[0]['name'] == 'Timothee Chalamet' and results[0]['match'] == 'fuzzy'
+    assert all(result['score'] >= 0.3 for result in results)
+
+
+def test_search_sees_writes():
+    assert requests.get(SEARCH_ROUTE, params=dict(q='wonk', type='movie')).json() == []
+
+    movie_id = requests.post(MOVIE_ID_ROUTE, data=dict(name='Wonka', genre='fantasy', year='2023')).json()['id']
+    results = requests.get(SEARCH_ROUTE, params=dict(q='wonk', type='movie')).json()
+    assert [(result['id'], result['match']) for result in results] == [(movie_id, 'prefix')]
+
+    requests.delete(MOVIE_ID_ROUTE, data=dict(id=movie_id))
+    assert requests.get(SEARCH_ROUTE, params=dict(q='wonk', type='movie')).json() == []
+
+
+def test_search_pages_follow_offset(actors):
+    expected = requests.get(SEARCH_ROUTE, params=dict(q='t', limit=50)).json()
+    seen = []
+    response = requests.get(SEARCH_ROUTE, params=dict(q='t', limit=3))
+    while True:
+        seen += response.json()
+        if 'next' not in response.links or len(seen) >= len(expected):
+            break
+        response = requests.get(response.links['next']['url'])
+    assert seen[:len(expected)] == expected
+
+
+def test_search_during_rebuild(tmp_path, monkeypatch):
+    # a database file, the rebuild thread has a connection of its own
+    monkeypatch.setattr(core, 'DB_URL', f"sqlite:///{tmp_path / 'search.db'}")
+    monkeypatch.setattr(core, 'SCHEMA_CHECK', False)
+    monkeypatch.setattr(controllers.search, 'SEARCH_INDEX_WAIT', 0)
+    app = create_app()
+    with app.app_context():
+        upgrade(db.session.connection())
+        db.session.commit()
+        Actor.create(name='Rebuilt Actor', gender=None, date_of_birth=None)
+        index = NameIndex(Actor)
+        assert index.refresh(1) and [match[2] for match in index.search('rebuilt')] == ['Rebuilt Actor']
+
+        # the rebuild is held until released, searches use the previous index meanwhile
+        release, load = threading.Event(), index.load
+        monkeypatch.setattr(index, 'load', lambda: release.wait(5) and load())
+        Actor.create(name='Rebuilt Actress', gender=None, date_of_birth=None)
+        assert not index.refresh(2)
+        assert [match[2] for match in index.search('rebuilt')] == ['Rebuilt Actor']
+
+        done = index.reload()
+        release.set()
+        assert done.wait(5) and index.refresh(2)
+        assert sorted(match[2] for match in index.search('rebuilt')) == ['Rebuilt Actor', 'Rebuilt Actress']
@@ -0,0 +1,56 @@
+import pytest
+import requests
+
+ACTOR_BULK_ROUTE = 'http://127.0.0.1:8000/api/actors/bulk'
+MOVIE_BULK_ROUTE = 'http://127.0.0.1:8000/api/movies/bulk'
+ACTOR_RELATIONS_ROUTE = 'http://127.0.0.1:8000/api/actor-relations'
+
+MOVIE_STATS_ROUTE = 'http://127.0.0.1:8000/api/stats/movies'
+CAST_SIZE_STATS_ROUTE = 'http://127.0.0.1:8000/api/stats/cast-sizes'
+ACTOR_STATS_ROUTE = 'http://127.0.0.1:8000/api/stats/actors'
+
+
+def counts(route, keys, count):
+    """
+    Stats of a route as dict group keys -> count
+    """
+    return {tuple(group[key] for key in keys): group[count] for group in requests.get(route).json()}
+
+
+@pytest.fixture()
+def records():
+    response = requests.post(ACTOR_BULK_ROUTE, json=[
+        dict(name=f'Stats Actor {i}', gender='nonbinary', date_of_birth=f'01.01.{1951 + i}') for i in range(3)])
+    actors = [result['record']['id'] for result in response.json()]
+    response = requests.post(MOVIE_BULK_ROUTE, json=[
+        dict(name=f'Stats Movie {i}', genre='stats', year=str(1901 + i // 2)) for i in range(3)])
+    movies = [result['record']['id'] for result in response.json()]
+    yield actors, movies
+    requests.delete(ACTOR_BULK_ROUTE, json=actors)
+    requests.delete(MOVIE_BULK_ROUTE, json=movies)
+
+
+def test_movie_stats(records):
+    response = requests.get(MOVIE_STATS_ROUTE)
+    assert response.status_code == 200
+    assert all(set(group) == {'genre', 'year', 'movies'} for group in response.json())
+    stats = counts(MOVIE_STATS_ROUTE, ['genre', 'year'], 'movies')
+    assert stats[('stats', 1901)] == 2 and stats[('stats', 1902)] == 1
+
+    response = requests.get(MOVIE_STATS_ROUTE, headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_actor_stats(records):
+    stats = counts(ACTOR_STATS_ROUTE, ['gender', 'decade'], 'actors')
+    assert stats[('nonbinary', 1950)] == 3
+
+
+def test_cast_size_stats(records):
+    actors, movies = records
+    before = counts(CAST_SIZE_STATS_ROUTE, ['cast_size'], 'movies')
+    for actor_id in actors:
+        requests.put(ACTOR_RELATIONS_ROUTE, data=dict(id=actor_id, relation_id=movies[0]))
+    after = counts(CAST_SIZE_STATS_ROUTE, ['cast_size'], 'movies')
+    assert after[(3,)] == before.get((3,), 0) + 1
+    assert after[(0,)] == before[(0,)] - 1